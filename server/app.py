@@ -5,11 +5,14 @@ from fastapi import HTTPException
 from config import create_app
 from models import ServerConfig, SyncRequest, ApiResponse
 from storage import load_config, save_config, write_snapshot, read_latest_snapshot
-from sheets import fetch_sheet_values, normalize
+from sheets import fetch_sheet_values, normalize, close_sheets_client
 from snapshot import build_dashboard_snapshot
 
 # Import extended functionality
 from app_extended import app_ext
+from location_inventory import close_http_client
+from ingest_new import close_rest_client
+from supabase_client import close_pg_pool
 
 # Create the FastAPI app
 app = create_app()
@@ -17,6 +20,14 @@ app = create_app()
 # Mount extended app
 app.mount("/api", app_ext)
 
+@app.on_event("shutdown")
+async def close_shared_clients():
+    """Close pooled HTTP clients and the Postgres pool (mounted sub-apps don't receive lifespan events)."""
+    await close_http_client()
+    await close_sheets_client()
+    await close_rest_client()
+    await close_pg_pool()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
@@ -1,8 +1,10 @@
 """Extended API endpoints for sheet sources and data ingestion"""
+import asyncio
 import os
 import datetime
 import uuid
 from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional, Dict, Any
 import logging
 
@@ -70,6 +72,7 @@ from location_inventory import (
     get_location_inventory,
     get_multiple_locations_inventory,
     get_rack_inventory,
+    invalidate_warehouse_cache,
     LocationInventoryRequest,
     BatchLocationInventoryRequest,
     LocationInventorySummary
@@ -140,6 +143,7 @@ async def update_source(
         result = await update_sheet_source(source_id, data)
         if not result:
             raise HTTPException(status_code=404, detail="Source not found")
+        invalidate_warehouse_cache()
         return result
     except HTTPException:
         raise
@@ -157,6 +161,7 @@ async def delete_source(
         deleted = await delete_sheet_source(source_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Source not found")
+        invalidate_warehouse_cache()
         return {"message": "Source deleted successfully"}
     except HTTPException:
         raise
@@ -210,6 +215,9 @@ async def save_binding(
         }
         
         result = await upsert_warehouse_binding(data)
+        from inventory_snapshot import get_inventory_snapshot_manager
+        get_inventory_snapshot_manager().invalidate_warehouses_cache()
+        invalidate_warehouse_cache(warehouse_code)
         return result
     except Exception as e:
         logger.error(f"Error saving binding: {e}")
@@ -225,6 +233,9 @@ async def remove_binding(
         deleted = await delete_warehouse_binding(warehouse_code)
         if not deleted:
             raise HTTPException(status_code=404, detail="Binding not found")
+        from inventory_snapshot import get_inventory_snapshot_manager
+        get_inventory_snapshot_manager().invalidate_warehouses_cache()
+        invalidate_warehouse_cache(warehouse_code)
         return {"message": "Binding deleted"}
     except HTTPException:
         raise
@@ -464,29 +475,27 @@ async def get_raw_data(
             try:
                 from inventory_snapshot import get_inventory_snapshot_manager
                 snapshot_manager = get_inventory_snapshot_manager()
-                snapshot = snapshot_manager.get_inventory_snapshot(warehouse_code)
+                snapshot = await asyncio.to_thread(snapshot_manager.get_inventory_snapshot, warehouse_code, source_type)
 
                 if snapshot:
                     logger.info(f"Using inventory snapshot for {warehouse_code}")
 
                     # Filter by source_type if specified
-                    wms_data = snapshot.get('wms_data', [])
-                    sap_data = snapshot.get('sap_data', [])
-
-                    if source_type == 'wms':
-                        all_rows = wms_data
-                    elif source_type == 'sap':
-                        all_rows = sap_data
-                    else:
-                        all_rows = wms_data + sap_data
+                    wms_data = snapshot.get('wms_data', []) if source_type != 'sap' else []
+                    sap_data = snapshot.get('sap_data', []) if source_type != 'wms' else []
 
                     # Filter by split_value if specified
                     if split_value:
-                        all_rows = [row for row in all_rows if row.get('split_key') == split_value]
+                        wms_data = [row for row in wms_data if row.get('split_key') == split_value]
+                        sap_data = [row for row in sap_data if row.get('split_key') == split_value]
 
-                    # Apply limit
-                    if len(all_rows) > limit:
-                        all_rows = all_rows[:limit]
+                    # Apply limit, then tag only the rows being returned
+                    wms_data = wms_data[:limit]
+                    sap_data = sap_data[:limit - len(wms_data)]
+                    all_rows = (
+                        snapshot_manager.tag_snapshot_rows(wms_data, 'wms', warehouse_code)
+                        + snapshot_manager.tag_snapshot_rows(sap_data, 'sap', warehouse_code)
+                    )
 
                     return {
                         "warehouse_code": warehouse_code,
@@ -623,7 +632,7 @@ async def get_raw_data(
                     'last_updated': datetime.utcnow().isoformat(),
                     'source_bindings': binding.get('source_bindings', {})
                 }
-                snapshot_manager._save_snapshot(warehouse_code, snapshot_data)
+                await snapshot_manager._save_snapshot(warehouse_code, snapshot_data)
                 logger.info(f"✅ Saved inventory snapshot for {warehouse_code}: {len(wms_data)} WMS + {len(sap_data)} SAP rows")
             except Exception as e:
                 logger.warning(f"Failed to save snapshot for {warehouse_code}: {e}")
@@ -697,7 +706,7 @@ async def list_column_configs():
 # Location Inventory Endpoints
 # ============================================
 
-@app_ext.post("/location/inventory", response_model=LocationInventorySummary)
+@app_ext.post("/location/inventory", response_model=LocationInventorySummary, response_class=ORJSONResponse)
 async def get_location_inventory_endpoint(
     request: LocationInventoryRequest,
     _: bool = Depends(require_supabase)
@@ -706,7 +715,8 @@ async def get_location_inventory_endpoint(
     try:
         summary = await get_location_inventory(
             warehouse_code=request.warehouse_code,
-            location=request.location
+            location=request.location,
+            summary_only=request.summary_only,
         )
         return summary
     except Exception as e:
@@ -714,7 +724,11 @@ async def get_location_inventory_endpoint(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app_ext.post("/location/inventory/batch", response_model=Dict[str, LocationInventorySummary])
+@app_ext.post(
+    "/location/inventory/batch",
+    response_model=Dict[str, LocationInventorySummary],
+    response_class=ORJSONResponse,
+)
 async def get_batch_location_inventory_endpoint(
     request: BatchLocationInventoryRequest,
     _: bool = Depends(require_supabase)
@@ -736,7 +750,7 @@ class RackInventoryRequest(BaseModel):
     rack_location: str
 
 
-@app_ext.post("/location/rack-inventory", response_model=LocationInventorySummary)
+@app_ext.post("/location/rack-inventory", response_model=LocationInventorySummary, response_class=ORJSONResponse)
 async def get_rack_inventory_endpoint(
     request: RackInventoryRequest,
     _: None = Depends(require_supabase)
@@ -785,9 +799,14 @@ async def get_inventory_snapshot(warehouse_code: str):
     try:
         from inventory_snapshot import get_inventory_snapshot_manager
         manager = get_inventory_snapshot_manager()
-        snapshot = manager.get_inventory_snapshot(warehouse_code)
+        snapshot = await asyncio.to_thread(manager.get_inventory_snapshot, warehouse_code)
 
         if snapshot:
+            # Rows carry source_type/warehouse_code like /raw/latest; storage bookkeeping stays internal
+            snapshot.pop('source_bindings_hash', None)
+            snapshot.pop('binding_versions', None)
+            manager.tag_snapshot_rows(snapshot.get('wms_data', []), 'wms', warehouse_code)
+            manager.tag_snapshot_rows(snapshot.get('sap_data', []), 'sap', warehouse_code)
             return {
                 "ok": True,
                 "data": snapshot
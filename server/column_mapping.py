@@ -3,7 +3,9 @@ Column mapping utilities for Google Sheets to PostgreSQL
 Maps Sheet headers to PostgreSQL column names
 """
 import re
-from typing import Optional, Any
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Callable, Optional, Any, List, Tuple
 
 # WMS Column Mapping (Google Sheet Header → PostgreSQL Column)
 WMS_COLUMN_MAP = {
@@ -354,6 +356,158 @@ def map_sap_row(sheet_row: dict, classification=None) -> dict:
 
     return mapped
 
+def find_header(headers: List[str], target_name: Optional[str]) -> Optional[str]:
+    """Find a header by exact match first, then case-insensitive match"""
+    if not target_name:
+        return None
+    if target_name in headers:
+        return target_name
+    target_lower = target_name.lower().strip()
+    for header in headers:
+        if header.lower().strip() == target_lower:
+            return header
+    return None
+
+def build_column_plan(headers: List[str], source_type: str, classification=None) -> List[Tuple[str, str, bool]]:
+    """
+    Resolve the sheet → PostgreSQL mapping once per sheet.
+    Returns (sheet_header, pg_column, is_numeric) in the same order map_wms_row/map_sap_row assign keys.
+    """
+    plan = []
+    skip = set()
+
+    if classification:
+        def add(target_name, pg_column=None, numeric=False, skip_source=True):
+            header = find_header(headers, target_name)
+            if header:
+                plan.append((header, pg_column or normalize_column_name(header), numeric))
+                if skip_source:
+                    skip.add(header)
+
+        if source_type == 'wms':
+            add(classification.zone_col)
+            # Location data is stored as cell_no; the original column is still mapped below
+            add(classification.location_col, 'cell_no', skip_source=False)
+            add(classification.lot_col)
+            add(classification.item_col)
+            add(classification.qty_col, numeric=True)
+        else:  # sap
+            add(classification.zone_col)
+            add(classification.location_col, 'storage_location')
+            add(classification.lot_col, 'batch')
+            add(classification.item_col, 'material')
+            add(classification.qty_col, 'unrestricted_qty', numeric=True)
+            add(getattr(classification, 'blocked_col', None), 'blocked_qty', numeric=True)
+            add(getattr(classification, 'returns_col', None), 'returns_qty', numeric=True)
+            add(getattr(classification, 'quality_inspection_col', None), 'quality_inspection_qty', numeric=True)
+            add(getattr(classification, 'source_location_col', None), 'storage_location')
+            add(getattr(classification, 'unrestricted_col', None), 'unrestricted_qty', numeric=True)
+
+    column_map, numeric_columns = (
+        (WMS_COLUMN_MAP, WMS_NUMERIC_COLUMNS) if source_type == 'wms'
+        else (SAP_COLUMN_MAP, SAP_NUMERIC_COLUMNS)
+    )
+    for header in headers:
+        if header in skip or header not in column_map:
+            continue
+        pg_column = column_map[header]
+        plan.append((header, pg_column, pg_column in numeric_columns))
+
+    return plan
+
+def build_row_mapper(headers: List[str], source_type: str, classification=None) -> Callable[[List[dict]], List[dict]]:
+    """
+    Specialise sheet → PostgreSQL mapping for one header layout.
+    The returned function maps a list of rows column by column using precomputed getters,
+    so the classification config is interpreted only once per sheet.
+    """
+    plan = build_column_plan(headers, source_type, classification)
+    keys = [pg_column for _, pg_column, _ in plan]
+    getters = [(itemgetter(header), numeric) for header, _, numeric in plan]
+
+    def map_rows(rows: List[dict]) -> List[dict]:
+        if not keys:
+            return [{} for _ in rows]
+        columns = []
+        for getter, numeric in getters:
+            column = map(getter, rows)
+            columns.append(list(map(clean_numeric_value, column)) if numeric else list(column))
+        # Later duplicates of a key win, matching the per-row overwrite order
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+    return map_rows
+
+@dataclass(slots=True)
+class MappedRows:
+    """A page of mapped rows: one shared column list plus one tuple per row (no per-row dicts)"""
+    columns: List[str]
+    rows: List[tuple]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def column(self, name: str) -> List[Any]:
+        """All values of one column, or Nones if the column is not mapped"""
+        if name not in self.columns:
+            return [None] * len(self.rows)
+        index = self.columns.index(name)
+        return [row[index] for row in self.rows]
+
+    def to_dicts(self, start: int = 0, end: Optional[int] = None) -> List[dict]:
+        """Materialise rows as dicts (only needed at the REST boundary)"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows[start:end]]
+
+def build_values_mapper(
+    header_row: List[Any],
+    source_type: str,
+    classification=None,
+    coerce_for: Optional[Callable[[str], Callable[[Any], Any]]] = None
+) -> Callable[[List[List[Any]]], MappedRows]:
+    """
+    Fuse sheet normalisation and mapping for one header layout.
+    The returned function takes raw data rows (no header) and reads only the mapped
+    columns, applying coerce_for(header) and numeric cleaning on the way; blank rows
+    are dropped. Rows match normalize() followed by map_rows_columnar().
+    """
+    headers = [str(h).strip() for h in header_row]
+    # Duplicate headers resolve to the last column, as in a header-keyed dict
+    index_of = {header: i for i, header in enumerate(headers)}
+    plan = build_column_plan(list(index_of), source_type, classification)
+
+    # A pg column mapped twice keeps its first position but takes the last mapping's value
+    last_mapping = {pg_column: (header, numeric) for header, pg_column, numeric in plan}
+    keys = list(last_mapping)
+    getters = [
+        (index_of[header], coerce_for(header) if coerce_for else None, numeric)
+        for header, numeric in last_mapping.values()
+    ]
+
+    def map_values(data_rows: List[List[Any]]) -> MappedRows:
+        data_rows = [row for row in data_rows if any((cell or "").strip() for cell in row)]
+        if not keys:
+            return MappedRows(keys, [() for _ in data_rows])
+        columns = []
+        for index, coerce, numeric in getters:
+            column = [row[index] if index < len(row) else None for row in data_rows]
+            if coerce:
+                column = list(map(coerce, column))
+            if numeric:
+                column = list(map(clean_numeric_value, column))
+            columns.append(column)
+        return MappedRows(keys, list(zip(*columns)))
+
+    return map_values
+
+def map_rows_columnar(rows: List[dict], source_type: str, classification=None) -> List[dict]:
+    """
+    Map a whole sheet column by column instead of row by row.
+    Produces the same dicts as map_wms_row/map_sap_row for rows sharing one header.
+    """
+    if not rows:
+        return []
+    return build_row_mapper(list(rows[0].keys()), source_type, classification)(rows)
+
 def get_split_key(mapped_row: dict, classification) -> Optional[str]:
     """Extract split_key from mapped row"""
     if not classification.split_enabled or not classification.split_by_column:
@@ -368,3 +522,14 @@ def get_split_key(mapped_row: dict, classification) -> Optional[str]:
         return str(value).strip()
     
     return None
+
+def get_split_keys(mapped_rows: MappedRows, classification) -> List[Optional[str]]:
+    """Extract split_key for a page of mapped rows, resolving the split column once"""
+    if not classification.split_enabled or not classification.split_by_column:
+        return [None] * len(mapped_rows)
+    
+    split_col_normalized = normalize_column_name(classification.split_by_column)
+    return [
+        str(value).strip() if value else None
+        for value in mapped_rows.column(split_col_normalized)
+    ]
@@ -4,8 +4,11 @@ Pre-calculates and caches dashboard data for performance
 Similar to inventory_snapshot.py but for dashboard KPIs and charts
 """
 
+import asyncio
+import heapq
 import json
 import os
+from itertools import chain
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from pathlib import Path
@@ -86,10 +89,13 @@ class DashboardCacheManager:
                 for row in sap_data
             )
 
-            # Get unique items
-            wms_items = set(row.get('item_code') for row in wms_data if row.get('item_code'))
-            sap_items = set(row.get('material') for row in sap_data if row.get('material'))
-            unique_items = len(wms_items.union(sap_items))
+            # Get unique items (single pass over both sources, no intermediate sets)
+            unique_items = len({
+                code for code in chain(
+                    (row.get('item_code') for row in wms_data),
+                    (row.get('material') for row in sap_data)
+                ) if code
+            })
 
             return {
                 'total_quantity': total_wms_qty + total_sap_qty,
@@ -176,9 +182,8 @@ class DashboardCacheManager:
                     'item_count': zone['location_count']
                 })
 
-            # Sort by utilization descending
-            zones.sort(key=lambda x: x['utilization_percentage'], reverse=True)
-            return zones[:10]  # Top 10 zones
+            # Top 10 zones by utilization (descending)
+            return heapq.nlargest(10, zones, key=lambda x: x['utilization_percentage'])
 
         except Exception as e:
             print(f"Error calculating zone utilization from location_inventory_summary_mv: {e}")
@@ -221,9 +226,8 @@ class DashboardCacheManager:
                     except:
                         continue
 
-            # Sort by expiry date (soonest first)
-            expiring_items.sort(key=lambda x: x['days_until_expiry'])
-            return expiring_items[:20]  # Top 20 expiring items
+            # Top 20 expiring items (soonest first)
+            return heapq.nsmallest(20, expiring_items, key=lambda x: x['days_until_expiry'])
 
         except Exception as e:
             print(f"Error calculating expiring items: {e}")
@@ -279,6 +283,23 @@ class DashboardCacheManager:
         self._save_cache(cache_key, data)
         return data
 
+    async def warmup(self, warehouse_codes: List[str]) -> None:
+        """Recalculate and cache all dashboard data, e.g. right after an ingest"""
+        key_suffix = '_'.join(sorted(warehouse_codes))
+
+        # Calculations are blocking Supabase queries, so run them side by side in threads.
+        # User defined zones reuse the zone utilization result instead of querying again.
+        inventory_stats, zone_utilization, expiring_items = await asyncio.gather(
+            asyncio.to_thread(self._calculate_inventory_stats, warehouse_codes),
+            asyncio.to_thread(self._calculate_zone_utilization, warehouse_codes),
+            asyncio.to_thread(self._calculate_expiring_items, warehouse_codes),
+        )
+
+        self._save_cache(f"inventory_stats_{key_suffix}", inventory_stats)
+        self._save_cache(f"zone_utilization_{key_suffix}", zone_utilization)
+        self._save_cache(f"user_defined_zones_{key_suffix}", zone_utilization)
+        self._save_cache(f"expiring_items_{key_suffix}", expiring_items)
+
     def clear_cache(self, pattern: Optional[str] = None) -> None:
         """Clear cache files matching pattern"""
         try:
@@ -1,11 +1,14 @@
 """Data ingestion logic for processing Google Sheets data"""
 import asyncio
+import re
 import uuid
+from dataclasses import dataclass, fields
 from datetime import datetime, date
-from typing import Dict, List, Any, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import logging
 
-from sheets import fetch_sheet_values, normalize
+from sheets import fetch_sheet_values, normalize, is_empty_row, denorm_value
 from models_extended import (
     SheetSource, 
     ClassificationConfig,
@@ -21,53 +24,70 @@ from supabase_client import (
 
 logger = logging.getLogger(__name__)
 
-def extract_denormalized_fields(
-    row: Dict[str, Any],
-    source_type: str,
-    classification: ClassificationConfig
-) -> Dict[str, Any]:
-    """Extract denormalized fields based on source type and classification"""
-    denorm = {
-        'zone': None,
-        'location': None,
-        'item_code': None,
-        'lot_key': None,
-        'split_key': None
-    }
-
-    # Extract item code (common for both types)
-    if classification.item_col and classification.item_col in row:
-        value = str(row[classification.item_col]).strip() if row[classification.item_col] else None
-        denorm['item_code'] = value if value else None
+@dataclass(slots=True)
+class RawRowRecord:
+    """Compact per-row record for raw_rows; converted to a dict only at insert time"""
+    source_id: str
+    source_type: str
+    header: List[str]
+    row: Dict[str, Any]
+    zone: Optional[str]
+    location: Optional[str]
+    item_code: Optional[str]
+    lot_key: Optional[str]
+    split_key: Optional[str]
+    available_qty: Optional[float]
+    total_qty: Optional[float]
+    inb_date: Optional[str]
+    valid_date: Optional[str]
+    prod_date: Optional[str]
+    batch_id: str
+    fetched_at: str
 
-    # Extract lot key (single lot column)
-    if classification.lot_col and classification.lot_col in row:
-        value = str(row[classification.lot_col]).strip() if row[classification.lot_col] else None
-        denorm['lot_key'] = value if value else None
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow dict for the Supabase insert payload"""
+        return {name: getattr(self, name) for name in _RAW_ROW_FIELDS}
 
-    # Extract split_key (common for both WMS and SAP)
-    if classification.split_enabled and classification.split_by_column:
-        if classification.split_by_column in row:
-            value = str(row[classification.split_by_column]).strip() if row[classification.split_by_column] else None
-            denorm['split_key'] = value if value else None
-    
-    if source_type == 'wms':
-        # WMS specific fields
-        if classification.zone_col and classification.zone_col in row:
-            value = str(row[classification.zone_col]).strip() if row[classification.zone_col] else None
-            denorm['zone'] = value if value else None
+_RAW_ROW_FIELDS = tuple(f.name for f in fields(RawRowRecord))
 
-        if classification.location_col and classification.location_col in row:
-            value = str(row[classification.location_col]).strip() if row[classification.location_col] else None
-            denorm['location'] = value if value else None
+def build_denorm_extractor(
+    source_type: str,
+    classification: ClassificationConfig
+) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Build a row extractor specialised for one source.
 
+    Classification is fixed for a whole ingest, so the configured columns are
+    resolved once here and the returned function only touches those columns.
+    """
+    # (denorm field, sheet column) pairs that are actually configured
+    columns = [
+        ('item_code', classification.item_col),
+        ('lot_key', classification.lot_col),
+    ]
+    if classification.split_enabled:
+        columns.append(('split_key', classification.split_by_column))
+    if source_type == 'wms':
+        columns.append(('zone', classification.zone_col))
+        columns.append(('location', classification.location_col))
     elif source_type == 'sap':
-        # SAP specific fields
-        if classification.source_location_col and classification.source_location_col in row:
-            value = str(row[classification.source_location_col]).strip() if row[classification.source_location_col] else None
-            denorm['source_location'] = value if value else None
+        columns.append(('source_location', classification.source_location_col))
+    columns = [(field, col) for field, col in columns if col]
 
-    return denorm
+    def extract(row: Dict[str, Any]) -> Dict[str, Any]:
+        denorm = {
+            'zone': None,
+            'location': None,
+            'item_code': None,
+            'lot_key': None,
+            'split_key': None
+        }
+        for field, col in columns:
+            if col in row:
+                denorm[field] = denorm_value(row[col])
+        return denorm
+
+    return extract
 
 def extract_quantities(row: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
     """Extract available and total quantities from row"""
@@ -96,7 +116,37 @@ def extract_quantities(row: Dict[str, Any]) -> Tuple[Optional[float], Optional[f
     
     return available_qty, total_qty
 
-def extract_dates(row: Dict[str, Any]) -> Dict[str, Optional[date]]:
+# Date column mappings (field -> candidate sheet headers, in priority order)
+DATE_FIELD_KEYS: Dict[str, List[str]] = {
+    'inb_date': ['Inb. Date', 'Inbound Date', 'inb_date'],
+    'valid_date': ['Valid Date', 'Valid Until', 'valid_date'],
+    'prod_date': ['Prod. Date', 'Production Date', 'prod_date']
+}
+
+_ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+@lru_cache(maxsize=4096)
+def _parse_iso_date(value: str) -> Optional[date]:
+    """Parse an ISO date string once; sheets repeat the same dates across many rows"""
+    if not _ISO_DATE_RE.match(value):
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+def resolve_date_keys(columns: List[str]) -> Dict[str, List[str]]:
+    """Resolve which date headers are present in a sheet (done once per source)"""
+    present = set(columns)
+    return {
+        field: [key for key in possible_keys if key in present]
+        for field, possible_keys in DATE_FIELD_KEYS.items()
+    }
+
+def extract_dates(
+    row: Dict[str, Any],
+    date_keys: Optional[Dict[str, List[str]]] = None
+) -> Dict[str, Optional[date]]:
     """Extract date fields from row"""
     dates = {
         'inb_date': None,
@@ -104,42 +154,59 @@ def extract_dates(row: Dict[str, Any]) -> Dict[str, Optional[date]]:
         'prod_date': None
     }
     
-    # Date column mappings
-    date_mappings = {
-        'inb_date': ['Inb. Date', 'Inbound Date', 'inb_date'],
-        'valid_date': ['Valid Date', 'Valid Until', 'valid_date'],
-        'prod_date': ['Prod. Date', 'Production Date', 'prod_date']
-    }
-    
-    for field, possible_keys in date_mappings.items():
+    for field, possible_keys in (date_keys or DATE_FIELD_KEYS).items():
         for key in possible_keys:
-            if key in row and row[key]:
-                # The value should already be ISO format from normalization
-                try:
-                    if isinstance(row[key], str):
-                        # Parse ISO date string
-                        dates[field] = datetime.fromisoformat(row[key]).date()
-                    elif isinstance(row[key], date):
-                        dates[field] = row[key]
-                except (ValueError, TypeError):
-                    pass
-                if dates[field]:
-                    break
+            value = row.get(key)
+            if not value:
+                continue
+            # The value should already be ISO format from normalization
+            if isinstance(value, str):
+                dates[field] = _parse_iso_date(value)
+            elif isinstance(value, date):
+                dates[field] = value
+            if dates[field]:
+                break
     
     return dates
 
+async def fetch_source_values(
+    source: Dict[str, Any],
+    sheet_cache: Optional[Dict[Tuple[str, str], "asyncio.Future"]] = None
+) -> List[List[str]]:
+    """
+    Fetch sheet values for a source.
+
+    When a sheet_cache is shared across sources of one batch, each
+    (spreadsheet_id, sheet_name) pair is downloaded only once and the
+    result is partitioned in-process by every binding that needs it.
+    """
+    if sheet_cache is None:
+        return await fetch_sheet_values(source['spreadsheet_id'], source['sheet_name'], None)
+    
+    key = (source['spreadsheet_id'], source['sheet_name'])
+    fetch = sheet_cache.get(key)
+    if fetch is None:
+        fetch = asyncio.ensure_future(
+            fetch_sheet_values(source['spreadsheet_id'], source['sheet_name'], None)
+        )
+        sheet_cache[key] = fetch
+    return await fetch
+
 async def ingest_source(
     source: Dict[str, Any],
     warehouse_code: Optional[str],
     batch_id: str,
     dry_run: bool = False,
-    split_value: Optional[str] = None
+    split_value: Optional[str] = None,
+    sheet_cache: Optional[Dict[Tuple[str, str], "asyncio.Future"]] = None
 ) -> Tuple[int, List[str]]:
     """
     Ingest data from a single source.
     
     Args:
         split_value: If provided, only ingest rows where split_key matches this value.
+        sheet_cache: Optional per-batch cache shared between sources so the same
+            sheet is only downloaded once.
     
     If warehouse_code is None and split is enabled:
       - Uses split_key as warehouse_code
@@ -151,40 +218,44 @@ async def ingest_source(
     
     try:
         # Fetch sheet data
-        values = await fetch_sheet_values(
-            source['spreadsheet_id'],
-            source['sheet_name'],
-            None
-        )
+        values = await fetch_source_values(source, sheet_cache)
         
         if not values or len(values) < 2:
             errors.append(f"Source {source['label']}: No data found")
             return 0, errors
         
-        # Get header and normalize rows
+        # Parse classification config
+        classification = ClassificationConfig(**source.get('classification', {}))
+        
+        # Check if split is enabled
+        split_enabled = classification.split_enabled and classification.split_by_column
+        
+        # Get header and normalize rows (rows of other splits are dropped here)
         header = values[0]
-        normalized_rows = normalize(values)
+        split_filtered = bool(split_enabled and split_value)
+        if split_filtered:
+            normalized_rows = normalize(values, classification.split_by_column, split_value)
+        else:
+            normalized_rows = normalize(values)
         
         if not normalized_rows:
+            # No rows for this split (or no split column) is not an error if the sheet has data
+            if split_filtered and header and not all(is_empty_row(row) for row in values[1:]):
+                logger.info(f"Source {source['label']}: no rows for split '{split_value}'")
+                return 0, errors
             errors.append(f"Source {source['label']}: No valid rows after normalization")
             return 0, errors
         
-        # Parse classification config
-        classification = ClassificationConfig(**source.get('classification', {}))
-        
-        # Check if split is enabled
-        split_enabled = classification.split_enabled and classification.split_by_column
+        # All normalized rows share the same keys, so resolve date columns once
+        date_keys = resolve_date_keys(list(normalized_rows[0].keys()))
+        extract_denorm = build_denorm_extractor(source['type'], classification)
         
         # Prepare raw rows for insertion
         raw_rows_to_insert = []
         
         for norm_row in normalized_rows:
             # Extract denormalized fields
-            denorm = extract_denormalized_fields(
-                norm_row,
-                source['type'],
-                classification
-            )
+            denorm = extract_denorm(norm_row)
             
             # Skip rows without item code
             if not denorm['item_code']:
@@ -196,27 +267,27 @@ async def ingest_source(
             
             # Extract quantities and dates
             available_qty, total_qty = extract_quantities(norm_row)
-            dates = extract_dates(norm_row)
+            dates = extract_dates(norm_row, date_keys)
 
             # Create raw row
-            raw_row = {
-                'source_id': source['id'],
-                'source_type': source['type'],
-                'header': header,
-                'row': norm_row,
-                'zone': denorm['zone'],
-                'location': denorm['location'],
-                'item_code': denorm['item_code'],
-                'lot_key': denorm['lot_key'],
-                'split_key': denorm['split_key'],
-                'available_qty': available_qty,
-                'total_qty': total_qty,
-                'inb_date': dates['inb_date'].isoformat() if dates['inb_date'] else None,
-                'valid_date': dates['valid_date'].isoformat() if dates['valid_date'] else None,
-                'prod_date': dates['prod_date'].isoformat() if dates['prod_date'] else None,
-                'batch_id': batch_id,
-                'fetched_at': datetime.utcnow().isoformat()
-            }
+            raw_row = RawRowRecord(
+                source_id=source['id'],
+                source_type=source['type'],
+                header=header,
+                row=norm_row,
+                zone=denorm['zone'],
+                location=denorm['location'],
+                item_code=denorm['item_code'],
+                lot_key=denorm['lot_key'],
+                split_key=denorm['split_key'],
+                available_qty=available_qty,
+                total_qty=total_qty,
+                inb_date=dates['inb_date'].isoformat() if dates['inb_date'] else None,
+                valid_date=dates['valid_date'].isoformat() if dates['valid_date'] else None,
+                prod_date=dates['prod_date'].isoformat() if dates['prod_date'] else None,
+                batch_id=batch_id,
+                fetched_at=datetime.utcnow().isoformat()
+            )
             
             raw_rows_to_insert.append(raw_row)
         
@@ -317,6 +388,8 @@ async def ingest_warehouse_data(
         source_map = {s['id']: s for s in sources}
         
         # Process each source-split binding
+        # Bindings that share a sheet reuse a single download
+        sheet_cache: Dict[Tuple[str, str], asyncio.Future] = {}
         tasks = []
         for binding in source_bindings_to_process:
             source_id = binding['source_id']
@@ -335,7 +408,8 @@ async def ingest_warehouse_data(
                 warehouse_code,
                 batch_id,
                 dry_run,
-                split_value=split_value  # Pass split_value to filter data
+                split_value=split_value,  # Pass split_value to filter data
+                sheet_cache=sheet_cache
             )
             tasks.append(task)
         
@@ -3,124 +3,355 @@ New ingestion logic that stores all Google Sheet columns directly
 No JSONB - all columns mapped to PostgreSQL columns
 """
 import asyncio
+import csv
+import io
+import os
 import uuid
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import logging
 
-from sheets import fetch_sheet_values, normalize
+import httpx
+import orjson
+
+from sheets import stream_sheet_values, get_value_coercer
 from models_extended import ClassificationConfig, IngestResult
-from column_mapping import map_wms_row, map_sap_row, get_split_key
-from supabase_client import get_warehouse_binding, supabase
+from column_mapping import MappedRows, build_values_mapper, get_split_keys
+from supabase_client import (
+    get_warehouse_binding_cached, get_sheet_sources_by_ids, get_pg_pool, supabase,
+    SUPABASE_URL, SUPABASE_SERVICE_KEY, POSTGREST_TIMEOUT
+)
 
 logger = logging.getLogger(__name__)
 
-async def update_materials_catalog(rows: List[Dict[str, Any]], source_type: str) -> int:
+# Max sources ingested at once per warehouse (defaults to the Supavisor transaction pool size)
+INGEST_CONCURRENCY = int(os.getenv('INGEST_CONCURRENCY', '8'))
+
+# Rows fetched from Google Sheets per request while streaming a source
+SHEET_PAGE_SIZE = 5000
+
+MATERIALS_UPSERT_SQL = """
+    INSERT INTO public.materials (item_code, description, unit, source_system, last_seen_at)
+    VALUES ($1, $2, $3, $4, NOW())
+    ON CONFLICT (item_code) DO UPDATE SET
+        description = EXCLUDED.description,
+        unit = EXCLUDED.unit,
+        source_system = EXCLUDED.source_system,
+        last_seen_at = EXCLUDED.last_seen_at
+"""
+
+async def upsert_materials_pg(materials: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Upsert materials with one prepared statement in a single transaction.
+    Returns None if direct Postgres access is unavailable or the upsert failed.
+    """
+    pool = await get_pg_pool()
+    if pool is None:
+        return None
+    
+    args = [
+        (m['item_code'], m.get('description'), m.get('unit'), m.get('source_system'))
+        for m in materials
+    ]
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(MATERIALS_UPSERT_SQL, args)
+        return len(args)
+    except Exception as e:
+        logger.error(f"Error upserting materials via Postgres: {e}")
+        return None
+
+async def update_materials_catalog(rows: MappedRows, source_type: str) -> int:
     """Update materials catalog with item codes from sync data"""
     if not supabase or not rows:
         return 0
     
-    # Extract unique item codes
-    materials_to_upsert = {}
+    # Resolve per-source column names once (WMS uses item_code, SAP uses material)
+    if source_type == 'wms':
+        code_key, desc_keys, unit_key = 'item_code', ('description', 'item_nm'), 'unit'
+    else:  # sap
+        code_key, desc_keys, unit_key = 'material', ('material_description',), 'base_unit_of_measure'
+    
+    # First non-empty description column wins
+    descriptions = rows.column(desc_keys[0])
+    for desc_key in desc_keys[1:]:
+        descriptions = [first or second for first, second in zip(descriptions, rows.column(desc_key))]
     
-    for row in rows:
-        # Get item code (WMS uses item_code, SAP uses material)
-        item_code = row.get('item_code') if source_type == 'wms' else row.get('material')
-        if not item_code:
+    # Extract unique item codes (first occurrence wins)
+    seen = set()
+    materials_list = []
+    last_seen_at = datetime.utcnow().isoformat()
+    
+    for item_code, description, unit in zip(rows.column(code_key), descriptions, rows.column(unit_key)):
+        if not item_code or item_code in seen:
             continue
+        seen.add(item_code)
         
-        # Get description
-        description = None
-        if source_type == 'wms':
-            description = row.get('description') or row.get('item_nm')
-        else:  # sap
-            description = row.get('material_description')
-        
-        # Get unit
-        unit = row.get('unit') if source_type == 'wms' else row.get('base_unit_of_measure')
-        
-        # Store unique materials
-        if item_code not in materials_to_upsert:
-            materials_to_upsert[item_code] = {
-                'item_code': item_code,
-                'description': description,
-                'unit': unit,
-                'source_system': source_type,
-                'last_seen_at': datetime.utcnow().isoformat()
-            }
+        materials_list.append({
+            'item_code': item_code,
+            'description': description,
+            'unit': unit,
+            'source_system': source_type,
+            'last_seen_at': last_seen_at
+        })
     
-    if not materials_to_upsert:
+    if not materials_list:
         return 0
     
     # Batch upsert materials (much more efficient!)
-    materials_list = list(materials_to_upsert.values())
     upserted_count = 0
     
     try:
         # Use Supabase upsert with onConflict
         # This does INSERT or UPDATE in one query
-        result = supabase.table('materials').upsert(
+        supabase.table('materials').upsert(
             materials_list,
             on_conflict='item_code',
-            ignore_duplicates=False
+            ignore_duplicates=False,
+            returning='minimal'
         ).execute()
         
-        upserted_count = len(result.data) if result.data else len(materials_list)
+        upserted_count = len(materials_list)
         logger.info(f"📦 Upserted {upserted_count} materials into catalog (batch operation)")
         
     except Exception as e:
         logger.error(f"Error batch upserting materials: {e}")
-        # Fallback to individual inserts if batch fails
-        logger.info("Falling back to individual upserts...")
-        for material in materials_list:
+        # Prefer a single-transaction executemany over one REST round trip per material
+        upserted = await upsert_materials_pg(materials_list)
+        if upserted is not None:
+            logger.info(f"📦 Upserted {upserted} materials into catalog (executemany fallback)")
+            return upserted
+        # Fallback: retry in halves so bad rows are isolated in O(log N) round trips
+        logger.info("Falling back to chunked upserts...")
+        mid = len(materials_list) // 2
+        chunks = [chunk for chunk in (materials_list[:mid], materials_list[mid:]) if chunk]
+        while chunks:
+            chunk = chunks.pop()
             try:
                 supabase.table('materials').upsert(
-                    material,
-                    on_conflict='item_code'
+                    chunk,
+                    on_conflict='item_code',
+                    returning='minimal'
                 ).execute()
-                upserted_count += 1
+                upserted_count += len(chunk)
             except Exception as e2:
-                logger.error(f"Error upserting material {material['item_code']}: {e2}")
+                if len(chunk) > 1:
+                    mid = len(chunk) // 2
+                    chunks += [chunk[:mid], chunk[mid:]]
+                else:
+                    logger.error(f"Error upserting material {chunk[0]['item_code']}: {e2}")
     
     return upserted_count
 
-async def insert_wms_rows(rows: List[Dict[str, Any]]) -> int:
+# NULL marker for COPY; in CSV mode an empty field is then read as an empty string
+COPY_NULL = r'\N'
+
+async def copy_raw_rows(table_name: str, rows: MappedRows) -> Optional[int]:
+    """
+    Bulk-load rows with Postgres COPY when a direct connection is configured.
+    Returns None if COPY is unavailable or failed, so callers can fall back to REST.
+    """
+    pool = await get_pg_pool()
+    if pool is None:
+        return None
+    
+    # CSV text format lets Postgres parse dates/numerics/uuids from the mapped string values.
+    # None is written as an explicit NULL marker so empty strings stay '' like the REST path.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [COPY_NULL if value is None else value for value in row]
+        for row in rows.rows
+    )
+    
+    try:
+        async with pool.acquire() as conn:
+            status = await conn.copy_to_table(
+                table_name,
+                source=io.BytesIO(buffer.getvalue().encode('utf-8')),
+                columns=rows.columns,
+                format='csv',
+                null=COPY_NULL
+            )
+        # Status looks like "COPY 1234"
+        return int(status.split()[-1])
+    except Exception as e:
+        logger.error(f"COPY into {table_name} failed, falling back to REST inserts: {e}")
+        return None
+
+# Upper bound on REST insert batches in flight at once (shared across sources)
+INSERT_CONCURRENCY = 8
+_insert_semaphore = asyncio.Semaphore(INSERT_CONCURRENCY)
+
+def dumps_json(payload: Any) -> bytes:
+    """Encode a request body with orjson"""
+    return orjson.dumps(payload)
+
+# Shared async PostgREST client for bulk inserts (created lazily)
+_rest_client: Optional[httpx.AsyncClient] = None
+
+def get_rest_client() -> httpx.AsyncClient:
+    """Get the shared httpx client pointed at the Supabase REST endpoint"""
+    global _rest_client
+    if _rest_client is None:
+        _rest_client = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            timeout=POSTGREST_TIMEOUT,
+            headers={
+                "apikey": SUPABASE_SERVICE_KEY,
+                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+                "Content-Type": "application/json",
+            }
+        )
+    return _rest_client
+
+async def close_rest_client() -> None:
+    """Close the shared REST client"""
+    global _rest_client
+    if _rest_client is not None:
+        await _rest_client.aclose()
+        _rest_client = None
+
+async def insert_raw_batches(table_name: str, rows: MappedRows, batch_size: int, label: str) -> int:
+    """Insert rows through the REST API in concurrent batches"""
+    async def _send(batch_no: int, start: int) -> int:
+        async with _insert_semaphore:
+            try:
+                # Dicts are only built for batches actually in flight
+                batch = rows.to_dicts(start, start + batch_size)
+                # Post pre-encoded JSON directly; supabase-py would serialise with stdlib json.
+                # return=minimal skips RETURNING: a failed batch raises, so a 2xx means all rows landed
+                response = await get_rest_client().post(
+                    f"/{table_name}",
+                    content=dumps_json(batch),
+                    headers={"Prefer": "return=minimal"}
+                )
+                response.raise_for_status()
+                return len(batch)
+            except Exception as e:
+                logger.error(f"Error inserting {label} batch {batch_no}: {e}")
+                return 0
+    
+    results = await asyncio.gather(*[
+        _send(i // batch_size + 1, i)
+        for i in range(0, len(rows), batch_size)
+    ])
+    return sum(results)
+
+async def delete_batch_rows(
+    table_name: str,
+    source_id: str,
+    batch_id: str,
+    split_value: Optional[str] = None
+) -> None:
+    """Remove rows one source already wrote under batch_id, so a failed ingest leaves no partial load"""
+    params = {"source_id": f"eq.{source_id}", "batch_id": f"eq.{batch_id}"}
+    if split_value:
+        params["split_key"] = f"eq.{split_value}"
+    try:
+        response = await get_rest_client().delete(f"/{table_name}", params=params)
+        response.raise_for_status()
+        logger.info(f"🧹 Removed partial batch {batch_id} of source {source_id} from {table_name}")
+    except Exception as e:
+        logger.error(f"Failed to remove partial batch {batch_id} from {table_name}: {e}")
+
+async def insert_wms_rows(rows: MappedRows) -> int:
     """Insert WMS rows into wms_raw_rows table"""
     if not supabase or not rows:
         return 0
     
-    # Insert in batches
-    batch_size = 3000
-    total_inserted = 0
+    copied = await copy_raw_rows('wms_raw_rows', rows)
+    if copied is not None:
+        return copied
     
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i:i + batch_size]
-        try:
-            result = supabase.table('wms_raw_rows').insert(batch).execute()
-            total_inserted += len(result.data) if result.data else 0
-        except Exception as e:
-            logger.error(f"Error inserting WMS batch {i//batch_size + 1}: {e}")
-    
-    return total_inserted
+    # Insert in batches
+    return await insert_raw_batches('wms_raw_rows', rows, batch_size=3000, label='WMS')
 
-async def insert_sap_rows(rows: List[Dict[str, Any]]) -> int:
+async def insert_sap_rows(rows: MappedRows) -> int:
     """Insert SAP rows into sap_raw_rows table"""
     if not supabase or not rows:
         return 0
     
-    # Insert in batches
-    batch_size = 1000
-    total_inserted = 0
-    
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i:i + batch_size]
-        try:
-            result = supabase.table('sap_raw_rows').insert(batch).execute()
-            total_inserted += len(result.data) if result.data else 0
-        except Exception as e:
-            logger.error(f"Error inserting SAP batch {i//batch_size + 1}: {e}")
+    copied = await copy_raw_rows('sap_raw_rows', rows)
+    if copied is not None:
+        return copied
     
-    return total_inserted
+    # Insert in batches
+    return await insert_raw_batches('sap_raw_rows', rows, batch_size=1000, label='SAP')
+
+# Sheet mappers specialised per (source, classification, header row)
+_row_mappers: Dict[Tuple[str, str, str, Tuple[Any, ...]], Callable[[List[List[Any]]], MappedRows]] = {}
+
+def get_row_mapper(
+    source: Dict[str, Any],
+    classification: ClassificationConfig,
+    header_row: Tuple[Any, ...]
+) -> Callable[[List[List[Any]]], MappedRows]:
+    """Get (or build) the cached normalize+map function for a source's header and classification"""
+    key = (source['id'], source['type'], classification.model_dump_json(), header_row)
+    mapper = _row_mappers.get(key)
+    if mapper is None:
+        if len(_row_mappers) >= 256:
+            _row_mappers.clear()
+        mapper = build_values_mapper(list(header_row), source['type'], classification, get_value_coercer)
+        _row_mappers[key] = mapper
+    return mapper
+
+# Columns appended to every mapped row; split_key is per row and comes last
+TAG_COLUMNS = ('source_id', 'source_type', 'batch_id', 'fetched_at', 'split_key')
+
+def tag_rows(columns: List[str], selected: List[Tuple[tuple, Optional[str]]], tags: tuple) -> MappedRows:
+    """Append source/batch tags and split_key to each selected row tuple"""
+    if any(column in TAG_COLUMNS for column in columns):
+        # Tags take precedence over sheet columns of the same name
+        keep = [i for i, column in enumerate(columns) if column not in TAG_COLUMNS]
+        columns = [columns[i] for i in keep]
+        selected = [(tuple(row[i] for i in keep), split_key) for row, split_key in selected]
+    return MappedRows(
+        list(columns) + list(TAG_COLUMNS),
+        [row + tags + (split_key,) for row, split_key in selected]
+    )
+
+def log_sap_header_diagnostics(values: List[List[str]]) -> None:
+    """Log SAP header/material column diagnostics for the first page of a sheet (debug only)"""
+    logger.debug("SAP headers: %s", values[0])
+    logger.debug("SAP first data row: %s", values[1] if len(values) > 1 else 'No data rows')
+
+    header_row = values[0]
+    logger.debug("SAP header row has %d columns", len(header_row))
+
+    # Check if first row looks like headers
+    header_like_count = sum(1 for h in header_row if h and isinstance(h, str) and len(h.strip()) > 0)
+    logger.debug("SAP header-like cells: %d/%d", header_like_count, len(header_row))
+
+    # Exact 'material' header first, then any header containing it
+    header_index = {str(h).strip().lower(): i for i, h in enumerate(header_row) if h}
+    material_idx = header_index.get('material')
+    if material_idx is None:
+        material_idx = next((i for name, i in header_index.items() if 'material' in name), None)
+
+    if material_idx is not None:
+        logger.debug("SAP 'Material' column found at index %d", material_idx)
+        # Check multiple data rows for material values
+        material_values_found = 0
+        empty_material_count = 0
+        for row_idx in range(1, min(11, len(values))):  # Check first 10 data rows
+            row = values[row_idx]
+            if material_idx < len(row):
+                material_value = row[material_idx]
+                if material_value and str(material_value).strip():
+                    material_values_found += 1
+                    logger.debug("SAP row %d material value: '%s'", row_idx, material_value)
+                else:
+                    empty_material_count += 1
+                    logger.debug("SAP row %d material EMPTY: '%s'", row_idx, material_value)
+        logger.debug("SAP material values: %d found, %d empty", material_values_found, empty_material_count)
+
+        if material_values_found == 0:
+            logger.debug("All SAP material values are empty! No rows will be inserted!")
+    else:
+        logger.debug("SAP 'Material' column NOT found. Available headers: %s", [h for h in header_row if h])
 
 async def ingest_source(
     source: Dict[str, Any],
@@ -139,85 +370,6 @@ async def ingest_source(
     rows_processed = 0
 
     try:
-
-        # Fetch sheet data
-        logger.info(f"Fetching data for source {source['label']} (type: {source_type})")
-        try:
-            values = await fetch_sheet_values(
-                source['spreadsheet_id'],
-                source['sheet_name'],
-                None
-            )
-            logger.info(f"Sheet fetch result: {'SUCCESS' if values else 'FAILED'}, rows: {len(values) if values else 0}")
-            if values and len(values) > 0:
-                logger.info(f"First row preview: {values[0][:5] if len(values[0]) >= 5 else values[0]}")
-        except Exception as e:
-            logger.error(f"Sheet fetch EXCEPTION: {e}")
-            values = None
-
-        logger.info(f"Source {source['label']}: Fetched {len(values) if values else 0} rows")
-        if source_type == 'sap' and values:
-            logger.info(f"SAP headers: {values[0] if len(values) > 0 else 'No headers'}")
-            logger.info(f"SAP first data row: {values[1] if len(values) > 1 else 'No data rows'}")
-
-            if len(values) > 0:
-                header_row = values[0]
-                logger.info(f"SAP header row has {len(header_row)} columns")
-
-                # Check if first row looks like headers
-                header_like_count = sum(1 for h in header_row if h and isinstance(h, str) and len(h.strip()) > 0)
-                logger.info(f"SAP header-like cells: {header_like_count}/{len(header_row)}")
-
-                material_idx = None
-                for i, header in enumerate(header_row):
-                    if header and 'material' in header.lower():
-                        material_idx = i
-                        break
-
-                if material_idx is not None:
-                    logger.info(f"SAP 'Material' column found at index {material_idx}")
-                    # Check multiple data rows for material values
-                    material_values_found = 0
-                    empty_material_count = 0
-                    for row_idx in range(1, min(11, len(values))):  # Check first 10 data rows
-                        if row_idx < len(values):
-                            row = values[row_idx]
-                            if material_idx < len(row):
-                                material_value = row[material_idx]
-                                if material_value and str(material_value).strip():
-                                    material_values_found += 1
-                                    logger.info(f"SAP row {row_idx} material value: '{material_value}'")
-                                else:
-                                    empty_material_count += 1
-                                    logger.warning(f"SAP row {row_idx} material EMPTY: '{material_value}'")
-                    logger.info(f"SAP material values: {material_values_found} found, {empty_material_count} empty")
-
-                    if material_values_found == 0:
-                        logger.error(f"CRITICAL: All SAP material values are empty! No rows will be inserted!")
-                        logger.error(f"SAP first 5 empty values: {[values[i][material_idx] if i < len(values) and material_idx < len(values[i]) else 'INDEX_ERROR' for i in range(1, 6)]}")
-                else:
-                    logger.error(f"SAP 'Material' column NOT found. Available headers: {[h for h in header_row if h]}")
-
-        if not values or len(values) < 2:
-            errors.append(f"Source {source['label']}: No data found")
-            logger.error(f"CRITICAL: SAP source {source['label']} returned no data!")
-            logger.error(f"  - values is None: {values is None}")
-            logger.error(f"  - len(values): {len(values) if values else 'N/A'}")
-            if values and len(values) >= 1:
-                logger.error(f"  - first row: {values[0][:5] if len(values[0]) >= 5 else values[0]}")
-            return 0, errors
-
-        # Get header and normalize rows
-        header = values[0]
-        normalized_rows = normalize(values)
-
-        logger.info(f"📊 Source {source['label']}: Fetched {len(values)} total rows from Google Sheet")
-        logger.info(f"📊 After normalization: {len(normalized_rows)} valid rows")
-
-        if not normalized_rows:
-            errors.append(f"Source {source['label']}: No valid rows after normalization")
-            return 0, errors
-
         # Parse classification config
         classification = ClassificationConfig(**source.get('classification', {}))
 
@@ -225,94 +377,77 @@ async def ingest_source(
         if classification.split_enabled:
             logger.info(f"🔀 Split enabled: column = '{classification.split_by_column}'")
 
-        # Prepare rows for insertion
-        rows_to_insert = []
+        source_id = source['id']
+        fetched_at = datetime.utcnow().isoformat()  # One timestamp for the whole fetch
+        debug_sap = source_type == 'sap' and logger.isEnabledFor(logging.DEBUG)
+        
+        total_fetched = 0
+        total_normalized = 0
+        rows_ready = 0
         skipped_by_split = 0
         skipped_no_item = 0
-        split_values_found = set()  # Track unique split values
+        # Unique split values are only tracked for debug logs of unfiltered ingests; otherwise
+        # use SELECT DISTINCT split_key ... WHERE batch_id = <batch> after the fact
+        track_split_values = split_value is None and logger.isEnabledFor(logging.DEBUG)
+        split_values_found = set()
         
-        for i, norm_row in enumerate(normalized_rows):
-            # Map Google Sheet columns to PostgreSQL columns
-            if source_type == 'wms':
-                mapped_row = map_wms_row(norm_row, classification)
-            else:  # sap
-                mapped_row = map_sap_row(norm_row, classification)
-
+        # Fetch sheet data page by page so only one page is held in memory at a time
+        logger.info(f"Fetching data for source {source['label']} (type: {source_type})")
+        async for values in stream_sheet_values(source['spreadsheet_id'], source['sheet_name'], SHEET_PAGE_SIZE):
+            if total_fetched == 0:
+                logger.info(f"First row preview: {values[0][:5]}")
+                if debug_sap:
+                    log_sap_header_diagnostics(values)
+            total_fetched += len(values) - 1
+            
+            # Normalize and map in one pass, reading only the columns that are stored
+            mapper = get_row_mapper(source, classification, tuple(values[0]))
+            mapped_rows = mapper(values[1:])
+            row_offset = total_normalized
+            total_normalized += len(mapped_rows)
+            
             # Debug: Print first few SAP rows
-            if source_type == 'sap' and i < 5:
-                logger.info(f"SAP row {i}: material={mapped_row.get('material')}, unrestricted_qty={mapped_row.get('unrestricted_qty')}")
-                logger.info(f"SAP row {i} keys: {list(mapped_row.keys())}")
-                logger.info(f"SAP row {i} original data keys: {list(norm_row.keys()) if isinstance(norm_row, dict) else 'not dict'}")
-                # Check if 'Material' header exists in original data
-                if 'Material' in norm_row:
-                    logger.info(f"SAP row {i}: 'Material' header found with value: {norm_row['Material']}")
-                else:
-                    logger.info(f"SAP row {i}: 'Material' header NOT found in original data")
-
-                # Check if material is empty/null - this could cause insertion failure
-                material_value = mapped_row.get('material')
-                if not material_value or str(material_value).strip() == '':
-                    logger.warning(f"SAP row {i}: material is empty/null! This row will NOT be inserted!")
-                else:
-                    logger.info(f"SAP row {i}: material OK - will be inserted")
-
-            # Skip rows without item/material code
-            item_code = mapped_row.get('item_code') or mapped_row.get('material')
-            if not item_code:
-                skipped_no_item += 1
-                if source_type == 'sap' and i < 5:  # Log first few missing materials
-                    logger.info(f"SAP row {i} missing material: {mapped_row}")
-                # TEMPORARILY DISABLE SKIP FOR DEBUGGING
-                # continue
-                logger.warning(f"SAP row {i}: ALLOWING INSERT despite missing material (DEBUG MODE)")
-                item_code = f"NO_MATERIAL_{i}"  # Temporary item code for debugging
+            if debug_sap and row_offset < 5:
+                for i, mapped_row in enumerate(mapped_rows.to_dicts(0, 5 - row_offset), start=row_offset):
+                    logger.debug("SAP row %d: material=%s, unrestricted_qty=%s", i, mapped_row.get('material'), mapped_row.get('unrestricted_qty'))
+                    logger.debug("SAP row %d keys: %s", i, list(mapped_row.keys()))
+                    if not mapped_row.get('material'):
+                        logger.debug("SAP row %d missing material: %s", i, mapped_row)
             
-            # Extract split_key
-            split_key = get_split_key(mapped_row, classification)
+            # Skip rows without item/material code
+            item_codes = [
+                item_code or material
+                for item_code, material in zip(mapped_rows.column('item_code'), mapped_rows.column('material'))
+            ]
             
-            # Track unique split values
-            if split_key:
-                split_values_found.add(split_key)
+            # Extract split_key and track unique split values
+            split_keys = get_split_keys(mapped_rows, classification)
+            if track_split_values:
+                split_values_found.update(key for key, code in zip(split_keys, item_codes) if key and code)
             
             # Filter by split_value if specified
-            if split_value and split_key != split_value:
-                skipped_by_split += 1
-                if source_type == 'sap' and skipped_by_split < 6:  # Log first few skips
-                    logger.info(f"SAP row {i} skipped by split filter: split_key='{split_key}' != split_value='{split_value}'")
-                continue
-            elif split_value and source_type == 'sap' and i < 3:  # Log successful matches
-                logger.info(f"SAP row {i} passed split filter: split_key='{split_key}' == split_value='{split_value}'")
+            selected = []
+            for row, item_code, split_key in zip(mapped_rows.rows, item_codes, split_keys):
+                if not item_code:
+                    skipped_no_item += 1
+                elif split_value and split_key != split_value:
+                    skipped_by_split += 1
+                else:
+                    selected.append((row, split_key))
             
             # Note: warehouse_code column removed from tables
             # split_key is stored for warehouse-specific filtering during read
-            mapped_row['source_id'] = source['id']
-            mapped_row['source_type'] = source_type  # Required NOT NULL field
-            mapped_row['split_key'] = split_key
-            mapped_row['batch_id'] = batch_id
-            mapped_row['fetched_at'] = datetime.utcnow().isoformat()
+            rows_to_insert = tag_rows(mapped_rows.columns, selected, (source_id, source_type, batch_id, fetched_at))
             
-            rows_to_insert.append(mapped_row)
-        
-        # Log filtering results
-        logger.info(f"📈 Source {source['label']} filtering results:")
-        logger.info(f"   - Total normalized rows: {len(normalized_rows)}")
-        logger.info(f"   - Skipped (no item code): {skipped_no_item}")
-        logger.info(f"   - Skipped (split filter): {skipped_by_split}")
-        logger.info(f"   - Ready to insert: {len(rows_to_insert)}")
-        if split_value:
-            logger.info(f"   - Filtering by split_value: '{split_value}'")
-        if split_values_found:
-            logger.info(f"   - Unique split values found in data: {sorted(split_values_found)}")
-            logger.info(f"   - Total unique split values: {len(split_values_found)}")
-        
-        if not dry_run and rows_to_insert:
-            # Insert into appropriate table
+            rows_ready += len(rows_to_insert)
+            if dry_run or not rows_to_insert:
+                continue
+            
+            # Insert this page into the appropriate table before fetching the next one
             if source_type == 'wms':
-                rows_processed = await insert_wms_rows(rows_to_insert)
-                logger.info(f"✅ Inserted {rows_processed} WMS rows from {source['label']}")
+                rows_processed += await insert_wms_rows(rows_to_insert)
             else:
-                rows_processed = await insert_sap_rows(rows_to_insert)
-                logger.info(f"✅ Inserted {rows_processed} SAP rows from {source['label']}")
+                rows_processed += await insert_sap_rows(rows_to_insert)
             
             # Update materials catalog
             try:
@@ -320,17 +455,125 @@ async def ingest_source(
                 logger.info(f"📦 Updated {materials_updated} materials in catalog from {source['label']}")
             except Exception as e:
                 logger.error(f"Failed to update materials catalog: {e}")
-        else:
-            rows_processed = len(rows_to_insert)
+
+        logger.info(f"📊 Source {source['label']}: Fetched {total_fetched} data rows from Google Sheet")
+        logger.info(f"📊 After normalization: {total_normalized} valid rows")
+
+        if total_fetched == 0:
+            errors.append(f"Source {source['label']}: No data found")
+            logger.error(f"CRITICAL: {source_type.upper()} source {source['label']} returned no data!")
+            return 0, errors
+
+        if total_normalized == 0:
+            errors.append(f"Source {source['label']}: No valid rows after normalization")
+            return 0, errors
+        
+        # Log filtering results
+        logger.info(f"📈 Source {source['label']} filtering results:")
+        logger.info(f"   - Total normalized rows: {total_normalized}")
+        logger.info(f"   - Skipped (no item code): {skipped_no_item}")
+        logger.info(f"   - Skipped (split filter): {skipped_by_split}")
+        logger.info(f"   - Ready to insert: {rows_ready}")
+        if split_value:
+            logger.info(f"   - Filtering by split_value: '{split_value}'")
+        if split_values_found:
+            logger.debug("   - Unique split values found in data: %s", sorted(split_values_found))
+            logger.debug("   - Total unique split values: %d", len(split_values_found))
+        
+        if dry_run:
+            rows_processed = rows_ready
             logger.info(f"Dry run: Would insert {rows_processed} {source_type.upper()} rows from {source['label']}")
+        else:
+            logger.info(f"✅ Inserted {rows_processed} {source_type.upper()} rows from {source['label']}")
         
     except Exception as e:
         error_msg = f"Source {source['label']}: {str(e)}"
         errors.append(error_msg)
         logger.error(error_msg)
+        
+        # Pages inserted before the failure would otherwise stay behind as a partial load
+        if rows_processed and not dry_run:
+            table_name = 'wms_raw_rows' if source_type == 'wms' else 'sap_raw_rows'
+            await delete_batch_rows(table_name, source['id'], batch_id, split_value)
+            rows_processed = 0
     
     return rows_processed, errors
 
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-run
+_background_tasks: set = set()
+
+# Materialized views are refreshed as soon as an ingest asks; requests that arrive
+# while a refresh is running are coalesced into a single follow-up refresh
+_mv_refresh_pending = False
+_mv_refresh_task: Optional[asyncio.Task] = None
+
+# Post-ingest update failures per warehouse, reported with that warehouse's next ingest
+_post_ingest_errors: Dict[str, List[str]] = {}
+
+async def _refresh_materialized_views_loop() -> Optional[Exception]:
+    """Refresh all materialized views until no new request is pending, returns the last error"""
+    global _mv_refresh_pending
+    error = None
+    while _mv_refresh_pending:
+        _mv_refresh_pending = False
+        try:
+            result_mv = await asyncio.to_thread(supabase.rpc('refresh_all_materialized_views').execute)
+            logger.info(f"🔄 All materialized views refreshed: {result_mv.data}")
+            error = None
+        except Exception as e:
+            logger.error(f"Materialized view refresh failed: {e}")
+            error = e
+    return error
+
+async def refresh_materialized_views() -> None:
+    """Refresh materialized views now, or join the follow-up of a refresh already running"""
+    global _mv_refresh_pending, _mv_refresh_task
+    _mv_refresh_pending = True
+    if _mv_refresh_task is None or _mv_refresh_task.done():
+        _mv_refresh_task = asyncio.create_task(_refresh_materialized_views_loop())
+    # The loop only finishes after a refresh that started after this request
+    error = await asyncio.shield(_mv_refresh_task)
+    if error is not None:
+        raise error
+
+async def run_post_ingest_updates(warehouse_code: str) -> None:
+    """Update zone capacities, inventory snapshot, materialized views and dashboard caches after a WMS ingest"""
+    from zone_capacity import get_zone_capacity_manager
+    from inventory_snapshot import get_inventory_snapshot_manager
+    from dashboard_cache import get_dashboard_cache_manager
+
+    async def update_zone_capacities():
+        manager = get_zone_capacity_manager()
+        await asyncio.to_thread(manager.update_current_quantities, [warehouse_code])
+
+    async def update_inventory_snapshot():
+        snapshot_manager = get_inventory_snapshot_manager()
+        await snapshot_manager.update_inventory_snapshot(warehouse_code)
+
+    async def update_dashboard_cache():
+        # Zone utilization reads location_inventory_summary_mv, so warm up after the refresh
+        try:
+            await refresh_materialized_views()
+        finally:
+            cache_manager = get_dashboard_cache_manager()
+            await cache_manager.warmup([warehouse_code])
+
+    steps = {
+        'zone capacities': update_zone_capacities(),
+        'inventory snapshot': update_inventory_snapshot(),
+        'materialized views and dashboard cache': update_dashboard_cache(),
+    }
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    errors = []
+    for name, step_result in zip(steps, results):
+        if isinstance(step_result, Exception):
+            logger.error(f"❌ Failed to update {name} for warehouse {warehouse_code}: {step_result}")
+            errors.append(f"Failed to update {name}: {step_result}")
+        else:
+            logger.info(f"✅ Updated {name} for warehouse {warehouse_code}")
+    if errors:
+        _post_ingest_errors.setdefault(warehouse_code, []).extend(errors)
+
 async def ingest_warehouse_data(
     warehouse_code: str,
     types: List[str],
@@ -348,9 +591,13 @@ async def ingest_warehouse_data(
         batch_id=batch_id
     )
     
+    # Post-ingest updates run in the background, so their failures surface on the next ingest
+    for error in _post_ingest_errors.pop(warehouse_code, []):
+        result.warnings.append(f'Previous post-ingest update: {error}')
+    
     try:
         # Get warehouse binding
-        binding = await get_warehouse_binding(warehouse_code)
+        binding = await get_warehouse_binding_cached(warehouse_code)
         if not binding:
             result.errors.append({
                 'type': 'binding_error',
@@ -404,14 +651,30 @@ async def ingest_warehouse_data(
             return result
         
         # Fetch all sources
-        sources_result = supabase.table('sheet_sources').select('*').in_('id', source_ids_to_process).execute()
-        sources = sources_result.data if sources_result else []
+        sources = await get_sheet_sources_by_ids(source_ids_to_process)
         
         # Create a map of source_id -> source
         source_map = {s['id']: s for s in sources}
         
+        # Bound concurrent sources so Sheets quota and the DB pool are not exhausted
+        semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+        
+        async def ingest_bounded(source: Dict[str, Any], split_value: Optional[str]):
+            async with semaphore:
+                try:
+                    return await ingest_source(
+                        source,
+                        warehouse_code,
+                        batch_id,
+                        dry_run,
+                        split_value=split_value
+                    )
+                except Exception as e:
+                    # Report per source instead of cancelling the whole group
+                    return e
+        
         # Process each source-split binding
-        tasks = []
+        jobs = []
         for binding in source_bindings_to_process:
             source_id = binding['source_id']
             split_value = binding.get('split_value')
@@ -424,18 +687,13 @@ async def ingest_warehouse_data(
             if source['type'] not in types:
                 continue
             
-            task = ingest_source(
-                source,
-                warehouse_code,
-                batch_id,
-                dry_run,
-                split_value=split_value
-            )
-            tasks.append(task)
+            jobs.append((source, split_value))
         
         # Run all ingestion tasks concurrently
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        if jobs:
+            async with asyncio.TaskGroup() as task_group:
+                tasks = [task_group.create_task(ingest_bounded(source, split_value)) for source, split_value in jobs]
+            results = [task.result() for task in tasks]
             
             for i, (task_result) in enumerate(results):
                 if isinstance(task_result, Exception):
@@ -473,84 +731,12 @@ async def ingest_warehouse_data(
     if 'wms' in types and result.rows_inserted > 0 and not dry_run:
         debug_logs.append(f"✅ Conditions met for {warehouse_code}, updating snapshots...")
 
-        try:
-            from zone_capacity import get_zone_capacity_manager
-            manager = get_zone_capacity_manager()
-            manager.update_current_quantities([warehouse_code])
-            debug_logs.append(f"✅ Updated zone capacities for warehouse {warehouse_code}")
-        except Exception as e:
-            debug_logs.append(f"❌ Failed to update zone capacities for warehouse {warehouse_code}: {e}")
-
-        # Update inventory snapshot for this warehouse
-        debug_logs.append(f"🚀 Starting inventory snapshot update for {warehouse_code}...")
-        try:
-            debug_logs.append(f"   Importing inventory_snapshot module...")
-            from inventory_snapshot import get_inventory_snapshot_manager
-            debug_logs.append(f"   Getting snapshot manager...")
-            snapshot_manager = get_inventory_snapshot_manager()
-            debug_logs.append(f"   Calling update_inventory_snapshot...")
-            await snapshot_manager.update_inventory_snapshot(warehouse_code)
-            debug_logs.append(f"✅ COMPLETED: Updated inventory snapshot for warehouse {warehouse_code}")
-
-            # 파일 생성 확인
-            import os
-            snapshot_path = f"data/inventory_snapshots/{warehouse_code}.json"
-            if os.path.exists(snapshot_path):
-                size = os.path.getsize(snapshot_path)
-                debug_logs.append(f"✅ FILE CREATED: {snapshot_path} ({size} bytes)")
-            else:
-                debug_logs.append(f"❌ FILE NOT FOUND: {snapshot_path}")
-
-        except Exception as e:
-            debug_logs.append(f"❌ FAILED: Inventory snapshot update for {warehouse_code}: {e}")
-            import traceback
-            debug_logs.append(traceback.format_exc())
-
-        # Update dashboard cache for this warehouse
-        debug_logs.append(f"📊 Starting dashboard cache update for {warehouse_code}...")
-        try:
-            debug_logs.append(f"   Importing dashboard_cache module...")
-            from dashboard_cache import get_dashboard_cache_manager
-            debug_logs.append(f"   Getting cache manager...")
-            cache_manager = get_dashboard_cache_manager()
-            debug_logs.append(f"   Updating all dashboard caches...")
-
-            # Update all dashboard caches (inventory stats, zone utilization, etc.)
-            await cache_manager.get_inventory_stats([warehouse_code])  # This will calculate and cache
-            await cache_manager.get_zone_utilization([warehouse_code])
-            await cache_manager.get_user_defined_zones([warehouse_code])
-            await cache_manager.get_expiring_items([warehouse_code])
-
-            debug_logs.append(f"✅ COMPLETED: Updated dashboard cache for warehouse {warehouse_code}")
-
-            # 캐시 파일들 확인
-            import os
-            cache_dir = "data/dashboard_cache"
-            if os.path.exists(cache_dir):
-                cache_files = [f for f in os.listdir(cache_dir) if f.endswith('.json') and warehouse_code in f]
-                debug_logs.append(f"✅ CACHE FILES CREATED: {len(cache_files)} files for {warehouse_code}")
-                for cache_file in cache_files[:3]:  # 처음 3개만 표시
-                    file_path = f"{cache_dir}/{cache_file}"
-                    size = os.path.getsize(file_path)
-                    debug_logs.append(f"   📄 {cache_file} ({size} bytes)")
-            else:
-                debug_logs.append(f"❌ CACHE DIR NOT FOUND: {cache_dir}")
-
-        except Exception as e:
-            debug_logs.append(f"❌ FAILED: Dashboard cache update for {warehouse_code}: {e}")
-            import traceback
-            debug_logs.append(traceback.format_exc())
-
-        # Refresh all materialized views after data ingestion
-        debug_logs.append(f"🔄 Refreshing all materialized views...")
-        try:
-            result_mv = supabase.rpc('refresh_all_materialized_views').execute()
-            debug_logs.append(f"✅ COMPLETED: All materialized views refreshed successfully")
-            if result_mv.data:
-                debug_logs.append(f"   MV Refresh Results: {result_mv.data}")
-        except Exception as e:
-            debug_logs.append(f"⚠️ WARNING: Materialized view refresh failed: {e}")
-            # Don't raise - allow ingestion to succeed even if MV refresh fails
+        # Zone capacities, snapshot, materialized views and dashboard caches are refreshed
+        # in the background so the ingest response does not wait on them
+        task = asyncio.create_task(run_post_ingest_updates(warehouse_code))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        debug_logs.append(f"🕒 Scheduled zone capacity, inventory snapshot and dashboard cache updates for {warehouse_code}")
 
     else:
         debug_logs.append(f"❌ Conditions NOT met for {warehouse_code}, skipping snapshot updates")
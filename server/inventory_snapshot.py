@@ -4,12 +4,157 @@ Pre-calculates and caches inventory view data for performance
 Similar to zone_capacity.py but for inventory listings
 """
 
-import json
+import asyncio
+import copy
+import gzip
+import hashlib
+import itertools
+import logging
+import mmap
 import os
+import threading
+import time
+import uuid
+import orjson
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Tuple
 from pathlib import Path
-from supabase_client import supabase
+from supabase_client import supabase, get_warehouse_binding
+from column_mapping import WMS_COLUMN_MAP, SAP_COLUMN_MAP
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd compression, gzip is used otherwise
+    zstandard = None
+
+# Pretty-print snapshot files (debugging only; snapshots are machine-read)
+SNAPSHOT_PRETTY = os.getenv('SNAPSHOT_PRETTY', '0') == '1'
+
+# Max concurrent raw-row queries per snapshot update
+SNAPSHOT_FETCH_CONCURRENCY = 8
+
+# Rows per raw-row page request
+SNAPSHOT_PAGE_SIZE = 5000
+
+# Columns kept in snapshots: the mapped sheet columns plus the ids, split/batch
+# tags and generated lookup columns read by the inventory view and zone capacity.
+# warehouse_code and source_type are filled in per snapshot instead.
+WMS_COLUMNS = ','.join(dict.fromkeys([
+    'id', 'source_id', 'split_key', 'batch_id', 'fetched_at',
+    'zone', 'location', 'lot_key',
+    *WMS_COLUMN_MAP.values(),
+]))
+SAP_COLUMNS = ','.join(dict.fromkeys([
+    'id', 'source_id', 'split_key', 'batch_id', 'fetched_at',
+    *SAP_COLUMN_MAP.values(),
+]))
+
+# Max warehouses updated at once by update_all_inventory_snapshots
+SNAPSHOT_WAREHOUSE_CONCURRENCY = 4
+
+# Seconds to reuse the list of bound warehouses in update_all_inventory_snapshots
+WAREHOUSES_CACHE_TTL = 60.0
+
+# Decoded source_bindings blobs kept in memory (most recently used)
+BINDINGS_CACHE_SIZE = 32
+
+# Snapshots are stored compressed; zstd when available, fast gzip otherwise
+SNAPSHOT_SUFFIX = '.json.zst' if zstandard is not None else '.json.gz'
+
+# Each snapshot is a small metadata file plus one rows file per source type,
+# so readers that need one type don't parse the other
+SNAPSHOT_PARTS = ('wms', 'sap')
+
+
+def encode_snapshot(data: Any) -> bytes:
+    """Serialize snapshot data to JSON bytes"""
+    option = orjson.OPT_NON_STR_KEYS
+    if SNAPSHOT_PRETTY:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, option=option, default=str)
+
+
+def bindings_hash(source_bindings: Dict[str, Any]) -> str:
+    """Stable content hash of a warehouse's source_bindings"""
+    canonical = orjson.dumps(source_bindings, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+def decode_snapshot(raw: Any) -> Dict[str, Any]:
+    """Parse snapshot JSON from bytes or a memoryview"""
+    return orjson.loads(raw)
+
+
+class SnapshotWriter:
+    """Writes a snapshot file incrementally into a compressed temp file,
+    then swaps it into place so readers never see a partial snapshot"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        # Unique temp name so overlapping updates of one warehouse don't collide
+        self.tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        self._file = open(self.tmp_path, 'wb')
+        if path.name.endswith('.json.zst'):
+            self._stream = zstandard.ZstdCompressor(level=3).stream_writer(self._file, closefd=False)
+        elif path.name.endswith('.json.gz'):
+            self._stream = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=1)
+        else:
+            self._stream = self._file
+        self._has_rows = False
+
+    def write(self, payload: bytes) -> None:
+        self._stream.write(payload)
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Append rows to the JSON array being written"""
+        if not rows:
+            return
+        if self._has_rows:
+            self.write(b',')
+        self.write(encode_snapshot(rows)[1:-1])
+        self._has_rows = True
+
+    def commit(self) -> None:
+        """Swap the written file into place"""
+        if self._stream is not self._file:
+            self._stream.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        # Digest sidecars written by earlier versions are no longer used
+        self.path.with_name(self.path.name + '.sha').unlink(missing_ok=True)
+
+    def abort(self) -> None:
+        try:
+            if self._stream is not self._file:
+                self._stream.close()
+            self._file.close()
+        finally:
+            self.tmp_path.unlink(missing_ok=True)
+
+
+def decompress_snapshot(raw: Any, suffix: str) -> Any:
+    """Decompress snapshot bytes (or a buffer such as an mmap) read from a file with the given suffix"""
+    if suffix == '.json.zst':
+        # Streamed frames carry no content size, so use a decompression object
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    if suffix == '.json.gz':
+        return gzip.decompress(raw)
+    return raw
+
+
+def parse_binding(bind_key: str, binding_info: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str]]:
+    """Split a source binding into (source_id, split_value, bind_type)"""
+    if '::' in bind_key:
+        source_id, split_value = bind_key.split('::', 1)
+    else:
+        source_id = bind_key
+        split_value = binding_info.get('split_value')
+    return source_id, split_value, binding_info.get('type')
 
 
 class InventorySnapshotManager:
@@ -18,168 +163,386 @@ class InventorySnapshotManager:
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(__file__).parent / data_dir
         self.snapshots_dir = self.data_dir / "inventory_snapshots"
-        print(f"📁 Creating snapshots directory: {self.snapshots_dir}")
         self.snapshots_dir.mkdir(parents=True, exist_ok=True)
-        print(f"📁 Snapshots directory created: {self.snapshots_dir.exists()}")
-
-    def _get_snapshot_path(self, warehouse_code: str) -> Path:
-        """Get path for warehouse snapshot file"""
-        return self.snapshots_dir / f"{warehouse_code}.json"
+        logger.debug("Snapshots directory: %s", self.snapshots_dir)
+        self._warehouses_cache: Optional[Tuple[float, List[str]]] = None
+        # source_bindings blobs are stored once per distinct content, keyed by hash
+        self.bindings_dir = self.snapshots_dir / "bindings"
+        self.bindings_dir.mkdir(exist_ok=True)
+        self._bindings_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Held from storing a blob until the metadata referencing it is committed,
+        # so pruning never removes a blob that a snapshot is about to use
+        self._bindings_lock = threading.Lock()
+
+    def invalidate_warehouses_cache(self) -> None:
+        """Drop the cached list of bound warehouses (call on binding changes)"""
+        self._warehouses_cache = None
+
+    def _get_bound_warehouse_codes(self) -> List[str]:
+        """Codes of warehouses with bindings, cached for WAREHOUSES_CACHE_TTL"""
+        cached = self._warehouses_cache
+        if cached and time.monotonic() - cached[0] < WAREHOUSES_CACHE_TTL:
+            return cached[1]
+        result = supabase.table('warehouse_bindings').select('warehouses!inner(code)').execute()
+        codes = [binding['warehouses']['code'] for binding in result.data]
+        self._warehouses_cache = (time.monotonic(), codes)
+        return codes
+
+    def _get_snapshot_path(self, warehouse_code: str, source_type: Optional[str] = None) -> Path:
+        """Get path for a warehouse's snapshot metadata file, or its rows file for a source type"""
+        name = f"{warehouse_code}.{source_type}" if source_type else warehouse_code
+        return self.snapshots_dir / f"{name}{SNAPSHOT_SUFFIX}"
+
+    def _find_snapshot_file(self, warehouse_code: str, source_type: Optional[str] = None) -> Optional[Tuple[Path, str]]:
+        """Find an existing snapshot file and its suffix, including older uncompressed ones"""
+        name = f"{warehouse_code}.{source_type}" if source_type else warehouse_code
+        for suffix in (SNAPSHOT_SUFFIX, '.json.zst', '.json.gz', '.json'):
+            if suffix == '.json.zst' and zstandard is None:
+                continue
+            path = self.snapshots_dir / f"{name}{suffix}"
+            if path.exists():
+                return path, suffix
+        return None
 
-    def _load_snapshot(self, warehouse_code: str) -> Optional[Dict[str, Any]]:
-        """Load snapshot from file"""
-        snapshot_path = self._get_snapshot_path(warehouse_code)
-        if snapshot_path.exists():
+    def _read_snapshot_file(self, warehouse_code: str, source_type: Optional[str] = None) -> Any:
+        """Read and parse one snapshot file, None if it doesn't exist"""
+        found = self._find_snapshot_file(warehouse_code, source_type)
+        if found is None:
+            return None
+        snapshot_path, suffix = found
+        # Map the file instead of reading it into a bytes copy
+        with open(snapshot_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            return decode_snapshot(decompress_snapshot(view, suffix))
+
+    def _store_bindings(self, source_bindings: Dict[str, Any]) -> str:
+        """Persist a source_bindings blob if it's new, returns its hash (blocking)"""
+        digest = bindings_hash(source_bindings)
+        path = self.bindings_dir / f"{digest}.json"
+        if not path.exists():
+            writer = SnapshotWriter(path)
             try:
-                with open(snapshot_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                writer.write(encode_snapshot(source_bindings))
+                writer.commit()
+            except Exception:
+                writer.abort()
+                raise
+        self._cache_bindings(digest, source_bindings)
+        return digest
+
+    def _cache_bindings(self, digest: str, source_bindings: Dict[str, Any]) -> None:
+        """Remember a decoded blob, evicting the least recently used beyond BINDINGS_CACHE_SIZE"""
+        self._bindings_cache[digest] = source_bindings
+        self._bindings_cache.move_to_end(digest)
+        while len(self._bindings_cache) > BINDINGS_CACHE_SIZE:
+            self._bindings_cache.popitem(last=False)
+
+    def _load_bindings(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Resolve a source_bindings hash to its blob, cached in-process"""
+        cached = self._bindings_cache.get(digest)
+        if cached is None:
+            path = self.bindings_dir / f"{digest}.json"
+            if not path.exists():
+                return None
+            cached = decode_snapshot(path.read_bytes())
+        self._cache_bindings(digest, cached)
+        return cached
+
+    def _prune_bindings(self) -> None:
+        """Delete bindings blobs no snapshot metadata file references anymore (blocking)"""
+        referenced = set()
+        for path in self.snapshots_dir.iterdir():
+            suffix = next((sfx for sfx in ('.json.zst', '.json.gz', '.json') if path.name.endswith(sfx)), None)
+            if suffix is None or not path.is_file():
+                continue
+            name = path.name[:-len(suffix)]
+            if name.endswith(tuple(f'.{part}' for part in SNAPSHOT_PARTS)):
+                continue
+            try:
+                digest = decode_snapshot(decompress_snapshot(path.read_bytes(), suffix)).get('source_bindings_hash')
             except Exception as e:
-                print(f"Error loading snapshot for {warehouse_code}: {e}")
+                # Keep every blob if a metadata file can't be read
+                logger.warning("Not pruning bindings, unreadable snapshot %s: %s", path.name, e)
+                return
+            if digest:
+                referenced.add(digest)
+
+        for path in self.bindings_dir.glob('*.json'):
+            if path.stem not in referenced:
+                path.unlink(missing_ok=True)
+                self._bindings_cache.pop(path.stem, None)
+                logger.debug("Removed unreferenced bindings blob %s", path.name)
+
+    def _load_snapshot(self, warehouse_code: str, source_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Load snapshot from file; with source_type only that type's rows are parsed"""
+        try:
+            snapshot = self._read_snapshot_file(warehouse_code)
+            if snapshot is None or 'wms_data' in snapshot or 'sap_data' in snapshot:
+                # Missing, or an older single-file snapshot with rows inline
+                return snapshot
+            if 'source_bindings' not in snapshot and snapshot.get('source_bindings_hash'):
+                snapshot['source_bindings'] = self._load_bindings(snapshot['source_bindings_hash'])
+            for part in (source_type,) if source_type else SNAPSHOT_PARTS:
+                snapshot[f'{part}_data'] = self._read_snapshot_file(warehouse_code, part) or []
+            return snapshot
+        except Exception as e:
+            logger.error("Error loading snapshot for %s: %s", warehouse_code, e)
         return None
 
-    def _save_snapshot(self, warehouse_code: str, data: Dict[str, Any]) -> None:
-        """Save snapshot to file"""
-        snapshot_path = self._get_snapshot_path(warehouse_code)
+    def _write_snapshot(self, warehouse_code: str, data: Dict[str, Any]) -> None:
+        """Encode and atomically write a full snapshot (blocking)"""
+        with self._bindings_lock:
+            self._write_snapshot_files(warehouse_code, data)
+            self._prune_bindings()
+
+    def _write_snapshot_files(self, warehouse_code: str, data: Dict[str, Any]) -> None:
+        """Write the rows files and then the metadata file of a snapshot (blocking)"""
+        meta = {k: v for k, v in data.items() if k not in ('wms_data', 'sap_data', 'source_bindings')}
+        if data.get('source_bindings') is not None:
+            meta['source_bindings_hash'] = self._store_bindings(data['source_bindings'])
+        writers = []
         try:
-            with open(snapshot_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
-            print(f"Saved inventory snapshot for {warehouse_code}: {len(data.get('wms_data', []))} WMS + {len(data.get('sap_data', []))} SAP rows")
+            for part in SNAPSHOT_PARTS:
+                writer = SnapshotWriter(self._get_snapshot_path(warehouse_code, part))
+                writers.append(writer)
+                writer.write(encode_snapshot(data.get(f'{part}_data', [])))
+            writer = SnapshotWriter(self._get_snapshot_path(warehouse_code))
+            writers.append(writer)
+            writer.write(encode_snapshot(meta))
+            # Metadata is swapped in last
+            for writer in writers:
+                writer.commit()
+        except Exception:
+            for writer in writers:
+                writer.abort()
+            raise
+
+    async def _save_snapshot(self, warehouse_code: str, data: Dict[str, Any]) -> None:
+        """Save snapshot to file without blocking the event loop"""
+        try:
+            await asyncio.to_thread(self._write_snapshot, warehouse_code, data)
+            logger.info("Saved inventory snapshot for %s: %d WMS + %d SAP rows",
+                        warehouse_code, len(data.get('wms_data', [])), len(data.get('sap_data', [])))
         except Exception as e:
-            print(f"Error saving snapshot for {warehouse_code}: {e}")
+            logger.error("Error saving snapshot for %s: %s", warehouse_code, e)
+
+    async def _fetch_binding(
+        self,
+        bind_key: str,
+        binding_info: Dict[str, Any],
+        on_page: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+    ) -> int:
+        """Fetch raw rows for one source binding page by page, returns the row count"""
+        source_id, split_value, bind_type = parse_binding(bind_key, binding_info)
+
+        # Select table and projected columns
+        table_name = 'wms_raw_rows' if bind_type == 'wms' else 'sap_raw_rows'
+        columns = WMS_COLUMNS if bind_type == 'wms' else SAP_COLUMNS
+
+        # Page through rows in a stable order
+        logger.debug("Fetching %s rows for source %s (split=%s)", table_name, source_id, split_value)
+        base = supabase.table(table_name).select(columns).eq('source_id', source_id)
+        if split_value:
+            base = base.eq('split_key', split_value)
+        base = base.order('id')
+
+        total = 0
+        for page in itertools.count():
+            # Advance by rows actually returned; PostgREST max-rows may cap a page.
+            # The builder's filter methods mutate it, so each page ranges a shallow copy.
+            start = total
+            result = await asyncio.to_thread(
+                copy.copy(base).range(start, start + SNAPSHOT_PAGE_SIZE - 1).execute
+            )
+            page_rows = result.data or []
+            if not page_rows:
+                break
+
+            await on_page(page_rows)
+            total += len(page_rows)
+            logger.debug("Source %s page %d: %d rows (total: %d)", source_id, page + 1, len(page_rows), total)
+
+        if not total:
+            logger.warning("No data found for source %s", source_id)
+
+        return total
+
+    async def _get_binding_version(self, bind_key: str, binding_info: Dict[str, Any]) -> List[Any]:
+        """Get [latest fetched_at, row count] for one source binding's raw rows"""
+        source_id, split_value, bind_type = parse_binding(bind_key, binding_info)
+        table_name = 'wms_raw_rows' if bind_type == 'wms' else 'sap_raw_rows'
+
+        query = supabase.table(table_name).select('fetched_at', count='exact').eq('source_id', source_id)
+        if split_value:
+            query = query.eq('split_key', split_value)
+        result = await asyncio.to_thread(query.order('fetched_at', desc=True).limit(1).execute)
+        latest = result.data[0]['fetched_at'] if result.data else None
+        return [latest, result.count]
 
     async def update_inventory_snapshot(self, warehouse_code: str) -> None:
         """Update inventory snapshot for a warehouse"""
-        print(f"🔄 STARTING inventory snapshot update for warehouse: {warehouse_code}")
-        print(f"   Snapshots dir: {self.snapshots_dir}")
-        print(f"   Snapshot path: {self._get_snapshot_path(warehouse_code)}")
-        print(f"   Current time: {datetime.utcnow().isoformat()}")
+        logger.info("Updating inventory snapshot for %s", warehouse_code)
 
         try:
             # Get warehouse binding
-            from supabase_client import get_warehouse_binding
-            print(f"   Getting warehouse binding for {warehouse_code}...")
             binding = await get_warehouse_binding(warehouse_code)
-            print(f"   Warehouse binding result: {binding is not None}")
 
             if not binding or not binding.get('source_bindings'):
-                print(f"   ❌ No bindings found for warehouse {warehouse_code}")
-                print(f"   Binding details: {binding}")
+                logger.warning("No bindings found for warehouse %s", warehouse_code)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Binding details: %s", binding)
                 return
 
-            print(f"   ✅ Found bindings for {warehouse_code}: {len(binding.get('source_bindings', {}))} sources")
+            source_bindings = binding['source_bindings']
+            logger.debug("Processing %d source bindings for %s", len(source_bindings), warehouse_code)
 
-            wms_data = []
-            sap_data = []
+            wms_bindings = [(k, v) for k, v in source_bindings.items() if v.get('type') == 'wms']
+            sap_bindings = [(k, v) for k, v in source_bindings.items() if v.get('type') != 'wms']
+            sem = asyncio.Semaphore(SNAPSHOT_FETCH_CONCURRENCY)
 
-            # Process each source binding
-            source_bindings = binding['source_bindings']
-            print(f"   Processing {len(source_bindings)} source bindings...")
-
-            for bind_key, binding_info in source_bindings.items():
-                print(f"   Processing binding: {bind_key}")
-
-                # Extract source_id and split_value
-                if '::' in bind_key:
-                    source_id, split_value = bind_key.split('::', 1)
-                    print(f"     Split binding: source_id={source_id}, split_value={split_value}")
-                else:
-                    source_id = bind_key
-                    split_value = binding_info.get('split_value')
-                    print(f"     Simple binding: source_id={source_id}, split_value={split_value}")
-
-                bind_type = binding_info.get('type')
-                print(f"     Binding type: {bind_type}")
-
-                # Select table
-                table_name = 'wms_raw_rows' if bind_type == 'wms' else 'sap_raw_rows'
-                print(f"     Using table: {table_name}")
-
-                # Build query - no limit to get all data
-                query = supabase.table(table_name).select('*').eq('source_id', source_id)
-                if split_value:
-                    query = query.eq('split_key', split_value)
-                    print(f"     Query with split filter: split_key = '{split_value}'")
-
-                # Try to get all data at once first
-                print(f"     Executing query for source {source_id}...")
-                try:
-                    result = query.execute()
-                    print(f"     Direct query result: {len(result.data) if result.data else 0} rows")
-                except Exception as e:
-                    print(f"     Direct query failed: {e}, trying pagination...")
-                    # Fallback to pagination
-                    all_data = []
-                    offset = 0
-                    batch_size = 1000  # Use smaller batch size
-                    max_iterations = 20
-
-                    for iteration in range(max_iterations):
-                        try:
-                            # Create new query for each batch
-                            batch_query = supabase.table(table_name).select('*').eq('source_id', source_id)
-                            if split_value:
-                                batch_query = batch_query.eq('split_key', split_value)
-
-                            batch_result = batch_query.range(offset, offset + batch_size - 1).execute()
-
-                            if not batch_result.data or len(batch_result.data) == 0:
-                                print(f"     No more data at offset {offset}")
-                                break
-
-                            all_data.extend(batch_result.data)
-                            print(f"     Batch {iteration + 1}: {len(batch_result.data)} rows (total: {len(all_data)})")
-
-                            if len(batch_result.data) < batch_size:
-                                break
-
-                            offset += batch_size
-
-                        except Exception as batch_e:
-                            print(f"     Batch {iteration + 1} failed: {batch_e}")
-                            break
-
-                    print(f"     Pagination result: {len(all_data)} rows")
-                    result = type('Result', (), {'data': all_data})()
-
-                if result.data:
-                    # Add metadata
-                    for row in result.data:
-                        row['source_type'] = bind_type
-                        row['warehouse_code'] = warehouse_code
-
-                    if bind_type == 'wms':
-                        wms_data.extend(result.data)
-                        print(f"     ✅ Added {len(result.data)} WMS rows (total WMS: {len(wms_data)})")
-                    else:
-                        sap_data.extend(result.data)
-                        print(f"     ✅ Added {len(result.data)} SAP rows (total SAP: {len(sap_data)})")
-
-                else:
-                    print(f"     ⚠️ No data found for source {source_id}")
-
-            # Create snapshot data
-            snapshot_data = {
-                'warehouse_code': warehouse_code,
-                'wms_data': wms_data,
-                'sap_data': sap_data,
-                'total_wms': len(wms_data),
-                'total_sap': len(sap_data),
-                'last_updated': datetime.utcnow().isoformat(),
-                'source_bindings': binding.get('source_bindings', {})
-            }
-
-            # Save to file
-            print(f"   💾 Saving snapshot with {len(sap_data)} SAP + {len(wms_data)} WMS rows")
-            self._save_snapshot(warehouse_code, snapshot_data)
-            print(f"   ✅ Snapshot saved successfully for {warehouse_code}")
+            # Raw rows are only replaced wholesale by a sync, so a binding whose
+            # latest fetched_at and row count match the previous snapshot is unchanged
+            async def version_bounded(bind_key: str, binding_info: Dict[str, Any]) -> List[Any]:
+                async with sem:
+                    return await self._get_binding_version(bind_key, binding_info)
+
+            versions = dict(zip(
+                source_bindings,
+                await asyncio.gather(*(version_bounded(k, v) for k, v in source_bindings.items()))
+            ))
+
+            try:
+                previous = await asyncio.to_thread(self._read_snapshot_file, warehouse_code)
+            except Exception as e:
+                logger.warning("Ignoring unreadable snapshot for %s: %s", warehouse_code, e)
+                previous = None
+            current_bindings_hash = bindings_hash(source_bindings)
+            previous_bindings_hash = None
+            if previous:
+                previous_bindings_hash = previous.get('source_bindings_hash') or (
+                    bindings_hash(previous['source_bindings']) if previous.get('source_bindings') else None
+                )
+            unchanged = set()
+            if previous and previous_bindings_hash == current_bindings_hash:
+                previous_versions = previous.get('binding_versions') or {}
+                unchanged = {k for k, v in versions.items() if previous_versions.get(k) == v}
+                if len(unchanged) == len(source_bindings):
+                    logger.info("Inventory snapshot for %s is up to date", warehouse_code)
+                    return
+
+            async def stream_bindings(
+                bindings: List[Tuple[str, Dict[str, Any]]],
+                previous_rows: List[Dict[str, Any]],
+                write_rows: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+            ) -> int:
+                # Group reusable rows by source once instead of rescanning per binding
+                previous_by_source: Dict[str, List[Dict[str, Any]]] = {}
+                for row in previous_rows:
+                    previous_by_source.setdefault(row.get('source_id'), []).append(row)
+
+                async def fetch_bounded(bind_key: str, binding_info: Dict[str, Any]) -> int:
+                    if bind_key in unchanged:
+                        source_id, split_value, _ = parse_binding(bind_key, binding_info)
+                        rows = previous_by_source.get(source_id, [])
+                        if split_value:
+                            rows = [row for row in rows if row.get('split_key') == split_value]
+                        await write_rows(rows)
+                        return len(rows)
+                    async with sem:
+                        return await self._fetch_binding(bind_key, binding_info, write_rows)
+
+                counts = await asyncio.gather(*(fetch_bounded(k, v) for k, v in bindings))
+                return sum(counts)
+
+            # Stream pages into one rows file per source type, then write the metadata file.
+            # Rows are stored untagged: the file they are in gives source_type and
+            # warehouse_code is stored once in the metadata
+            writers: Dict[str, SnapshotWriter] = {}
+
+            async def stream_part(part: str, bindings: List[Tuple[str, Dict[str, Any]]]) -> int:
+                reused = [k for k, _ in bindings if k in unchanged]
+                if (bindings and len(reused) == len(bindings)
+                        and await asyncio.to_thread(self._find_snapshot_file, warehouse_code, part)):
+                    # Every binding of this type is unchanged: keep the existing rows file
+                    logger.debug("%s rows for %s unchanged, keeping snapshot file", part.upper(), warehouse_code)
+                    return previous.get(f'total_{part}', 0)
+
+                previous_rows = []
+                if reused:
+                    # Only parse the previous rows when some of them can be reused
+                    loaded = await asyncio.to_thread(self._load_snapshot, warehouse_code, part)
+                    previous_rows = (loaded or {}).get(f'{part}_data', [])
+
+                # Opening the temp file is file I/O too, so it happens off the event loop
+                writer = writers[part] = await asyncio.to_thread(
+                    SnapshotWriter, self._get_snapshot_path(warehouse_code, part)
+                )
+                write_lock = asyncio.Lock()
+
+                async def write_rows(rows: List[Dict[str, Any]]) -> None:
+                    # Encode/compress/write off the event loop, one page at a time
+                    async with write_lock:
+                        await asyncio.to_thread(writer.write_rows, rows)
+
+                writer.write(b'[')
+                total = await stream_bindings(bindings, previous_rows, write_rows)
+                writer.write(b']')
+                return total
+
+            try:
+                total_wms, total_sap = await asyncio.gather(
+                    stream_part('wms', wms_bindings),
+                    stream_part('sap', sap_bindings),
+                )
+                meta = encode_snapshot({
+                    'warehouse_code': warehouse_code,
+                    'total_wms': total_wms,
+                    'total_sap': total_sap,
+                    'last_updated': datetime.utcnow().isoformat(),
+                    'source_bindings_hash': current_bindings_hash,
+                    'binding_versions': versions
+                })
+
+                def commit_all() -> None:
+                    meta_writer = SnapshotWriter(self._get_snapshot_path(warehouse_code))
+                    try:
+                        meta_writer.write(meta)
+                        with self._bindings_lock:
+                            self._store_bindings(source_bindings)
+                            for writer in writers.values():
+                                writer.commit()
+                            # Metadata is swapped in last
+                            meta_writer.commit()
+                            if current_bindings_hash != previous_bindings_hash:
+                                self._prune_bindings()
+                    except BaseException:
+                        meta_writer.abort()
+                        raise
+
+                await asyncio.to_thread(commit_all)
+            except BaseException:
+                for writer in writers.values():
+                    writer.abort()
+                raise
+
+            logger.info("Saved inventory snapshot for %s: %d WMS + %d SAP rows", warehouse_code, total_wms, total_sap)
 
         except Exception as e:
-            print(f"Error updating inventory snapshot for {warehouse_code}: {e}")
+            logger.error("Error updating inventory snapshot for %s: %s", warehouse_code, e)
             raise
 
-    def get_inventory_snapshot(self, warehouse_code: str) -> Optional[Dict[str, Any]]:
-        """Get inventory snapshot for a warehouse"""
-        return self._load_snapshot(warehouse_code)
+    def get_inventory_snapshot(self, warehouse_code: str, source_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get inventory snapshot for a warehouse, optionally only one source type's rows"""
+        return self._load_snapshot(warehouse_code, source_type)
+
+    @staticmethod
+    def tag_snapshot_rows(rows: List[Dict[str, Any]], source_type: str, warehouse_code: str) -> List[Dict[str, Any]]:
+        """Attach source_type/warehouse_code to snapshot rows returned to API clients"""
+        for row in rows:
+            row['source_type'] = source_type
+            row['warehouse_code'] = warehouse_code
+        return rows
 
     async def update_all_inventory_snapshots(self, warehouse_codes: Optional[List[str]] = None) -> None:
         """Update inventory snapshots for specified warehouses or all"""
@@ -187,22 +550,26 @@ class InventorySnapshotManager:
             # Get all warehouses if not specified
             if warehouse_codes is None or len(warehouse_codes) == 0:
                 # Get all warehouses with bindings
-                result = supabase.table('warehouse_bindings').select('warehouses!inner(code)').execute()
-                warehouse_codes = [binding['warehouses']['code'] for binding in result.data]
+                warehouse_codes = self._get_bound_warehouse_codes()
+
+            logger.info("Updating inventory snapshots for %d warehouses: %s", len(warehouse_codes), warehouse_codes)
+
+            sem = asyncio.Semaphore(SNAPSHOT_WAREHOUSE_CONCURRENCY)
 
-            print(f"Updating inventory snapshots for {len(warehouse_codes)} warehouses: {warehouse_codes}")
+            async def update_one(warehouse_code: str) -> None:
+                async with sem:
+                    try:
+                        await self.update_inventory_snapshot(warehouse_code)
+                    except Exception as e:
+                        logger.error("Failed to update snapshot for %s: %s", warehouse_code, e)
+                        # Continue with other warehouses
 
-            for warehouse_code in warehouse_codes:
-                try:
-                    await self.update_inventory_snapshot(warehouse_code)
-                except Exception as e:
-                    print(f"Failed to update snapshot for {warehouse_code}: {e}")
-                    # Continue with other warehouses
+            await asyncio.gather(*(update_one(wc) for wc in warehouse_codes))
 
-            print("Inventory snapshot updates completed")
+            logger.info("Inventory snapshot updates completed")
 
         except Exception as e:
-            print(f"Error updating inventory snapshots: {e}")
+            logger.error("Error updating inventory snapshots: %s", e)
             raise
 
 
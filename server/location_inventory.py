@@ -3,390 +3,290 @@ Location-based inventory query endpoints
 Maps Zone components (Rack/Flat locations) to actual WMS raw data
 """
 
-from typing import Dict, List, Optional
-from pydantic import BaseModel
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, TypeAdapter, ValidationError
 import httpx
+import logging
+import orjson
 import os
+import re
+import time
+
+from column_mapping import WMS_COLUMN_MAP
+
+logger = logging.getLogger(__name__)
 
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "")
 
+# Headers sent with every PostgREST request (built once at import)
+_BASE_HEADERS = {
+    "apikey": SUPABASE_ANON_KEY,
+    "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
+    "Content-Type": "application/json",
+}
 
-async def get_lot_column_for_warehouse(client: httpx.AsyncClient, warehouse_code: str) -> Optional[str]:
-    """
-    Get the lot column name from WMS source classification for a warehouse
-    Similar to get_location_column_for_warehouse but for lot columns
-    """
-    try:
-        headers = {
-            "apikey": SUPABASE_ANON_KEY,
-            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-            "Content-Type": "application/json",
-        }
 
-        print(f"🔍 Checking lot column for warehouse: '{warehouse_code}'")
+def parse_json(response: httpx.Response):
+    """Decode a PostgREST response body with orjson"""
+    return orjson.loads(response.content)
 
-        # Check if warehouse_code is a UUID (warehouse.id) or code
-        import uuid
-        try:
-            uuid.UUID(warehouse_code)  # Try to parse as UUID
-            is_uuid = True
-            warehouse_id = warehouse_code
-            print(f"📋 warehouse_code is UUID (id): {warehouse_code}")
-        except ValueError:
-            is_uuid = False
-            warehouse_id = None
-            print(f"📋 warehouse_code is code: {warehouse_code}")
-
-        # If it's not a UUID, get the warehouse_id from code
-        if not is_uuid:
-            print("🔄 Converting warehouse code to UUID...")
-            warehouse_url = f"{SUPABASE_URL}/rest/v1/warehouses"
-            warehouse_params = {
-                "code": f"eq.{warehouse_code}",
-                "select": "id",
-            }
-            warehouse_response = await client.get(warehouse_url, headers=headers, params=warehouse_params)
-            warehouse_response.raise_for_status()
-            warehouses = warehouse_response.json()
 
-            if warehouses and len(warehouses) > 0:
-                warehouse_id = warehouses[0]["id"]
-                print(f"✅ Found warehouse id: '{warehouse_id}'")
-            else:
-                print(f"❌ No warehouse found with code: {warehouse_code}")
-                return None
-
-        # Get warehouse bindings to find associated WMS sources
-        binding_url = f"{SUPABASE_URL}/rest/v1/warehouse_bindings"
-        binding_params = {
-            "warehouse_id": f"eq.{warehouse_id}",
-            "select": "source_bindings",
-        }
+# Connection pool shared by all location inventory requests
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
 
-        binding_response = await client.get(binding_url, headers=headers, params=binding_params)
-        binding_response.raise_for_status()
-        bindings = binding_response.json()
-
-        print(f"📊 Found {len(bindings)} warehouse binding(s)")
-        if not bindings:
-            print(f"❌ No warehouse bindings found for warehouse_id '{warehouse_id}'")
-            return None
-
-        source_bindings = bindings[0].get("source_bindings", {})
-        print(f"🔗 Source bindings: {source_bindings}")
-
-        if not source_bindings:
-            print(f"❌ No source bindings in warehouse binding for warehouse_id '{warehouse_id}'")
-            return None
-
-        # Find WMS sources - handle both old and new binding key formats
-        wms_sources = []
-        for bind_key, binding_info in source_bindings.items():
-            if binding_info.get("type") == "wms":
-                # Extract source_id from key (handle "source_id::split_value" format)
-                if '::' in bind_key:
-                    source_id = bind_key.split('::', 1)[0]
-                else:
-                    source_id = bind_key
-                
-                if source_id not in wms_sources:
-                    wms_sources.append(source_id)
-
-        if not wms_sources:
-            print(f"❌ No WMS sources found in bindings for warehouse_id '{warehouse_id}'")
-            return None
-
-        print(f"📋 Found {len(wms_sources)} unique WMS source(s): {wms_sources}")
-
-        # Check each WMS source
-        for source_id in wms_sources:
-            print(f"🔎 Checking WMS source: {source_id}")
-
-            # Query the sheet_sources table for classification
-            source_url = f"{SUPABASE_URL}/rest/v1/sheet_sources"
-            source_params = {
-                "id": f"eq.{source_id}",
-                "select": "classification",
-            }
-            source_response = await client.get(source_url, headers=headers, params=source_params)
-            source_response.raise_for_status()
-            sources = source_response.json()
-
-            print(f"📄 Sheet source data: {sources}")
-
-            if sources and len(sources) > 0:
-                classification = sources[0].get("classification", {})
-                print(f"🏷️ Classification: {classification}")
-
-                lot_col = classification.get("lot_col")
-                if lot_col:
-                    print(f"✅ Found lot column: '{lot_col}'")
-                    return lot_col
-                else:
-                    print(f"❌ No lot_col in classification for source {source_id}")
-            else:
-                print(f"❌ No sheet source data for source {source_id}")
+# Shared async PostgREST client (created lazily, closed on app shutdown)
+_http_client: Optional[httpx.AsyncClient] = None
 
-        print(f"❌ No valid lot column found for warehouse_id '{warehouse_id}'")
-        return None
 
-    except Exception as e:
-        print(f"💥 Error getting lot column for warehouse {warehouse_code}: {e}")
-        return None
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared httpx client used for Supabase REST lookups"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            http2=True,  # h2 comes with httpx[http2] in requirements.txt
+            timeout=30.0,
+            limits=HTTP_LIMITS,
+            headers=_BASE_HEADERS,
+        )
+    return _http_client
 
-async def get_qty_column_for_warehouse(client: httpx.AsyncClient, warehouse_code: str) -> Optional[str]:
-    """
-    Get the quantity column name from WMS source classification for a warehouse
-    Similar to get_location_column_for_warehouse but for quantity columns
-    """
-    try:
-        headers = {
-            "apikey": SUPABASE_ANON_KEY,
-            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-            "Content-Type": "application/json",
-        }
 
-        print(f"🔍 Checking quantity column for warehouse: '{warehouse_code}'")
+async def close_http_client() -> None:
+    """Close the shared httpx client"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
-        # Check if warehouse_code is a UUID (warehouse.id) or code
-        import uuid
-        try:
-            uuid.UUID(warehouse_code)  # Try to parse as UUID
-            is_uuid = True
-            warehouse_id = warehouse_code
-            print(f"📋 warehouse_code is UUID (id): {warehouse_code}")
-        except ValueError:
-            is_uuid = False
-            warehouse_id = None
-            print(f"📋 warehouse_code is code: {warehouse_code}")
-
-        # If it's not a UUID, get the warehouse_id from code
-        if not is_uuid:
-            print("🔄 Converting warehouse code to UUID...")
-            warehouse_url = f"{SUPABASE_URL}/rest/v1/warehouses"
-            warehouse_params = {
-                "code": f"eq.{warehouse_code}",
-                "select": "id",
-            }
-            warehouse_response = await client.get(warehouse_url, headers=headers, params=warehouse_params)
-            warehouse_response.raise_for_status()
-            warehouses = warehouse_response.json()
+WMS_CLASSIFICATION_KEYS = ("location_col", "lot_col", "qty_col")
 
-            if warehouses and len(warehouses) > 0:
-                warehouse_id = warehouses[0]["id"]
-                print(f"✅ Found warehouse id: '{warehouse_id}'")
-            else:
-                print(f"❌ No warehouse found with code: {warehouse_code}")
-                return None
-
-        # Get warehouse bindings to find associated WMS sources
-        binding_url = f"{SUPABASE_URL}/rest/v1/warehouse_bindings"
-        binding_params = {
-            "warehouse_id": f"eq.{warehouse_id}",
-            "select": "source_bindings",
-        }
+# warehouse.id values are canonical UUIDs; anything else is treated as warehouse.code
+_UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I)
 
-        binding_response = await client.get(binding_url, headers=headers, params=binding_params)
-        binding_response.raise_for_status()
-        bindings = binding_response.json()
-
-        print(f"📊 Found {len(bindings)} warehouse binding(s)")
-        if not bindings:
-            print(f"❌ No warehouse bindings found for warehouse_id '{warehouse_id}'")
-            return None
-
-        source_bindings = bindings[0].get("source_bindings", {})
-        print(f"🔗 Source bindings: {source_bindings}")
-
-        if not source_bindings:
-            print(f"❌ No source bindings in warehouse binding for warehouse_id '{warehouse_id}'")
-            return None
-
-        # Find WMS sources - handle both old and new binding key formats
-        wms_sources = []
-        for bind_key, binding_info in source_bindings.items():
-            if binding_info.get("type") == "wms":
-                # Extract source_id from key (handle "source_id::split_value" format)
-                if '::' in bind_key:
-                    source_id = bind_key.split('::', 1)[0]
-                else:
-                    source_id = bind_key
-                
-                if source_id not in wms_sources:
-                    wms_sources.append(source_id)
-
-        if not wms_sources:
-            print(f"❌ No WMS sources found in bindings for warehouse_id '{warehouse_id}'")
-            return None
-
-        print(f"📋 Found {len(wms_sources)} unique WMS source(s): {wms_sources}")
-
-        # Check each WMS source
-        for source_id in wms_sources:
-            print(f"🔎 Checking WMS source: {source_id}")
-
-            # Query the sheet_sources table for classification
-            source_url = f"{SUPABASE_URL}/rest/v1/sheet_sources"
-            source_params = {
-                "id": f"eq.{source_id}",
-                "select": "classification",
-            }
-            source_response = await client.get(source_url, headers=headers, params=source_params)
-            source_response.raise_for_status()
-            sources = source_response.json()
-
-            print(f"📄 Sheet source data: {sources}")
-
-            if sources and len(sources) > 0:
-                classification = sources[0].get("classification", {})
-                print(f"🏷️ Classification: {classification}")
-
-                qty_col = classification.get("qty_col")
-                if qty_col:
-                    print(f"✅ Found quantity column: '{qty_col}'")
-                    return qty_col
-                else:
-                    print(f"❌ No qty_col in classification for source {source_id}")
-            else:
-                print(f"❌ No sheet source data for source {source_id}")
+# Warehouse bindings/classification rarely change; cache them per warehouse
+WAREHOUSE_CFG_CACHE_TTL = float(os.getenv("WAREHOUSE_CFG_CACHE_TTL", "120"))  # seconds
+_WAREHOUSE_CFG_CACHE: Dict[str, tuple] = {}
+_WAREHOUSE_ID_CACHE: Dict[str, tuple] = {}
 
-        print(f"❌ No valid quantity column found for warehouse_id '{warehouse_id}'")
-        return None
 
-    except Exception as e:
-        print(f"💥 Error getting quantity column for warehouse {warehouse_code}: {e}")
-        return None
+def invalidate_warehouse_cache(warehouse_code: Optional[str] = None) -> None:
+    """Drop cached warehouse config (one warehouse, or all) after bindings or sheet sources change"""
+    if warehouse_code is None:
+        _WAREHOUSE_CFG_CACHE.clear()
+        _WAREHOUSE_ID_CACHE.clear()
+        return
+    cached_id = _WAREHOUSE_ID_CACHE.pop(warehouse_code, None)
+    _WAREHOUSE_CFG_CACHE.pop(warehouse_code, None)
+    if cached_id:
+        _WAREHOUSE_CFG_CACHE.pop(cached_id[1], None)
 
-async def get_location_column_for_warehouse(client: httpx.AsyncClient, warehouse_code: str) -> Optional[str]:
+
+async def get_warehouse_wms_config(
+    client: httpx.AsyncClient,
+    warehouse_code: str,
+    context: Optional[Dict[str, Dict]] = None,
+) -> Dict:
     """
-    Get the location column name from WMS source classification for a warehouse
+    Get warehouse_id, source_bindings and WMS classification columns for a warehouse
     warehouse_code can be either warehouse.id (UUID) or warehouse.code (like 'EA2-F')
-    """
-    try:
-        headers = {
-            "apikey": SUPABASE_ANON_KEY,
-            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-            "Content-Type": "application/json",
-        }
 
-        print(f"🔍 Checking location column for warehouse: '{warehouse_code}'")
+    Pass the same context dict for the lifetime of one request to reuse the result.
+    """
+    if context is not None and warehouse_code in context:
+        return context[warehouse_code]
 
-        # Check if warehouse_code is a UUID (warehouse.id) or code
-        import uuid
+    cached = _WAREHOUSE_CFG_CACHE.get(warehouse_code)
+    if cached and time.monotonic() - cached[0] < WAREHOUSE_CFG_CACHE_TTL:
+        config = cached[1]
+    else:
         try:
-            uuid.UUID(warehouse_code)  # Try to parse as UUID
-            is_uuid = True
-            warehouse_id = warehouse_code
-            print(f"📋 warehouse_code is UUID (id): {warehouse_code}")
-        except ValueError:
-            is_uuid = False
-            warehouse_id = None
-            print(f"📋 warehouse_code is code: {warehouse_code}")
-
-        # If it's not a UUID, get the warehouse_id from code
-        if not is_uuid:
-            print("🔄 Converting warehouse code to UUID...")
-            warehouse_url = f"{SUPABASE_URL}/rest/v1/warehouses"
-            warehouse_params = {
-                "code": f"eq.{warehouse_code}",
-                "select": "id",
+            config = await _fetch_warehouse_wms_config(client, warehouse_code)
+            _WAREHOUSE_CFG_CACHE[warehouse_code] = (time.monotonic(), config)
+        except Exception as e:
+            # Don't cache transient failures; callers fall back to default columns
+            logger.error("Error getting WMS columns for warehouse %s: %s", warehouse_code, e)
+            config = {
+                "warehouse_id": None,
+                "source_bindings": {},
+                "columns": {key: None for key in WMS_CLASSIFICATION_KEYS},
             }
-            warehouse_response = await client.get(warehouse_url, headers=headers, params=warehouse_params)
-            warehouse_response.raise_for_status()
-            warehouses = warehouse_response.json()
 
-            if warehouses and len(warehouses) > 0:
-                warehouse_id = warehouses[0]["id"]
-                print(f"✅ Found warehouse id: '{warehouse_id}'")
-            else:
-                print(f"❌ No warehouse found with code: {warehouse_code}")
-                return None
-
-        # Get warehouse bindings to find associated WMS sources
-        # warehouse_bindings table uses warehouse_id (UUID), not warehouse_code
-        binding_url = f"{SUPABASE_URL}/rest/v1/warehouse_bindings"
-        binding_params = {
-            "warehouse_id": f"eq.{warehouse_id}",
-            "select": "source_bindings",
-        }
+    if context is not None:
+        context[warehouse_code] = config
+    return config
 
-        binding_response = await client.get(binding_url, headers=headers, params=binding_params)
-        binding_response.raise_for_status()
-        bindings = binding_response.json()
-
-        print(f"📊 Found {len(bindings)} warehouse binding(s)")
-        if not bindings:
-            print(f"❌ No warehouse bindings found for warehouse_id '{warehouse_id}'")
-            return None
-
-        source_bindings = bindings[0].get("source_bindings", {})
-        print(f"🔗 Source bindings: {source_bindings}")
-
-        if not source_bindings:
-            print(f"❌ No source bindings in warehouse binding for warehouse_id '{warehouse_id}'")
-            return None
-
-        # Find WMS sources - handle both old and new binding key formats
-        wms_sources = []
-        for bind_key, binding_info in source_bindings.items():
-            if binding_info.get("type") == "wms":
-                # Extract source_id from key (handle "source_id::split_value" format)
-                if '::' in bind_key:
-                    source_id = bind_key.split('::', 1)[0]
-                else:
-                    source_id = bind_key
-                
-                if source_id not in wms_sources:
-                    wms_sources.append(source_id)
-
-        if not wms_sources:
-            print(f"❌ No WMS sources found in bindings for warehouse_id '{warehouse_id}'")
-            return None
-
-        print(f"📋 Found {len(wms_sources)} unique WMS source(s): {wms_sources}")
-
-        # Check each WMS source
-        for source_id in wms_sources:
-            print(f"🔎 Checking WMS source: {source_id}")
-
-            # Query the sheet_sources table for classification
-            source_url = f"{SUPABASE_URL}/rest/v1/sheet_sources"
-            source_params = {
-                "id": f"eq.{source_id}",
-                "select": "classification",
-            }
-            source_response = await client.get(source_url, headers=headers, params=source_params)
-            source_response.raise_for_status()
-            sources = source_response.json()
-
-            print(f"📄 Sheet source data: {sources}")
-
-            if sources and len(sources) > 0:
-                classification = sources[0].get("classification", {})
-                print(f"🏷️ Classification: {classification}")
-
-                location_col = classification.get("location_col")
-                if location_col:
-                    print(f"✅ Found location column: '{location_col}'")
-                    return location_col
-                else:
-                    print(f"❌ No location_col in classification for source {source_id}")
+
+async def _fetch_warehouse_wms_config(client: httpx.AsyncClient, warehouse_code: str) -> Dict:
+    """
+    Resolve warehouse -> bindings -> sheet_sources once and return
+    {"warehouse_id": ..., "source_bindings": {...}, "columns": {"location_col": ..., "lot_col": ..., "qty_col": ...}}
+    """
+    columns: Dict[str, Optional[str]] = {key: None for key in WMS_CLASSIFICATION_KEYS}
+    config = {"warehouse_id": None, "source_bindings": {}, "columns": columns}
+
+    # Check if warehouse_code is a UUID (warehouse.id) or code
+    is_uuid = bool(_UUID_RE.match(warehouse_code))
+    warehouse_id = warehouse_code if is_uuid else None
+    config["warehouse_id"] = warehouse_id
+
+    # If it's not a UUID, get the warehouse_id from code (cached code -> UUID map first)
+    cached_id = None if is_uuid else _WAREHOUSE_ID_CACHE.get(warehouse_code)
+    if cached_id and time.monotonic() - cached_id[0] < WAREHOUSE_CFG_CACHE_TTL:
+        warehouse_id = cached_id[1]
+        config["warehouse_id"] = warehouse_id
+    elif not is_uuid:
+        warehouse_url = f"{SUPABASE_URL}/rest/v1/warehouses"
+        warehouse_params = {
+            "code": f"eq.{warehouse_code}",
+            "select": "id",
+        }
+        warehouse_response = await client.get(warehouse_url, params=warehouse_params)
+        warehouse_response.raise_for_status()
+        warehouses = parse_json(warehouse_response)
+
+        if warehouses and len(warehouses) > 0:
+            warehouse_id = warehouses[0]["id"]
+            config["warehouse_id"] = warehouse_id
+            _WAREHOUSE_ID_CACHE[warehouse_code] = (time.monotonic(), warehouse_id)
+            logger.debug("Resolved warehouse %s -> %s", warehouse_code, warehouse_id)
+        else:
+            logger.warning("No warehouse found with code: %s", warehouse_code)
+            return config
+
+    # Get warehouse bindings to find associated WMS sources
+    # warehouse_bindings table uses warehouse_id (UUID), not warehouse_code
+    binding_url = f"{SUPABASE_URL}/rest/v1/warehouse_bindings"
+    binding_params = {
+        "warehouse_id": f"eq.{warehouse_id}",
+        "select": "source_bindings",
+    }
+
+    binding_response = await client.get(binding_url, params=binding_params)
+    binding_response.raise_for_status()
+    bindings = parse_json(binding_response)
+
+    if not bindings:
+        logger.warning("No warehouse bindings found for warehouse_id %s", warehouse_id)
+        return config
+
+    source_bindings = bindings[0].get("source_bindings") or {}
+    config["source_bindings"] = source_bindings
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Source bindings for %s: %s", warehouse_code, source_bindings)
+
+    if not source_bindings:
+        logger.warning("No source bindings in warehouse binding for warehouse_id %s", warehouse_id)
+        return config
+
+    # Find WMS sources - handle both old and new binding key formats
+    wms_sources = []
+    seen = set()
+    for bind_key, binding_info in source_bindings.items():
+        if binding_info.get("type") == "wms":
+            # Extract source_id from key (handle "source_id::split_value" format)
+            if '::' in bind_key:
+                source_id = bind_key.split('::', 1)[0]
             else:
-                print(f"❌ No sheet source data for source {source_id}")
+                source_id = bind_key
+            
+            if source_id not in seen:
+                seen.add(source_id)
+                wms_sources.append(source_id)
+
+    if not wms_sources:
+        logger.warning("No WMS sources found in bindings for warehouse_id %s", warehouse_id)
+        return config
+
+    logger.debug("Found %d unique WMS source(s) for %s", len(wms_sources), warehouse_code)
+
+    # Fetch classifications for all WMS sources in one request
+    source_url = f"{SUPABASE_URL}/rest/v1/sheet_sources"
+    source_params = {
+        "id": f"in.({','.join(wms_sources)})",
+        "select": "id,classification",
+    }
+    source_response = await client.get(source_url, params=source_params)
+    source_response.raise_for_status()
+    classifications = {
+        source["id"]: source.get("classification") or {}
+        for source in parse_json(source_response)
+    }
+
+    # Check each WMS source in binding order; the first source that configures a column wins
+    for source_id in wms_sources:
+        classification = classifications.get(source_id)
+        if classification is None:
+            logger.warning("No sheet source data for source %s", source_id)
+            continue
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Classification for source %s: %s", source_id, classification)
+
+        for key in WMS_CLASSIFICATION_KEYS:
+            if not columns[key] and classification.get(key):
+                columns[key] = classification[key]
+
+        if all(columns.values()):
+            break
+
+    missing = [key for key, value in columns.items() if not value]
+    if missing:
+        logger.info("No %s configured for warehouse_id %s", ", ".join(missing), warehouse_id)
+    return config
+
+
+async def get_wms_columns_for_warehouse(
+    client: httpx.AsyncClient,
+    warehouse_code: str,
+    context: Optional[Dict[str, Dict]] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Get the location/lot/quantity column names from WMS source classification for a warehouse
+    Returns {"location_col": ..., "lot_col": ..., "qty_col": ...}; missing columns are None.
+    """
+    return (await get_warehouse_wms_config(client, warehouse_code, context))["columns"]
 
-        print(f"❌ No valid location column found for warehouse_id '{warehouse_id}'")
-        return None
 
-    except Exception as e:
-        print(f"💥 Error getting location column for warehouse {warehouse_code}: {e}")
-        return None
+async def get_lot_column_for_warehouse(
+    client: httpx.AsyncClient,
+    warehouse_code: str,
+    context: Optional[Dict[str, Dict]] = None,
+) -> Optional[str]:
+    """
+    Get the lot column name from WMS source classification for a warehouse
+    """
+    return (await get_wms_columns_for_warehouse(client, warehouse_code, context))["lot_col"]
+
+
+async def get_qty_column_for_warehouse(
+    client: httpx.AsyncClient,
+    warehouse_code: str,
+    context: Optional[Dict[str, Dict]] = None,
+) -> Optional[str]:
+    """
+    Get the quantity column name from WMS source classification for a warehouse
+    """
+    return (await get_wms_columns_for_warehouse(client, warehouse_code, context))["qty_col"]
+
+
+async def get_location_column_for_warehouse(
+    client: httpx.AsyncClient,
+    warehouse_code: str,
+    context: Optional[Dict[str, Dict]] = None,
+) -> Optional[str]:
+    """
+    Get the location column name from WMS source classification for a warehouse
+    warehouse_code can be either warehouse.id (UUID) or warehouse.code (like 'EA2-F')
+    """
+    return (await get_wms_columns_for_warehouse(client, warehouse_code, context))["location_col"]
 
 
 class LocationInventoryRequest(BaseModel):
     warehouse_code: str
     location: str
+    summary_only: bool = False
 
 
 class BatchLocationInventoryRequest(BaseModel):
@@ -418,9 +318,329 @@ class LocationInventorySummary(BaseModel):
     last_updated: Optional[str]
 
 
+# Rack and batch lookups page through wms_raw_rows; RACK_ROW_LIMIT caps rows per rack
+ROW_PAGE_SIZE = 1000
+RACK_ROW_LIMIT = 10000
+
+# Pages after the first one that _fetch_paged_rows keeps in flight at once
+ROW_PAGE_CONCURRENCY = 4
+
+# Locations per wms_raw_rows query in get_multiple_locations_inventory, and how many
+# of those chunk queries may be in flight at once
+LOCATION_BATCH_SIZE = 100
+LOCATION_CHUNK_CONCURRENCY = 8
+
+# wms_raw_rows columns read when building LocationInventoryItem / summaries
+# (lot and quantity columns are added per warehouse)
+LOCATION_ITEM_COLUMNS = (
+    "id", "source_id", "split_key", "item_code", "zone",
+    "inb_date", "valid_date", "prod_date", "fetched_at",
+)
+
+
+def _location_select(*dynamic_columns: str) -> str:
+    """Build a narrow select list: LOCATION_ITEM_COLUMNS plus the warehouse-specific columns"""
+    columns = dict.fromkeys(LOCATION_ITEM_COLUMNS)
+    columns.update(dict.fromkeys(dynamic_columns))
+    return ",".join(columns)
+
+
+def _in_filter(values: List[str]) -> str:
+    """PostgREST in.() filter with each value double-quoted (locations may contain commas)"""
+    quoted = (
+        '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for value in values
+    )
+    return f"in.({','.join(quoted)})"
+
+
+def _source_filter(source_ids: List[str]) -> str:
+    """PostgREST filter matching any of the given source ids"""
+    if len(source_ids) == 1:
+        return f"eq.{source_ids[0]}"
+    return f"in.({','.join(source_ids)})"
+
+
+def _row_params(
+    source_filter: str,
+    location_pg_column: str,
+    location_filter: str,
+    select: str = "*",
+    **extra: str,
+) -> Dict[str, str]:
+    """Build wms_raw_rows query params for the bound sources and a location filter"""
+    params = {
+        "source_id": source_filter,
+        location_pg_column: location_filter,
+        "select": select,
+    }
+    params.update(extra)
+    return params
+
+
+def _location_query_params(
+    source_ids: List[str],
+    location_pg_column: str,
+    location: str,
+    select: str = "*",
+) -> Dict[str, str]:
+    """Build the wms_raw_rows query params for all bound sources at a location"""
+    return _row_params(
+        _source_filter(source_ids), location_pg_column, f"eq.{location}", select,
+        order="fetched_at.desc",
+    )
+
+
+def _pg_columns(warehouse_code: str, wms_columns: Dict[str, Optional[str]]) -> Tuple[str, str, str]:
+    """
+    Map the classification's Google Sheet columns to wms_raw_rows columns
+    Returns (location_pg_column, lot_pg_column, qty_pg_column), falling back to cell_no/lot_no/available_qty
+    """
+    location_col_from_sheet = wms_columns["location_col"]
+    lot_col_from_sheet = wms_columns["lot_col"]
+    qty_col_from_sheet = wms_columns["qty_col"]
+
+    if not location_col_from_sheet:
+        logger.debug("No location column configured for warehouse %s, using default 'cell_no'", warehouse_code)
+        location_pg_column = "cell_no"  # Default PostgreSQL column
+    else:
+        # Map Google Sheet column name to PostgreSQL column name
+        location_pg_column = WMS_COLUMN_MAP.get(location_col_from_sheet, "cell_no")
+        logger.debug("Mapped '%s' (Sheet) -> '%s' (PostgreSQL)", location_col_from_sheet, location_pg_column)
+
+    if not lot_col_from_sheet:
+        logger.debug("No lot column configured for warehouse %s, using default 'lot_no'", warehouse_code)
+        lot_pg_column = "lot_no"  # Default PostgreSQL column
+    else:
+        # Map Google Sheet column name to PostgreSQL column name
+        lot_pg_column = WMS_COLUMN_MAP.get(lot_col_from_sheet, "lot_no")
+        logger.debug("Mapped '%s' (Sheet) -> '%s' (PostgreSQL)", lot_col_from_sheet, lot_pg_column)
+
+    if not qty_col_from_sheet:
+        logger.debug("No quantity column configured for warehouse %s, using default 'available_qty'", warehouse_code)
+        qty_pg_column = "available_qty"  # Default PostgreSQL column
+    else:
+        # Map Google Sheet column name to PostgreSQL column name
+        qty_pg_column = WMS_COLUMN_MAP.get(qty_col_from_sheet, "available_qty")
+        logger.debug("Mapped '%s' (Sheet) -> '%s' (PostgreSQL)", qty_col_from_sheet, qty_pg_column)
+
+    return location_pg_column, lot_pg_column, qty_pg_column
+
+
+def _wms_sources_from_bindings(source_bindings: Dict) -> List[Dict]:
+    """Collect the distinct (source_id, split_value) pairs of the WMS bindings"""
+    wms_sources = []
+    seen = set()
+    for bind_key, binding_info in source_bindings.items():
+        if binding_info.get("type") == "wms":
+            # Extract source_id and split_value from key
+            if '::' in bind_key:
+                source_id, split_value = bind_key.split('::', 1)
+            else:
+                source_id = bind_key
+                split_value = binding_info.get('split_value')
+            
+            if (source_id, split_value) in seen:
+                continue
+            seen.add((source_id, split_value))
+            wms_sources.append({
+                'source_id': source_id,
+                'split_value': split_value
+            })
+    return wms_sources
+
+
+def _allowed_splits(wms_sources: List[Dict]) -> Dict[str, Optional[set]]:
+    """
+    Map source_id -> allowed split_key values for the bound WMS sources
+    None means every split of that source is bound (no split filter)
+    """
+    allowed: Dict[str, Optional[set]] = {}
+    for source_info in wms_sources:
+        source_id = source_info['source_id']
+        split_value = source_info['split_value']
+        if not split_value:
+            allowed[source_id] = None
+        elif source_id not in allowed:
+            allowed[source_id] = {split_value}
+        elif allowed[source_id] is not None:
+            allowed[source_id].add(split_value)
+    return allowed
+
+
+def _filter_splits(rows: List[Dict], allowed_splits: Dict[str, Optional[set]]) -> List[Dict]:
+    """Keep only rows whose (source_id, split_key) is bound to the warehouse"""
+    filtered = []
+    for row in rows:
+        splits = allowed_splits.get(row.get("source_id"), set())
+        if splits is None or row.get("split_key") in splits:
+            filtered.append(row)
+    return filtered
+
+
+def _empty_summary(location: str) -> LocationInventorySummary:
+    """Summary for a location with no inventory"""
+    return LocationInventorySummary(
+        location=location,
+        zone="",
+        total_items=0,
+        total_quantity=0.0,
+        unique_item_codes=0,
+        items=[],
+        last_updated=None,
+    )
+
+
+# Validates a whole batch of prepared rows in one pydantic-core call
+_ITEM_ADAPTER = TypeAdapter(List[LocationInventoryItem])
+
+
+def _summarize_rows(
+    rows: List[Dict],
+    lot_pg_column: str,
+    qty_pg_column: str,
+) -> Tuple[List[LocationInventoryItem], float, int, Optional[str]]:
+    """
+    Convert wms_raw_rows to LocationInventoryItem and aggregate them
+    Returns (items, total_quantity, unique_item_codes, last_updated); rows that fail validation are skipped
+    """
+    prepared: List[Dict] = []
+    item_codes: List[Optional[str]] = []
+    append_prepared = prepared.append
+    append_code = item_codes.append
+
+    # Totals are accumulated while preparing rows so they are traversed once
+    total_quantity = 0.0
+    seen_codes = set()
+    last_updated = None
+
+    for row in rows:
+        row_get = row.get
+        if row_get("id") is None:
+            logger.warning("Skipping wms_raw_rows row without id")
+            continue
+        qty = row_get(qty_pg_column)  # Use dynamic qty column
+        available_qty = float(qty or 0) if qty is not None else None
+        if available_qty:
+            total_quantity += available_qty
+        item_code = row_get("item_code")
+        if item_code:
+            seen_codes.add(item_code)
+        fetched_at = row_get("fetched_at", "")
+        if fetched_at and (last_updated is None or fetched_at > last_updated):
+            last_updated = fetched_at
+        total_qty = row_get("total_qty")
+        append_prepared({
+            "id": row["id"],
+            "item_code": str(row_get("item_code", "")),
+            "lot_key": row_get(lot_pg_column),  # Use dynamic lot column
+            "available_qty": available_qty,
+            "total_qty": float(total_qty or 0) if total_qty is not None else None,
+            "inb_date": row_get("inb_date"),
+            "valid_date": row_get("valid_date"),
+            "prod_date": row_get("prod_date"),
+            "uld": row_get("uld"),
+            "extra_columns": row_get("extra_columns", {}),
+            "fetched_at": fetched_at,
+        })
+        append_code(item_code)
+
+    try:
+        items = _ITEM_ADAPTER.validate_python(prepared)
+    except ValidationError:
+        # Fall back to row-by-row validation so one bad row doesn't drop the rest,
+        # and recompute the totals over the rows that survived
+        items = []
+        total_quantity = 0.0
+        seen_codes = set()
+        last_updated = None
+        for data, item_code in zip(prepared, item_codes):
+            try:
+                item = LocationInventoryItem.model_validate(data)
+            except ValidationError as e:
+                logger.warning("Failed to create LocationInventoryItem for row %s: %s", data["id"], e)
+                continue
+            items.append(item)
+            if item.available_qty:
+                total_quantity += item.available_qty
+            if item_code:
+                seen_codes.add(item_code)
+            if item.fetched_at and (last_updated is None or item.fetched_at > last_updated):
+                last_updated = item.fetched_at
+
+    unique_item_codes = len(seen_codes)
+    return items, total_quantity, unique_item_codes, last_updated
+
+
+def _location_summary(
+    location: str,
+    rows: List[Dict],
+    lot_pg_column: str,
+    qty_pg_column: str,
+) -> LocationInventorySummary:
+    """Summarize the rows found at one location"""
+    if not rows:
+        return _empty_summary(location)
+
+    # Extract zone from first row
+    zone = rows[0].get("zone", "")
+
+    # Build items and totals using dynamic lot and quantity columns
+    items, total_quantity, unique_item_codes, last_updated = _summarize_rows(rows, lot_pg_column, qty_pg_column)
+
+    return LocationInventorySummary(
+        location=location,
+        zone=zone,
+        total_items=len(items),
+        total_quantity=total_quantity,
+        unique_item_codes=unique_item_codes,
+        items=items,
+        last_updated=last_updated,
+    )
+
+
+async def _fetch_location_summary_rpc(
+    client: httpx.AsyncClient,
+    location: str,
+    location_pg_column: str,
+    qty_pg_column: str,
+    allowed_splits: Dict[str, Optional[set]],
+) -> Optional[LocationInventorySummary]:
+    """
+    Aggregate a location server-side via location_inventory_summary (52_*.sql).
+    Returns None when the RPC is not installed so the caller can fall back.
+    """
+    body = {
+        "p_location_column": location_pg_column,
+        "p_location": location,
+        "p_qty_column": qty_pg_column,
+        "p_sources": [
+            {"source_id": source_id, "split_values": sorted(splits) if splits is not None else None}
+            for source_id, splits in allowed_splits.items()
+        ],
+    }
+    response = await client.post(f"{SUPABASE_URL}/rest/v1/rpc/location_inventory_summary", json=body)
+    if response.status_code == 404:
+        logger.warning("location_inventory_summary RPC not found; summarizing client-side")
+        return None
+    response.raise_for_status()
+
+    result = parse_json(response) or {}
+    return LocationInventorySummary(
+        location=location,
+        zone=result.get("zone") or "",
+        total_items=result.get("total_items") or 0,
+        total_quantity=float(result.get("total_quantity") or 0),
+        unique_item_codes=result.get("unique_item_codes") or 0,
+        items=[],
+        last_updated=result.get("last_updated"),
+    )
+
+
 async def get_location_inventory(
     warehouse_code: str,
-    location: str
+    location: str,
+    summary_only: bool = False,
 ) -> LocationInventorySummary:
     """
     Get inventory for a specific location from WMS raw data
@@ -430,326 +650,192 @@ async def get_location_inventory(
     1. Gets the location column name from WMS sheet source configuration (classification.location_col)
     2. Maps that Google Sheet column to the PostgreSQL column name (e.g., "Cell No." -> "cell_no")
     3. Queries wms_raw_rows using the PostgreSQL column name
+
+    With summary_only=True the totals are computed in Postgres and items is empty.
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        headers = {
-            "apikey": SUPABASE_ANON_KEY,
-            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-            "Content-Type": "application/json",
-        }
+    client = get_http_client()
 
-        # Get location column name from WMS source classification
-        # This returns the Google Sheet header name (e.g., "Cell No.")
-        location_col_from_sheet = await get_location_column_for_warehouse(client, warehouse_code)
-        
-        if not location_col_from_sheet:
-            print(f"⚠️ No location column configured for warehouse '{warehouse_code}', using default 'cell_no'")
-            location_pg_column = "cell_no"  # Default PostgreSQL column
-        else:
-            # Map Google Sheet column name to PostgreSQL column name
-            from column_mapping import WMS_COLUMN_MAP
-            location_pg_column = WMS_COLUMN_MAP.get(location_col_from_sheet, "cell_no")
-            print(f"📊 Mapped '{location_col_from_sheet}' (Sheet) -> '{location_pg_column}' (PostgreSQL)")
-
-        # Get lot column name from WMS source classification
-        lot_col_from_sheet = await get_lot_column_for_warehouse(client, warehouse_code)
-        
-        if not lot_col_from_sheet:
-            print(f"⚠️ No lot column configured for warehouse '{warehouse_code}', using default 'lot_no'")
-            lot_pg_column = "lot_no"  # Default PostgreSQL column
-        else:
-            # Map Google Sheet column name to PostgreSQL column name
-            from column_mapping import WMS_COLUMN_MAP
-            lot_pg_column = WMS_COLUMN_MAP.get(lot_col_from_sheet, "lot_no")
-            print(f"📊 Mapped '{lot_col_from_sheet}' (Sheet) -> '{lot_pg_column}' (PostgreSQL)")
-
-        # Get quantity column name from WMS source classification
-        qty_col_from_sheet = await get_qty_column_for_warehouse(client, warehouse_code)
-        
-        if not qty_col_from_sheet:
-            print(f"⚠️ No quantity column configured for warehouse '{warehouse_code}', using default 'available_qty'")
-            qty_pg_column = "available_qty"  # Default PostgreSQL column
-        else:
-            # Map Google Sheet column name to PostgreSQL column name
-            from column_mapping import WMS_COLUMN_MAP
-            qty_pg_column = WMS_COLUMN_MAP.get(qty_col_from_sheet, "available_qty")
-            print(f"📊 Mapped '{qty_col_from_sheet}' (Sheet) -> '{qty_pg_column}' (PostgreSQL)")
+    # Resolve warehouse, bindings and WMS classification once for this request
+    # Column names are the Google Sheet header names (e.g., "Cell No.")
+    request_context: Dict[str, Dict] = {}
+    warehouse_config = await get_warehouse_wms_config(client, warehouse_code, request_context)
+    location_pg_column, lot_pg_column, qty_pg_column = _pg_columns(warehouse_code, warehouse_config["columns"])
 
-        # Debug: Show which columns are being used
-        print(f"🔍 Matching location '{location}' using PostgreSQL column '{location_pg_column}' for warehouse '{warehouse_code}'")
-        print(f"🔍 Reading lot from column '{lot_pg_column}'")
-        print(f"🔍 Reading quantity from column '{qty_pg_column}'")
+    logger.debug(
+        "Matching location '%s' on column '%s' (lot: '%s', qty: '%s') for warehouse %s",
+        location, location_pg_column, lot_pg_column, qty_pg_column, warehouse_code,
+    )
 
-        url = f"{SUPABASE_URL}/rest/v1/wms_raw_rows"
+    url = f"{SUPABASE_URL}/rest/v1/wms_raw_rows"
 
-        # Query by source_id (warehouse_code column removed)
-        # Get sources from warehouse bindings to know which sources to query
-        binding_url = f"{SUPABASE_URL}/rest/v1/warehouse_bindings"
+    # Query by source_id (warehouse_code column removed)
+    # Reuse the bindings already resolved for this warehouse
+    source_bindings = warehouse_config["source_bindings"]
 
-        # Get all warehouse bindings to find WMS sources (warehouse_code column removed)
-        binding_params = {
-            "select": "source_bindings",
-        }
-        
-        binding_response = await client.get(binding_url, headers=headers, params=binding_params)
-        binding_response.raise_for_status()
-        bindings = binding_response.json()
-        
-        if not bindings or len(bindings) == 0:
-            print(f"⚠️ No bindings found for warehouse '{actual_warehouse_code}'")
-            return LocationInventorySummary(
-                location=location,
-                zone="",
-                total_items=0,
-                total_quantity=0.0,
-                unique_item_codes=0,
-                items=[],
-                last_updated=None,
-            )
-        
-        source_bindings = bindings[0].get("source_bindings", {})
-        
-        # Collect all WMS source IDs and their split values
-        wms_sources = []
-        for bind_key, binding_info in source_bindings.items():
-            if binding_info.get("type") == "wms":
-                # Extract source_id and split_value from key
-                if '::' in bind_key:
-                    source_id, split_value = bind_key.split('::', 1)
-                else:
-                    source_id = bind_key
-                    split_value = binding_info.get('split_value')
-                
-                wms_sources.append({
-                    'source_id': source_id,
-                    'split_value': split_value
-                })
-        
-        if not wms_sources:
-            print(f"⚠️ No WMS sources configured for warehouse '{actual_warehouse_code}'")
-            return LocationInventorySummary(
-                location=location,
-                zone="",
-                total_items=0,
-                total_quantity=0.0,
-                unique_item_codes=0,
-                items=[],
-                last_updated=None,
-            )
-        
-        print(f"📋 Found {len(wms_sources)} WMS source(s) for warehouse '{actual_warehouse_code}'")
-        
-        # Query wms_raw_rows for all WMS sources
-        all_rows = []
-        for source_info in wms_sources:
-            source_id = source_info['source_id']
-            split_value = source_info['split_value']
-            
-            # Build query for this source
-            # Use 'or' filter for multiple possible location column values
-            # Since we're matching by the mapped PostgreSQL column
-            params = {
-                "source_id": f"eq.{source_id}",
-                location_pg_column: f"eq.{location}",
-                "select": "*",
-                "order": "fetched_at.desc",
-            }
-            
-            # Add split_key filter if specified
-            if split_value:
-                params["split_key"] = f"eq.{split_value}"
-            
-            response = await client.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            
-            source_rows = response.json()
-            print(f"  Source {source_id} (split: {split_value}): Found {len(source_rows)} rows")
-            all_rows.extend(source_rows)
-        
-        rows = all_rows
-        print(f"✅ Total found: {len(rows)} rows for location '{location}' using column '{location_pg_column}'")
-
-        # Calculate summary
-        if not rows:
-            return LocationInventorySummary(
-                location=location,
-                zone="",
-                total_items=0,
-                total_quantity=0.0,
-                unique_item_codes=0,
-                items=[],
-                last_updated=None,
-            )
-        
-        # Extract zone from first row
-        zone = rows[0].get("zone", "")
-        
-        # Calculate totals using dynamic quantity column
-        total_quantity = sum(
-            float(row.get(qty_pg_column) or 0) for row in rows
-        )
-        
-        unique_item_codes = len(set(row.get("item_code") for row in rows if row.get("item_code")))
-        
-        last_updated = rows[0].get("fetched_at") if rows else None
-        
-        # Convert to items using dynamic lot and quantity columns
-        items = []
-        for row in rows:
-            try:
-                item = LocationInventoryItem(
-                    id=int(row["id"]),
-                    item_code=str(row.get("item_code", "")),
-                    lot_key=row.get(lot_pg_column),  # Use dynamic lot column
-                    available_qty=float(row.get(qty_pg_column) or 0) if row.get(qty_pg_column) is not None else None,  # Use dynamic qty column
-                    total_qty=float(row.get("total_qty") or 0) if row.get("total_qty") is not None else None,
-                    inb_date=row.get("inb_date"),
-                    valid_date=row.get("valid_date"),
-                    prod_date=row.get("prod_date"),
-                    uld=row.get("uld"),
-                    extra_columns=row.get("extra_columns", {}),
-                    fetched_at=row.get("fetched_at", ""),
-                )
-                items.append(item)
-            except Exception as e:
-                print(f"⚠️ Failed to create LocationInventoryItem for row {row.get('id')}: {e}")
-                continue
+    if not source_bindings:
+        logger.warning("No bindings found for warehouse %s", warehouse_code)
+        return _empty_summary(location)
 
-        print(f"📊 [get_location_inventory] location='{location}' rows={len(rows)} items={len(items)} total_items={len(items)}")
+    wms_sources = _wms_sources_from_bindings(source_bindings)
+    if not wms_sources:
+        logger.warning("No WMS sources configured for warehouse %s", warehouse_code)
+        return _empty_summary(location)
+    
+    logger.debug("Found %d WMS source binding(s) for warehouse %s", len(wms_sources), warehouse_code)
+    
+    # Query wms_raw_rows for all WMS sources in one request, then apply
+    # per-source split_key filters client-side
+    allowed_splits = _allowed_splits(wms_sources)
 
-        return LocationInventorySummary(
-            location=location,
-            zone=zone,
-            total_items=len(items),
-            total_quantity=total_quantity,
-            unique_item_codes=unique_item_codes,
-            items=items,
-            last_updated=last_updated,
+    if summary_only:
+        summary = await _fetch_location_summary_rpc(
+            client, location, location_pg_column, qty_pg_column, allowed_splits
         )
+        if summary is not None:
+            return summary
 
+    params = _location_query_params(
+        list(allowed_splits), location_pg_column, location,
+        select=_location_select(lot_pg_column, qty_pg_column),
+    )
 
-async def get_rack_inventory(
-    warehouse_code: str,
-    rack_location: str
-) -> LocationInventorySummary:
-    """
-    Get inventory for a rack by aggregating all locations matching the pattern
-    E.g., rack_location="A03" will match "A03-01-01", "A03-02-03", etc.
-    """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        headers = {
-            "apikey": SUPABASE_ANON_KEY,
-            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-            "Content-Type": "application/json",
-        }
+    response = await client.get(url, params=params)
+    response.raise_for_status()
 
-        print(f"🏗️ Getting rack inventory for pattern: '{rack_location}-%'")
+    rows = _filter_splits(parse_json(response), allowed_splits)
+    logger.debug("Found %d rows for location '%s' using column '%s'", len(rows), location, location_pg_column)
 
-        # Initialize actual_warehouse_code
-        actual_warehouse_code = warehouse_code
+    summary = _location_summary(location, rows, lot_pg_column, qty_pg_column)
+    if summary_only:
+        summary.items = []
+    return summary
 
-        # Get location column name from WMS source classification
-        location_col_from_sheet = await get_location_column_for_warehouse(client, warehouse_code)
 
-        if not location_col_from_sheet:
-            print(f"⚠️ No location column configured for warehouse '{warehouse_code}', using default 'cell_no'")
-            location_pg_column = "cell_no"
-        else:
-            from column_mapping import WMS_COLUMN_MAP
-            location_pg_column = WMS_COLUMN_MAP.get(location_col_from_sheet, "cell_no")
-            print(f"📊 Mapped '{location_col_from_sheet}' (Sheet) -> '{location_pg_column}' (PostgreSQL)")
-
-        print(f"🔍 Rack '{rack_location}' will query PostgreSQL column '{location_pg_column}' with pattern '{rack_location}-%'")
-
-        # Get other column mappings
-        lot_col_from_sheet = await get_lot_column_for_warehouse(client, warehouse_code)
-        lot_pg_column = WMS_COLUMN_MAP.get(lot_col_from_sheet, "lot_no") if lot_col_from_sheet else "lot_no"
-
-        qty_col_from_sheet = await get_qty_column_for_warehouse(client, warehouse_code)
-        qty_pg_column = WMS_COLUMN_MAP.get(qty_col_from_sheet, "available_qty") if qty_col_from_sheet else "available_qty"
-
-        # Query all locations matching the rack pattern
-        # Use ilike with * wildcards for PostgREST
-        url = f"{SUPABASE_URL}/rest/v1/wms_raw_rows"
-        query_params = {
-            "warehouse_code": f"eq.{actual_warehouse_code}",
-            f"{location_pg_column}": f"ilike.*{rack_location}-*",
-            "select": f"id,warehouse_code,source_id,source_type,item_code,{location_pg_column},{lot_pg_column},{qty_pg_column},fetched_at",
-            "limit": "10000"  # Reasonable limit for rack aggregation
-        }
+def _content_range_total(content_range: Optional[str]) -> Optional[int]:
+    """Parse the total from a PostgREST Content-Range header ("0-999/3500" or "*/0")"""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
 
-        print(f"🔍 Querying rack locations with pattern: {rack_location}-* (using ilike)")
-        print(f"📋 Full query params: {query_params}")
-        response = await client.get(url, headers=headers, params=query_params)
-        response.raise_for_status()
 
-        rows = response.json()
-        print(f"📦 Found {len(rows)} rows for rack pattern '{rack_location}-*'")
+async def _fetch_paged_rows(
+    client: httpx.AsyncClient,
+    url: str,
+    params: Dict[str, str],
+    allowed_splits: Dict[str, Optional[set]],
+    row_limit: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Fetch wms_raw_rows page by page (params must include a stable "order"), up to row_limit
+    The first page also returns the exact match count, so the remaining pages are requested
+    concurrently (at most ROW_PAGE_CONCURRENCY at a time) and each page is split-filtered
+    as soon as it is parsed.
+    """
+    first_limit = ROW_PAGE_SIZE if row_limit is None else min(ROW_PAGE_SIZE, row_limit)
+    first = await client.get(
+        url,
+        params={**params, "limit": str(first_limit), "offset": "0"},
+        headers={"Prefer": "count=exact"},
+    )
+    first.raise_for_status()
+    page = parse_json(first)
+    rows = _filter_splits(page, allowed_splits)
+
+    # Supabase max-rows may cap a page below ROW_PAGE_SIZE; step by what was returned
+    page_size = len(page)
+    total = _content_range_total(first.headers.get("content-range"))
+    if not page_size or total is None:
+        return rows
+
+    end = total if row_limit is None else min(total, row_limit)
+    semaphore = asyncio.Semaphore(ROW_PAGE_CONCURRENCY)
+
+    async def fetch_page(offset: int) -> httpx.Response:
+        async with semaphore:
+            return await client.get(url, params={**params, "limit": str(page_size), "offset": str(offset)})
+
+    pending = [
+        asyncio.ensure_future(fetch_page(offset))
+        for offset in range(page_size, end, page_size)
+    ]
+    try:
+        for next_page in pending:
+            response = await next_page
+            response.raise_for_status()
+            rows.extend(_filter_splits(parse_json(response), allowed_splits))
+    finally:
+        for next_page in pending:
+            next_page.cancel()
 
-        if len(rows) > 0:
-            print(f"📋 Sample location values found: {[row.get(location_pg_column) for row in rows[:5]]}")
-        else:
-            print(f"⚠️ No rows found. Checking warehouse data...")
-            # Check if any data exists for this warehouse
-            test_params = {
-                "warehouse_code": f"eq.{actual_warehouse_code}",
-                "select": f"id,{location_pg_column}",
-                "limit": "5"
-            }
-            test_response = await client.get(url, headers=headers, params=test_params)
-            test_response.raise_for_status()
-            test_rows = test_response.json()
-            print(f"📋 Warehouse '{actual_warehouse_code}' has {len(test_rows)} rows total")
-            if len(test_rows) > 0:
-                print(f"📋 Sample location values: {[row.get(location_pg_column) for row in test_rows]}")
-                print(f"💡 Try a different rack pattern or check if location data format matches '{rack_location}-*'")
-
-        # Convert rows to LocationInventoryItem format
-        items = []
-        total_quantity = 0.0
+    if end < total:
+        logger.warning("Query matched %d rows; only the first %d are returned", total, end)
+    return rows
 
-        for row in rows:
-            try:
-                item = LocationInventoryItem(
-                    id=int(row['id']),
-                    item_code=str(row.get('item_code', '')),
-                    lot_key=row.get(lot_pg_column),  # Use dynamic lot column
-                    available_qty=float(row.get(qty_pg_column) or 0) if row.get(qty_pg_column) is not None else None,  # Use dynamic qty column
-                    total_qty=float(row.get('total_qty') or 0) if row.get('total_qty') is not None else None,
-                    inb_date=row.get('inb_date'),
-                    valid_date=row.get('valid_date'),
-                    prod_date=row.get('prod_date'),
-                    uld=row.get('uld'),
-                    extra_columns=row.get('extra_columns', {}),
-                    fetched_at=row.get('fetched_at', ''),
-                )
-                items.append(item)
-                total_quantity += float(row.get(qty_pg_column, 0) or 0)
-            except Exception as e:
-                print(f"⚠️ Failed to create LocationInventoryItem for row {row.get('id')} in rack: {e}")
-                continue
 
-        total_items = len(items)  # Each successful item
-        unique_item_codes = len(set(item.item_code for item in items if item.item_code))
+async def get_rack_inventory(
+    warehouse_code: str,
+    rack_location: str
+) -> LocationInventorySummary:
+    """
+    Get inventory for a rack by aggregating all locations matching the pattern
+    E.g., rack_location="A03" will match "A03-01-01", "A03-02-03", etc.
+    """
+    client = get_http_client()
+
+    # Resolve bindings and location/lot/quantity column names in one lookup
+    warehouse_config = await get_warehouse_wms_config(client, warehouse_code)
+    location_pg_column, lot_pg_column, qty_pg_column = _pg_columns(warehouse_code, warehouse_config["columns"])
+
+    # wms_raw_rows has no warehouse_code column; scope the query to the bound WMS sources
+    wms_sources = _wms_sources_from_bindings(warehouse_config["source_bindings"])
+    if not wms_sources:
+        logger.warning("No WMS sources configured for warehouse %s", warehouse_code)
+        return _empty_summary(rack_location)
+    allowed_splits = _allowed_splits(wms_sources)
+    source_filter = _source_filter(list(allowed_splits))
+
+    # Query all locations matching the rack pattern
+    # Use ilike with * wildcards for PostgREST
+    url = f"{SUPABASE_URL}/rest/v1/wms_raw_rows"
+    query_params = _row_params(
+        source_filter, location_pg_column, f"ilike.*{rack_location}-*",
+        _location_select(location_pg_column, lot_pg_column, qty_pg_column),
+        order="id",
+    )
+
+    logger.debug("Querying rack '%s' on column '%s' with params %s", rack_location, location_pg_column, query_params)
+    rows = await _fetch_paged_rows(client, url, query_params, allowed_splits, RACK_ROW_LIMIT)
+    logger.debug("Found %d rows for rack pattern '%s-*'", len(rows), rack_location)
+
+    if not rows and logger.isEnabledFor(logging.DEBUG):
+        # Diagnostics only: check if any data exists for this warehouse
+        test_params = {
+            "source_id": source_filter,
+            "select": f"id,{location_pg_column}",
+            "limit": "5"
+        }
+        test_response = await client.get(url, params=test_params)
+        test_response.raise_for_status()
+        test_rows = parse_json(test_response)
+        logger.debug(
+            "Warehouse %s sample location values: %s",
+            warehouse_code, [row.get(location_pg_column) for row in test_rows],
+        )
 
-        print(f"📊 [get_rack_inventory] rack_location='{rack_location}' rows={len(rows)} items={len(items)} total_items={total_items}")
+    # Convert rows to LocationInventoryItem format and aggregate in one pass
+    items, total_quantity, unique_item_codes, last_updated = _summarize_rows(rows, lot_pg_column, qty_pg_column)
+    total_items = len(items)  # Each successful item
 
-        # Get last updated timestamp
-        last_updated = None
-        if rows:
-            timestamps = [row.get('fetched_at') for row in rows if row.get('fetched_at')]
-            if timestamps:
-                last_updated = max(timestamps)
-
-        return LocationInventorySummary(
-            location=rack_location,  # Use the rack base location
-            zone="",  # Zone will be set by caller
-            total_items=total_items,
-            total_quantity=total_quantity,
-            unique_item_codes=unique_item_codes,
-            items=items,
-            last_updated=last_updated,
-        )
+    return LocationInventorySummary(
+        location=rack_location,  # Use the rack base location
+        zone="",  # Zone will be set by caller
+        total_items=total_items,
+        total_quantity=total_quantity,
+        unique_item_codes=unique_item_codes,
+        items=items,
+        last_updated=last_updated,
+    )
 
 
 async def get_multiple_locations_inventory(
@@ -758,24 +844,54 @@ async def get_multiple_locations_inventory(
 ) -> Dict[str, LocationInventorySummary]:
     """
     Get inventory for multiple locations (batch query)
+    Resolves the warehouse config once and fetches all locations with location=in.(...) queries
     """
-    result = {}
+    result = {location: _empty_summary(location) for location in locations}
+    if not locations:
+        return result
+
+    client = get_http_client()
+    warehouse_config = await get_warehouse_wms_config(client, warehouse_code)
+    location_pg_column, lot_pg_column, qty_pg_column = _pg_columns(warehouse_code, warehouse_config["columns"])
+
+    wms_sources = _wms_sources_from_bindings(warehouse_config["source_bindings"])
+    if not wms_sources:
+        logger.warning("No WMS sources configured for warehouse %s", warehouse_code)
+        return result
+
+    allowed_splits = _allowed_splits(wms_sources)
+    source_filter = _source_filter(list(allowed_splits))
+    select = _location_select(location_pg_column, lot_pg_column, qty_pg_column)
+    url = f"{SUPABASE_URL}/rest/v1/wms_raw_rows"
+
+    # Chunk the location list to keep query strings a reasonable length
+    unique_locations = list(dict.fromkeys(locations))
+    chunks = [
+        unique_locations[i:i + LOCATION_BATCH_SIZE]
+        for i in range(0, len(unique_locations), LOCATION_BATCH_SIZE)
+    ]
+    semaphore = asyncio.Semaphore(LOCATION_CHUNK_CONCURRENCY)
+
+    async def fetch_chunk(chunk: List[str]) -> List[Dict]:
+        async with semaphore:
+            return await _fetch_paged_rows(client, url, _row_params(
+                source_filter, location_pg_column, _in_filter(chunk), select,
+                order="fetched_at.desc,id",
+            ), allowed_splits)
+
+    results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+
+    rows_by_location: Dict[str, List[Dict]] = {}
+    for chunk, rows in zip(chunks, results):
+        if isinstance(rows, Exception):
+            # Locations in a failed chunk keep their empty summary
+            logger.error("Error fetching inventory for locations %s: %s", chunk, rows)
+            continue
+        for row in rows:
+            rows_by_location.setdefault(row.get(location_pg_column), []).append(row)
 
-    for location in locations:
-        try:
-            summary = await get_location_inventory(warehouse_code, location)
-            result[location] = summary
-        except Exception as e:
-            print(f"Error fetching inventory for location {location}: {e}")
-            # Return empty summary on error
-            result[location] = LocationInventorySummary(
-                location=location,
-                zone="",
-                total_items=0,
-                total_quantity=0.0,
-                unique_item_codes=0,
-                items=[],
-                last_updated=None,
-            )
+    for location, rows in rows_by_location.items():
+        if location in result:
+            result[location] = _location_summary(location, rows, lot_pg_column, qty_pg_column)
 
     return result
@@ -6,9 +6,76 @@ Usage:
 """
 import sys
 import os
+import re
 from pathlib import Path
+from typing import List
 from supabase_client import supabase, SUPABASE_URL
 
+# Opening/closing tag of a dollar-quoted body: $$ or $tag$
+_DOLLAR_TAG_RE = re.compile(r'\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$')
+
+def split_sql_statements(sql: str) -> List[str]:
+    """Split a SQL script on top-level semicolons in a single pass.
+
+    Semicolons inside comments, quoted strings/identifiers (including E'...'
+    strings with backslash escapes) and dollar-quoted bodies ($$ ... $$ or
+    $tag$ ... $tag$) don't end a statement. Comments between statements are
+    dropped.
+    """
+    statements = []
+    start = None
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == '-' and sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = n if end == -1 else end + 1
+            continue
+        if ch == '/' and sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if ch.isspace():
+            i += 1
+            continue
+
+        if start is None:
+            start = i
+        if ch == "'" and i > 0 and sql[i - 1] in 'Ee' and (i == 1 or not (sql[i - 2].isalnum() or sql[i - 2] == '_')):
+            # E'...' escape string: a backslash escapes the next character (including a quote)
+            i += 1
+            while i < n:
+                if sql[i] == '\\':
+                    i += 2
+                elif sql[i] == "'":
+                    if not sql.startswith("''", i):
+                        break
+                    i += 2
+                else:
+                    i += 1
+            i += 1
+            continue
+        if ch in ("'", '"'):
+            # Doubled quotes ('' / "") just read as two adjacent quoted runs
+            end = sql.find(ch, i + 1)
+            i = n if end == -1 else end + 1
+            continue
+        if ch == '$' and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == '_')):
+            match = _DOLLAR_TAG_RE.match(sql, i)
+            if match:
+                tag = match.group()
+                end = sql.find(tag, match.end())
+                i = n if end == -1 else end + len(tag)
+                continue
+        if ch == ';':
+            statements.append(sql[start:i + 1].strip())
+            start = None
+        i += 1
+
+    if start is not None:
+        statements.append(sql[start:].strip())
+    return statements
+
 def run_migration(migration_file: str) -> bool:
     """Execute a SQL migration file"""
     if not supabase:
@@ -32,34 +99,7 @@ def run_migration(migration_file: str) -> bool:
         # Note: For complex migrations, you might need to split into separate statements
         # or use psql directly
 
-        # Split by common delimiters but be careful with function definitions
-        statements = []
-        current = []
-        in_function = False
-
-        for line in sql_content.split('\n'):
-            line_stripped = line.strip()
-
-            # Track function boundaries
-            if 'CREATE OR REPLACE FUNCTION' in line_stripped or 'CREATE FUNCTION' in line_stripped:
-                in_function = True
-            elif line_stripped.startswith('$$') and in_function:
-                in_function = False
-
-            current.append(line)
-
-            # Split on semicolon only if not in function
-            if line_stripped.endswith(';') and not in_function:
-                statement = '\n'.join(current).strip()
-                if statement and not statement.startswith('--'):
-                    statements.append(statement)
-                current = []
-
-        # Add remaining
-        if current:
-            statement = '\n'.join(current).strip()
-            if statement and not statement.startswith('--'):
-                statements.append(statement)
+        statements = split_sql_statements(sql_content)
 
         print(f"📊 Found {len(statements)} SQL statements to execute")
 
@@ -79,9 +119,10 @@ def run_migration(migration_file: str) -> bool:
                 result = supabase.postgrest.rpc('exec_sql', {'sql': stmt}).execute()
                 executed += 1
             except Exception as e:
-                # If exec_sql RPC doesn't exist, we need to use direct SQL execution
-                # This requires using the underlying connection
-                print(f"   ⚠️  Note: Using alternative execution method")
+                print(f"   ❌ Statement {i}/{len(statements)} failed: {e}")
+                print(f"   {stmt}")
+                if executed:
+                    print(f"   ⚠️  Statements 1-{i - 1} were already applied")
                 # For complex migrations, recommend using Supabase Dashboard SQL Editor
                 print(f"   ⚠️  For this migration, please use Supabase Dashboard SQL Editor")
                 print(f"   📋 Copy the SQL from: {file_path}")
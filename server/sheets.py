@@ -3,11 +3,72 @@ import httpx
 import datetime as dt
 import os
 import json
-from typing import List, Dict, Any, Optional
+import re
+import time
+import orjson
+from functools import lru_cache
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 from urllib.parse import quote
 
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+SHEETS_VALUES_URL = "https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{range}"
+SHEETS_META_URL = "https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}"
+
+# Shared Sheets API client (created lazily, closed on app shutdown); the auth header
+# is passed per request because the token rotates
+SHEETS_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+_sheets_client: Optional[httpx.AsyncClient] = None
+
+def get_sheets_client() -> httpx.AsyncClient:
+    """Get the shared httpx client used for Google Sheets API requests"""
+    global _sheets_client
+    if _sheets_client is None:
+        _sheets_client = httpx.AsyncClient(
+            http2=True,  # h2 comes with httpx[http2] in requirements.txt
+            timeout=30.0,
+            limits=SHEETS_HTTP_LIMITS,
+        )
+    return _sheets_client
+
+async def close_sheets_client() -> None:
+    """Close the shared Sheets API client"""
+    global _sheets_client
+    if _sheets_client is not None:
+        await _sheets_client.aclose()
+        _sheets_client = None
+
+def parse_json(response: httpx.Response) -> Any:
+    """Decode a Sheets API response body with orjson"""
+    return orjson.loads(response.content)
+
+def parse_values(response: httpx.Response) -> List[List[str]]:
+    """Return the "values" rows of a Sheets API response"""
+    return parse_json(response).get("values", [])
+
+# Service account credentials keyed by the JSON they were built from; the access
+# token is reused until it expires instead of being fetched for every sheet request
+_credentials_cache: Optional[Tuple[str, service_account.Credentials]] = None
+
+def get_auth_headers() -> Dict[str, str]:
+    """Build Sheets API auth headers from GOOGLE_SHEETS_CREDENTIALS_JSON."""
+    global _credentials_cache
+    credentials_json = os.getenv('GOOGLE_SHEETS_CREDENTIALS_JSON')
+    if not credentials_json:
+        raise ValueError("GOOGLE_SHEETS_CREDENTIALS_JSON environment variable not set")
+
+    if _credentials_cache is None or _credentials_cache[0] != credentials_json:
+        credentials = service_account.Credentials.from_service_account_info(
+            json.loads(credentials_json), scopes=SHEETS_SCOPES)
+        _credentials_cache = (credentials_json, credentials)
+    credentials = _credentials_cache[1]
+
+    # Refresh only when there is no token yet or it has expired
+    if not credentials.valid:
+        credentials.refresh(Request())
+    return {"Authorization": f"Bearer {credentials.token}"}
+
 async def fetch_sheet_values(spreadsheet_id: str, sheet_name: str, _api_key: Optional[str] = None) -> List[List[str]]:
     """Fetch values from a Google Sheet using service account credentials.
 
@@ -15,53 +76,129 @@ async def fetch_sheet_values(spreadsheet_id: str, sheet_name: str, _api_key: Opt
     """
     # Always quote sheet names to form a valid A1 range (handles spaces and special chars)
     encoded_range = quote(f"'{sheet_name}'", safe='')
-    url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{encoded_range}"
+    url = SHEETS_VALUES_URL.format(spreadsheet_id=spreadsheet_id, range=encoded_range)
 
-    # Read credentials from environment variable
-    credentials_json = os.getenv('GOOGLE_SHEETS_CREDENTIALS_JSON')
-    if not credentials_json:
-        raise ValueError("GOOGLE_SHEETS_CREDENTIALS_JSON environment variable not set")
+    headers = get_auth_headers()
+
+    response = await get_sheets_client().get(url, headers=headers)
+    response.raise_for_status()
+    return parse_values(response)
+
+# Tab row counts per spreadsheet; one metadata request covers every tab, so sources
+# reading tabs of the same spreadsheet during one ingest share it
+SHEET_META_CACHE_TTL = 30.0  # seconds
+_row_counts_cache: Dict[str, Tuple[float, Dict[str, int]]] = {}
 
-    scopes = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
-    credentials = service_account.Credentials.from_service_account_info(
-        json.loads(credentials_json), scopes=scopes)
-    # Ensure token
-    request = Request()
-    credentials.refresh(request)
-    headers = {"Authorization": f"Bearer {credentials.token}"}
+async def get_sheet_row_counts(
+    client: httpx.AsyncClient,
+    spreadsheet_id: str,
+    headers: Dict[str, str]
+) -> Dict[str, int]:
+    """Return gridProperties.rowCount of every tab of a spreadsheet, keyed by tab title"""
+    cached = _row_counts_cache.get(spreadsheet_id)
+    if cached and time.monotonic() - cached[0] < SHEET_META_CACHE_TTL:
+        return cached[1]
 
-    async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
-        response = await client.get(url)
+    url = SHEETS_META_URL.format(spreadsheet_id=spreadsheet_id)
+    response = await client.get(
+        url,
+        headers=headers,
+        params={"fields": "sheets.properties(title,gridProperties.rowCount)"}
+    )
+    response.raise_for_status()
+    row_counts = {}
+    for sheet in parse_json(response).get("sheets", []):
+        properties = sheet.get("properties", {})
+        row_counts[properties.get("title")] = properties.get("gridProperties", {}).get("rowCount")
+    _row_counts_cache[spreadsheet_id] = (time.monotonic(), row_counts)
+    return row_counts
+
+async def stream_sheet_values(
+    spreadsheet_id: str,
+    sheet_name: str,
+    page_size: int = 5000
+) -> AsyncIterator[List[List[str]]]:
+    """Fetch a Google Sheet page by page using row ranges.
+
+    Each yielded page starts with the header row, so it can be passed straight to
+    normalize(). Pages run up to the sheet's gridProperties.rowCount; a short page
+    does not mean the end, since the API trims trailing empty rows from each range.
+    Without a row count, paging stops at the first empty page.
+    """
+    headers = get_auth_headers()
+    header = None
+    start = 1
+
+    client = get_sheets_client()
+    row_count = (await get_sheet_row_counts(client, spreadsheet_id, headers)).get(sheet_name)
+    while row_count is None or start <= row_count:
+        end = start + page_size - 1
+        if row_count is not None:
+            end = min(end, row_count)
+        encoded_range = quote(f"'{sheet_name}'!{start}:{end}", safe='')
+        url = SHEETS_VALUES_URL.format(spreadsheet_id=spreadsheet_id, range=encoded_range)
+        response = await client.get(url, headers=headers)
         response.raise_for_status()
-        data = response.json()
-        return data.get("values", [])
+        rows = parse_values(response)
+        start = end + 1
+
+        if not rows:
+            if row_count is None:
+                return
+            continue
 
-def arrays_to_objects(values: List[List[str]]) -> List[Dict[str, Any]]:
-    """Convert 2D array to list of objects with headers as keys."""
+        if header is None:
+            header, rows = rows[0], rows[1:]
+
+        if rows:
+            yield [header] + rows
+
+def arrays_to_objects(
+    values: List[List[str]],
+    split_column: Optional[str] = None,
+    split_value: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Convert 2D array to list of objects with headers as keys.
+
+    If split_column and split_value are given, rows whose split cell does not
+    match split_value are dropped here, before any per-row work is done.
+    """
     if not values or not values[0]:
         return []
     
     # First row is header
     header = [str(h).strip() for h in values[0]]
+    width = len(header)
     objects = []
     
+    split_index = None
+    if split_column and split_value:
+        if split_column not in header:
+            return []
+        split_index = header.index(split_column)
+        # Compare the cell as split_key is derived from it: coerced, then denorm_value()
+        coerce_split = get_value_coercer(split_column)
+    
     for row_index, row in enumerate(values[1:], start=1):
         # Skip empty rows
-        if not any((cell or "").strip() for cell in row):
+        if is_empty_row(row):
             continue
         
-        # Create object with header keys
-        obj = {}
-        for col_index in range(len(header)):
-            value = row[col_index] if col_index < len(row) else None
-            obj[header[col_index]] = value
+        # Skip rows belonging to other splits
+        if split_index is not None:
+            split_cell = row[split_index] if split_index < len(row) else None
+            if denorm_value(coerce_split(split_cell)) != split_value:
+                continue
         
-        objects.append(obj)
+        # Create object with header keys (short rows are padded with None)
+        if len(row) < width:
+            row = list(row) + [None] * (width - len(row))
+        objects.append(dict(zip(header, row)))
     
     return objects
 
 # Column names that should be parsed as numbers
-NUMERIC_KEYS = {
+NUMERIC_KEYS = frozenset({
     "Tot. Qty.",
     "Available Qty.",
     "Exchg. Avlb. Qty.",
@@ -69,14 +206,14 @@ NUMERIC_KEYS = {
     "Volume",
     "Weight",
     "Amount"
-}
+})
 
 # Column names that should be parsed as dates
-DATE_KEYS = {
+DATE_KEYS = frozenset({
     "Inb. Date",
     "Valid Date",
     "Prod. Date"
-}
+})
 
 def to_number(value: Any) -> Optional[float]:
     """Convert value to float, handling commas and empty values."""
@@ -93,9 +230,29 @@ def to_iso_date(value: Any) -> Optional[str]:
     """Convert date value to ISO format string."""
     if not value:
         return None
-    
-    date_str = str(value).strip()
-    
+    return _parse_date_str(str(value).strip())
+
+# Common exact date shapes, handled without exception-driven fallbacks
+_ISO_DATE_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})')
+_US_DATE_RE = re.compile(r'([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})')
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(date_str: str) -> Optional[str]:
+    """Parse a date cell once; sheets repeat the same dates across many rows"""
+    match = _ISO_DATE_RE.fullmatch(date_str)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = _US_DATE_RE.fullmatch(date_str)
+        if match:
+            month, day, year = match.groups()
+    if match:
+        try:
+            return dt.date(int(year), int(month), int(day)).isoformat()
+        except ValueError:
+            return None
+
+    # Anything else (timestamps, other ISO forms) goes through the general parsers
     try:
         # Try ISO format first (YYYY-MM-DD)
         parsed = dt.datetime.fromisoformat(date_str)
@@ -116,25 +273,47 @@ def to_iso_date(value: Any) -> Optional[str]:
     # Return original value if parsing fails
     return None
 
+def to_clean_string(value: Any) -> Optional[str]:
+    """Default coercion: stripped string or None."""
+    if value is None:
+        return None
+    return str(value).strip()
+
+# Column name -> coercer, resolved once instead of two set tests per cell
+_COERCERS: Dict[str, Callable[[Any], Any]] = {
+    **{key: to_number for key in NUMERIC_KEYS},
+    **{key: to_iso_date for key in DATE_KEYS},
+}
+
+def get_value_coercer(key: str) -> Callable[[Any], Any]:
+    """Return the coercion function used for a column name."""
+    return _COERCERS.get(key, to_clean_string)
+
 def coerce_types(obj: Dict[str, Any]) -> Dict[str, Any]:
     """Apply type coercion based on column names."""
-    output = {}
-    
-    for key, value in obj.items():
-        if key in NUMERIC_KEYS:
-            output[key] = to_number(value)
-        elif key in DATE_KEYS:
-            output[key] = to_iso_date(value)
-        else:
-            # Default: clean string or None
-            if value is None:
-                output[key] = None
-            else:
-                output[key] = str(value).strip()
-    
-    return output
+    coercers = _COERCERS
+    return {key: coercers.get(key, to_clean_string)(value) for key, value in obj.items()}
+
+def denorm_value(value: Any) -> Optional[str]:
+    """Stripped string form of a normalized cell, as stored in denormalized columns (None if blank)."""
+    value = str(value).strip() if value else None
+    return value or None
+
+def is_empty_row(row: List[Any]) -> bool:
+    """True if every cell in a raw sheet row is blank."""
+    return not any((cell or "").strip() for cell in row)
+
+def normalize(
+    values: List[List[str]],
+    split_column: Optional[str] = None,
+    split_value: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Normalize sheet values to typed objects, optionally keeping one split only."""
+    rows = arrays_to_objects(values, split_column, split_value)
+    if not rows:
+        return []
 
-def normalize(values: List[List[str]]) -> List[Dict[str, Any]]:
-    """Normalize sheet values to typed objects."""
-    rows = arrays_to_objects(values)
-    return [coerce_types(row) for row in rows]
+    # Coerce column by column: one coercer lookup per header instead of per cell
+    keys = list(rows[0])
+    columns = [list(map(get_value_coercer(key), [row[key] for row in rows])) for key in keys]
+    return [dict(zip(keys, typed)) for typed in zip(*columns)]
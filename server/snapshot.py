@@ -1,74 +1,89 @@
 """Snapshot building utilities for dashboard data."""
+import heapq
 from collections import defaultdict
 from typing import Dict, List, Any
 
+TOP_ITEMS_LIMIT = 20
+
+
 def build_dashboard_snapshot(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Build a dashboard-oriented snapshot from normalized sheet rows.
-    
+
     Expected columns (tolerant):
     - Item Code, Item Nm, Zone Cd, Cell No., Available Qty., Tot. Qty., Inb. Date, Valid Date
-    
+
     Returns a structured snapshot with zones, locations, and item summaries.
     """
-    zones = defaultdict(lambda: {
-        "total_avail": 0.0,
-        "total_qty": 0.0,
-        "locations": {}
-    })
-    
+    zones: Dict[str, Dict[str, Any]] = {}
+
     item_totals = defaultdict(float)
     item_names = {}
-    
+    item_rows = 0
+    location_count = 0
+
+    # Single pass: resolve the zone and location entries once per row and keep
+    # running totals in locals instead of re-indexing the nested dicts
     for row in rows:
-        # Extract key fields
-        zone_code = row.get("Zone Cd") or "UNZONED"
-        location = row.get("Cell No.") or "UNLOCATED"
-        item_code = row.get("Item Code")
-        item_name = row.get("Item Nm")
-        avail_qty = float(row.get("Available Qty.") or 0.0)
-        total_qty = float(row.get("Tot. Qty.") or 0.0)
-        
+        get = row.get
+        zone_code = get("Zone Cd") or "UNZONED"
+        location = get("Cell No.") or "UNLOCATED"
+        item_code = get("Item Code")
+        avail_qty = float(get("Available Qty.") or 0.0)
+        total_qty = float(get("Tot. Qty.") or 0.0)
+
         # Aggregate zone totals
-        zones[zone_code]["total_avail"] += avail_qty
-        zones[zone_code]["total_qty"] += total_qty
-        
-        # Initialize location if not exists
-        if location not in zones[zone_code]["locations"]:
-            zones[zone_code]["locations"][location] = {
+        zone = zones.get(zone_code)
+        if zone is None:
+            zone = zones[zone_code] = {
+                "total_avail": 0.0,
+                "total_qty": 0.0,
+                "locations": {}
+            }
+        zone["total_avail"] += avail_qty
+        zone["total_qty"] += total_qty
+
+        # Update location totals
+        locations = zone["locations"]
+        loc = locations.get(location)
+        if loc is None:
+            loc = locations[location] = {
                 "avail": 0.0,
                 "total": 0.0,
                 "items": []
             }
-        
-        # Update location totals
-        zones[zone_code]["locations"][location]["avail"] += avail_qty
-        zones[zone_code]["locations"][location]["total"] += total_qty
-        
+            location_count += 1
+        loc["avail"] += avail_qty
+        loc["total"] += total_qty
+
         # Add item details if present
         if item_code:
+            item_rows += 1
+            item_name = get("Item Nm")
             item_detail = {
                 "item_code": item_code,
                 "item_nm": item_name,
                 "avail": avail_qty,
                 "total": total_qty
             }
-            
+
             # Add optional date fields if present
-            if row.get("Inb. Date"):
-                item_detail["inb_date"] = row.get("Inb. Date")
-            if row.get("Valid Date"):
-                item_detail["valid_date"] = row.get("Valid Date")
-            
-            zones[zone_code]["locations"][location]["items"].append(item_detail)
-            
+            inb_date = get("Inb. Date")
+            if inb_date:
+                item_detail["inb_date"] = inb_date
+            valid_date = get("Valid Date")
+            if valid_date:
+                item_detail["valid_date"] = valid_date
+
+            loc["items"].append(item_detail)
+
             # Track item totals for top items
             item_totals[item_code] += avail_qty
             if item_name:
                 item_names[item_code] = item_name
-    
-    # Calculate top items
-    top_items_data = sorted(item_totals.items(), key=lambda x: x[1], reverse=True)[:20]
+
+    # Calculate top items (same ordering as sorted(..., reverse=True)[:N])
+    top_items_data = heapq.nlargest(TOP_ITEMS_LIMIT, item_totals.items(), key=lambda x: x[1])
     top_items = [
         {
             "item_code": code,
@@ -77,21 +92,25 @@ def build_dashboard_snapshot(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
         }
         for code, qty in top_items_data
     ]
-    
-    # Build summary statistics
+
+    # Build summary statistics; grand totals add up the per-zone sums (not rows)
+    # so they round exactly as before
+    total_available = 0
+    total_quantity = 0
+    for zone in zones.values():
+        total_available += zone["total_avail"]
+        total_quantity += zone["total_qty"]
+
     summary = {
-        "total_items": sum(1 for row in rows if row.get("Item Code")),
-        "total_available": sum(z["total_avail"] for z in zones.values()),
-        "total_quantity": sum(z["total_qty"] for z in zones.values()),
+        "total_items": item_rows,
+        "total_available": total_available,
+        "total_quantity": total_quantity,
         "zone_count": len(zones),
-        "location_count": sum(len(z["locations"]) for z in zones.values()),
+        "location_count": location_count,
         "top_items": top_items
     }
-    
-    # Convert defaultdict to regular dict for JSON serialization
-    zones_dict = {k: dict(v) for k, v in zones.items()}
-    
+
     return {
         "summary": summary,
-        "zones": zones_dict
+        "zones": zones
     }
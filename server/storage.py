@@ -1,7 +1,8 @@
 """Storage utilities for configuration and snapshot management."""
-import json
+import mmap
 import os
 import datetime
+import orjson
 from typing import Tuple, Optional
 from models import ServerConfig
 
@@ -15,21 +16,29 @@ SNAP_DIR = os.path.join(DATA_DIR, "snapshots")
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(SNAP_DIR, exist_ok=True)
 
+def dump_json(data) -> bytes:
+    """Serialize to indented UTF-8 JSON bytes."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+def load_json(raw):
+    """Parse JSON from bytes or a memoryview."""
+    return orjson.loads(raw)
+
 def load_config() -> ServerConfig:
     """Load server configuration from disk, creating default if not exists."""
     if not os.path.exists(CONF_PATH):
         default_config = ServerConfig()
-        with open(CONF_PATH, "w", encoding="utf-8") as f:
-            json.dump(default_config.model_dump(), f, ensure_ascii=False, indent=2)
+        with open(CONF_PATH, "wb") as f:
+            f.write(dump_json(default_config.model_dump()))
     
-    with open(CONF_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(CONF_PATH, "rb") as f:
+        data = load_json(f.read())
         return ServerConfig(**data)
 
 def save_config(cfg: ServerConfig) -> None:
     """Save server configuration to disk."""
-    with open(CONF_PATH, "w", encoding="utf-8") as f:
-        json.dump(cfg.model_dump(), f, ensure_ascii=False, indent=2)
+    with open(CONF_PATH, "wb") as f:
+        f.write(dump_json(cfg.model_dump()))
 
 def snapshot_paths(warehouse_code: str) -> Tuple[str, str]:
     """Get snapshot paths for a warehouse (timestamped and latest)."""
@@ -45,14 +54,23 @@ def snapshot_paths(warehouse_code: str) -> Tuple[str, str]:
 def write_snapshot(warehouse_code: str, payload: dict) -> str:
     """Write snapshot to both timestamped and latest files."""
     timestamped_path, latest_path = snapshot_paths(warehouse_code)
+    data = dump_json(payload)
     
-    # Write timestamped version
-    with open(timestamped_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    # Publish latest atomically: write a temp file, then swap it into place
+    tmp_path = f"{latest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, latest_path)
     
-    # Write/overwrite latest version
-    with open(latest_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    # Timestamped version shares latest's inode; a later replace of latest leaves it intact
+    try:
+        os.link(latest_path, timestamped_path)
+    except OSError:
+        # Links unsupported, or a snapshot for this second already exists
+        with open(timestamped_path, "wb") as f:
+            f.write(data)
     
     return timestamped_path
 
@@ -63,5 +81,8 @@ def read_latest_snapshot(warehouse_code: str) -> Optional[dict]:
     if not os.path.exists(latest_path):
         return None
     
-    with open(latest_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Map the file instead of reading it into a bytes copy
+    with open(latest_path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            memoryview(mm) as view:
+        return load_json(view)
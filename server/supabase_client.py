@@ -1,11 +1,19 @@
 """Supabase client configuration and helpers"""
+import asyncio
 import os
-from supabase import create_client, Client
+import time
+from functools import lru_cache
+from supabase import create_client, Client, ClientOptions
 from typing import Optional, Dict, Any, List
 import logging
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
 
+try:
+    import asyncpg
+except ImportError:  # Optional: only needed for COPY-based ingest
+    asyncpg = None
+
 logger = logging.getLogger(__name__)
 
 # Load env from server/.env first (if present), then fall back to nearest .env up the tree
@@ -17,20 +25,64 @@ load_dotenv(find_dotenv(), override=False)
 # Get Supabase credentials from environment
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY', '')  # Use service key for server-side operations
+# Optional direct Postgres DSN for bulk COPY. Point this at the Supavisor pooler
+# (port 6543, transaction mode) so concurrent ingest batches share pooled connections.
+SUPABASE_DB_URL = os.getenv('SUPABASE_DB_URL', '')
+POSTGREST_TIMEOUT = 60  # seconds; large insert batches exceed the client default
+RAW_INSERT_CONCURRENCY = 8  # raw_rows insert batches in flight at once
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Optional[Client]:
+    """Create the Supabase client once; its PostgREST HTTP session is reused for every call"""
+    if not (SUPABASE_URL and SUPABASE_SERVICE_KEY):
+        logger.warning("Supabase credentials not found. Database operations will fail.")
+        return None
+    client = create_client(
+        SUPABASE_URL,
+        SUPABASE_SERVICE_KEY,
+        options=ClientOptions(postgrest_client_timeout=POSTGREST_TIMEOUT)
+    )
+    logger.info("Supabase client initialized")
+    return client
 
 # Initialize Supabase client
-supabase: Optional[Client] = None
-
-if SUPABASE_URL and SUPABASE_SERVICE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    logger.info("Supabase client initialized")
-else:
-    logger.warning("Supabase credentials not found. Database operations will fail.")
+supabase: Optional[Client] = get_supabase_client()
 
 def check_supabase() -> bool:
     """Check if Supabase is configured"""
     return supabase is not None
 
+# Direct Postgres pool (created lazily, only when asyncpg and SUPABASE_DB_URL are available)
+_pg_pool = None
+_pg_pool_lock = asyncio.Lock()
+
+async def get_pg_pool():
+    """Get the shared asyncpg pool, or None if direct Postgres access is not configured or unreachable"""
+    global _pg_pool
+    if asyncpg is None or not SUPABASE_DB_URL:
+        return None
+    if _pg_pool is None:
+        # Concurrent ingests wait here so only one pool is ever created
+        async with _pg_pool_lock:
+            if _pg_pool is None:
+                try:
+                    # Transaction-mode poolers do not keep prepared statements across transactions
+                    _pg_pool = await asyncpg.create_pool(
+                        SUPABASE_DB_URL, min_size=1, max_size=5, statement_cache_size=0
+                    )
+                    logger.info("Postgres pool initialized for bulk COPY")
+                except Exception as e:
+                    logger.error(f"Could not connect to Postgres, using REST inserts: {e}")
+                    return None
+    return _pg_pool
+
+async def close_pg_pool() -> None:
+    """Close the shared asyncpg pool"""
+    global _pg_pool
+    if _pg_pool is not None:
+        await _pg_pool.close()
+        _pg_pool = None
+
 async def get_sheet_sources(source_type: Optional[str] = None) -> List[Dict[str, Any]]:
     """Get sheet sources from database"""
     if not supabase:
@@ -57,6 +109,7 @@ async def update_sheet_source(source_id: str, data: Dict[str, Any]) -> Dict[str,
         raise Exception("Supabase not configured")
     
     result = supabase.table('sheet_sources').update(data).eq('id', source_id).execute()
+    invalidate_binding()
     return result.data[0] if result.data else {}
 
 async def delete_sheet_source(source_id: str) -> bool:
@@ -65,6 +118,7 @@ async def delete_sheet_source(source_id: str) -> bool:
         raise Exception("Supabase not configured")
     
     result = supabase.table('sheet_sources').delete().eq('id', source_id).execute()
+    invalidate_binding()
     return len(result.data) > 0 if result.data else False
 
 async def get_warehouse_id_by_code(warehouse_code: str) -> Optional[str]:
@@ -80,15 +134,10 @@ async def get_warehouse_binding(warehouse_code: str) -> Optional[Dict[str, Any]]
     if not supabase:
         raise Exception("Supabase not configured")
     
-    # Get warehouse_id from code
-    warehouse_id = await get_warehouse_id_by_code(warehouse_code)
-    if not warehouse_id:
-        return None
-    
-    # Query by warehouse_id
+    # Filter on the embedded warehouse code: one request instead of an id lookup first
     result = supabase.table('warehouse_bindings')\
         .select('*, warehouses!inner(code)')\
-        .eq('warehouse_id', warehouse_id)\
+        .eq('warehouses.code', warehouse_code)\
         .execute()
     
     if result.data:
@@ -99,6 +148,42 @@ async def get_warehouse_binding(warehouse_code: str) -> Optional[Dict[str, Any]]
         return binding
     return None
 
+# Short-lived caches for ingest lookups (bindings and sources change rarely)
+BINDING_CACHE_TTL = float(os.getenv('BINDING_CACHE_TTL', '60'))  # seconds
+_binding_cache: Dict[str, tuple] = {}
+_sheet_sources_cache: Dict[tuple, tuple] = {}
+
+def invalidate_binding(warehouse_code: Optional[str] = None) -> None:
+    """Drop cached bindings (one warehouse, or all) and cached sheet sources after a mutation"""
+    if warehouse_code is None:
+        _binding_cache.clear()
+    else:
+        _binding_cache.pop(warehouse_code, None)
+    _sheet_sources_cache.clear()
+
+async def get_warehouse_binding_cached(warehouse_code: str) -> Optional[Dict[str, Any]]:
+    """get_warehouse_binding with a BINDING_CACHE_TTL cache"""
+    cached = _binding_cache.get(warehouse_code)
+    if cached and time.monotonic() - cached[0] < BINDING_CACHE_TTL:
+        return cached[1]
+    binding = await get_warehouse_binding(warehouse_code)
+    _binding_cache[warehouse_code] = (time.monotonic(), binding)
+    return binding
+
+async def get_sheet_sources_by_ids(source_ids: List[str]) -> List[Dict[str, Any]]:
+    """Fetch sheet sources by id, cached for BINDING_CACHE_TTL"""
+    if not supabase:
+        raise Exception("Supabase not configured")
+    
+    key = tuple(sorted(source_ids))
+    cached = _sheet_sources_cache.get(key)
+    if cached and time.monotonic() - cached[0] < BINDING_CACHE_TTL:
+        return cached[1]
+    result = supabase.table('sheet_sources').select('*').in_('id', list(key)).execute()
+    sources = result.data if result else []
+    _sheet_sources_cache[key] = (time.monotonic(), sources)
+    return sources
+
 async def upsert_warehouse_binding(data: Dict[str, Any]) -> Dict[str, Any]:
     """Create or update warehouse binding"""
     if not supabase:
@@ -121,6 +206,7 @@ async def upsert_warehouse_binding(data: Dict[str, Any]) -> Dict[str, Any]:
         data, 
         on_conflict='warehouse_id'
     ).execute()
+    invalidate_binding(warehouse_code)
     
     # Return the first item if data exists
     if result.data and len(result.data) > 0:
@@ -130,8 +216,13 @@ async def upsert_warehouse_binding(data: Dict[str, Any]) -> Dict[str, Any]:
         return binding
     return {}
 
-async def insert_raw_rows(rows: List[Dict[str, Any]]) -> int:
-    """Insert raw rows into database"""
+async def insert_raw_rows(rows: List[Any]) -> int:
+    """Insert raw rows into database.
+
+    Rows may be plain dicts or records exposing ``to_dict()``; records are
+    only converted to dicts one batch at a time, right before the insert.
+    Batches are sent concurrently (up to RAW_INSERT_CONCURRENCY at once).
+    """
     if not supabase:
         raise Exception("Supabase not configured")
     
@@ -140,18 +231,28 @@ async def insert_raw_rows(rows: List[Dict[str, Any]]) -> int:
     
     # Insert in batches of 1000
     batch_size = 1000
-    total_inserted = 0
-    
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i:i + batch_size]
-        try:
-            result = supabase.table('raw_rows').insert(batch).execute()
-            total_inserted += len(result.data) if result.data else 0
-        except Exception as e:
-            logger.error(f"Error inserting batch {i//batch_size + 1}: {e}")
-            # Continue with next batch
-    
-    return total_inserted
+    semaphore = asyncio.Semaphore(RAW_INSERT_CONCURRENCY)
+
+    def _insert(start: int) -> int:
+        batch = [
+            row.to_dict() if hasattr(row, 'to_dict') else row
+            for row in rows[start:start + batch_size]
+        ]
+        result = supabase.table('raw_rows').insert(batch).execute()
+        return len(result.data) if result.data else 0
+
+    async def _send(start: int) -> int:
+        async with semaphore:
+            try:
+                # supabase-py is blocking; run each batch in a worker thread
+                return await asyncio.to_thread(_insert, start)
+            except Exception as e:
+                logger.error(f"Error inserting batch {start//batch_size + 1}: {e}")
+                # Other batches still go through
+                return 0
+
+    results = await asyncio.gather(*[_send(i) for i in range(0, len(rows), batch_size)])
+    return sum(results)
 
 async def get_latest_raw_data(
     warehouse_code: str, 
@@ -214,6 +315,7 @@ async def delete_warehouse_binding(warehouse_code: str) -> bool:
         return False
     
     result = supabase.table('warehouse_bindings').delete().eq('warehouse_id', warehouse_id).execute()
+    invalidate_binding(warehouse_code)
     return len(result.data) > 0 if result.data else False
 
 async def get_split_values_for_source(source_id: str, exclude_warehouse: Optional[str] = None) -> Dict[str, Any]:
@@ -245,49 +347,43 @@ async def get_split_values_for_source(source_id: str, exclude_warehouse: Optiona
             'values': []
         }
     
-    # Get unique split_key values from appropriate table based on source type
+    # Distinct split values and the warehouses using them are computed in one RPC (53_*.sql)
     source_type = source.get('type')
+    try:
+        result = supabase.rpc('get_source_split_values', {
+            'p_source_id': source_id,
+            'p_source_type': source_type,
+            'p_exclude_warehouse': exclude_warehouse,
+        }).execute()
+        values = result.data or []
+    except Exception as e:
+        logger.warning(f"get_source_split_values RPC failed ({e}); computing split values client-side")
+        values = _split_values_client_side(source_id, source_type, exclude_warehouse)
+    
+    return {
+        'source_id': source_id,
+        'split_by_column': split_by_column,
+        'values': values
+    }
+
+def _split_values_client_side(source_id: str, source_type: Optional[str], exclude_warehouse: Optional[str]) -> List[Dict[str, Any]]:
+    """Fallback for get_split_values_for_source when the RPC is not installed"""
     table_name = 'wms_raw_rows' if source_type == 'wms' else 'sap_raw_rows'
     
+    # Collect unique values (filter out null/empty)
+    unique_values = set()
     try:
-        # First, let's check total count
-        count_result = supabase.table(table_name)\
-            .select('id', count='exact')\
-            .eq('source_id', source_id)\
-            .execute()
-        
-        logger.info(f"Total rows in {table_name} for source {source_id}: {count_result.count if hasattr(count_result, 'count') else 'unknown'}")
-        
-        # Get all split_key values (limit to reasonable number)
         raw_result = supabase.table(table_name)\
             .select('split_key')\
             .eq('source_id', source_id)\
             .limit(10000)\
             .execute()
-        
-        logger.info(f"Raw query result for source {source_id}: {len(raw_result.data) if raw_result.data else 0} rows fetched")
-    except Exception as e:
-        logger.error(f"Error querying {table_name}: {e}")
-        raw_result = None
-    
-    # Collect unique values (filter out null/empty)
-    unique_values = set()
-    all_split_keys = []  # For debugging
-    
-    if raw_result and raw_result.data:
-        for idx, row in enumerate(raw_result.data):
+        for row in raw_result.data or []:
             split_key = row.get('split_key')
-            all_split_keys.append(split_key)
-            
-            # Log first 10 for debugging
-            if idx < 10:
-                logger.info(f"  Row {idx}: split_key = '{split_key}' (type: {type(split_key)})")
-            
-            if split_key and split_key.strip():  # Filter out null and empty strings
+            if split_key and split_key.strip():
                 unique_values.add(split_key.strip())
-        
-        logger.info(f"Total rows: {len(raw_result.data)}, Non-null split_keys: {len([k for k in all_split_keys if k])}")
-        logger.info(f"Found {len(unique_values)} unique split values for source {source_id}: {sorted(unique_values)}")
+    except Exception as e:
+        logger.error(f"Error querying {table_name}: {e}")
     
     # Get all warehouse bindings to check which split values are in use
     # Join with warehouses to get warehouse_code
@@ -297,43 +393,31 @@ async def get_split_values_for_source(source_id: str, exclude_warehouse: Optiona
     
     # Build a map of split_value -> warehouse_code
     split_usage = {}  # {split_value: warehouse_code}
-    if bindings_result.data:
-        for binding in bindings_result.data:
-            warehouse_code = binding['warehouses']['code']
-            source_bindings = binding.get('source_bindings')
-            
-            # Skip if this is the warehouse being edited
-            if exclude_warehouse and warehouse_code == exclude_warehouse:
-                continue
-            
-            # Check if this binding uses our source_id
-            # Key format: "source_id" or "source_id::split_value"
-            if source_bindings and isinstance(source_bindings, dict):
-                for bind_key, binding_info in source_bindings.items():
-                    # Extract source_id from key
-                    bind_source_id = bind_key.split('::')[0] if '::' in bind_key else bind_key
-                    
-                    if bind_source_id == source_id:
-                        # Extract split_value from key if present
-                        split_value = bind_key.split('::')[1] if '::' in bind_key else binding_info.get('split_value')
-                        if split_value:
-                            split_usage[split_value] = warehouse_code
-    
-    # Build response
-    values = []
-    for value in sorted(unique_values):
-        warehouse_using_it = split_usage.get(value)
-        values.append({
+    for binding in bindings_result.data or []:
+        warehouse_code = binding['warehouses']['code']
+        source_bindings = binding.get('source_bindings')
+        
+        # Skip if this is the warehouse being edited
+        if exclude_warehouse and warehouse_code == exclude_warehouse:
+            continue
+        
+        # Key format: "source_id" or "source_id::split_value"
+        if source_bindings and isinstance(source_bindings, dict):
+            for bind_key, binding_info in source_bindings.items():
+                bind_source_id = bind_key.split('::')[0] if '::' in bind_key else bind_key
+                if bind_source_id == source_id:
+                    split_value = bind_key.split('::')[1] if '::' in bind_key else binding_info.get('split_value')
+                    if split_value:
+                        split_usage[split_value] = warehouse_code
+    
+    return [
+        {
             'value': value,
-            'warehouse_code': warehouse_using_it,
-            'is_available': warehouse_using_it is None
-        })
-    
-    return {
-        'source_id': source_id,
-        'split_by_column': split_by_column,
-        'values': values
-    }
+            'warehouse_code': split_usage.get(value),
+            'is_available': split_usage.get(value) is None
+        }
+        for value in sorted(unique_values)
+    ]
 
 # ============================================
 # PRODUCTION LINES FUNCTIONS
@@ -449,32 +533,23 @@ async def get_production_lines(factory_id: Optional[str] = None) -> List[Dict[st
     if not supabase:
         raise Exception("Supabase not configured")
 
+    # Embed materials and the factory name so this is one request, not 2 + one per line
+    query = supabase.table('production_lines')\
+        .select('*, materials:production_line_materials(*), factories(name)')
     if factory_id:
-        lines_result = supabase.table('production_lines')\
-            .select('*')\
-            .eq('factory_id', factory_id)\
-            .execute()
-    else:
-        lines_result = supabase.table('production_lines').select('*').execute()
+        query = query.eq('factory_id', factory_id)
+    lines_result = query.execute()
 
     if not lines_result.data:
         return []
 
-    # Get all factory names for lookup
-    factories_result = supabase.table('factories').select('id, name').execute()
-    factory_names = {f['id']: f['name'] for f in factories_result.data} if factories_result.data else {}
-
     lines = []
     for line in lines_result.data:
-        # Get materials for this line
-        materials_result = supabase.table('production_line_materials')\
-            .select('*')\
-            .eq('production_line_id', line['id'])\
-            .execute()
-        line['materials'] = materials_result.data if materials_result.data else []
+        line['materials'] = line.get('materials') or []
 
         # Add factory name
-        line['factory_name'] = factory_names.get(line.get('factory_id'), None)
+        factory = line.pop('factories', None)
+        line['factory_name'] = factory.get('name') if factory else None
 
         lines.append(line)
 
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Tests for the SQL migration splitter and Google Sheets paging"""
+
+import asyncio
+import os
+import sys
+from urllib.parse import unquote
+
+import orjson
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import sheets
+from run_migration import split_sql_statements
+
+
+def test_split_plain_statements():
+    """Top-level semicolons end statements, comments are dropped"""
+    sql = "-- header\nCREATE TABLE a (id int);\n/* note; */ INSERT INTO a VALUES (1);\nSELECT 1"
+    assert split_sql_statements(sql) == [
+        "CREATE TABLE a (id int);",
+        "INSERT INTO a VALUES (1);",
+        "SELECT 1",
+    ]
+
+
+def test_split_quoted_and_dollar_bodies():
+    """Semicolons inside quotes, identifiers and $$ bodies are kept"""
+    sql = (
+        "SELECT 'a;b', 'it''s; x', \"col;name\";\n"
+        "CREATE FUNCTION f() RETURNS void AS $body$ BEGIN PERFORM 1; END; $body$ LANGUAGE plpgsql;"
+    )
+    statements = split_sql_statements(sql)
+    assert len(statements) == 2
+    assert statements[0] == "SELECT 'a;b', 'it''s; x', \"col;name\";"
+    assert statements[1].endswith("LANGUAGE plpgsql;")
+
+
+def test_split_escape_strings():
+    """Backslash-escaped quotes in E'' strings don't end the literal"""
+    sql = "SELECT E'it\\'s; x';\nSELECT e'a\\\\';\nSELECT E'b''c; d';\nSELECT 1"
+    assert split_sql_statements(sql) == [
+        "SELECT E'it\\'s; x';",
+        "SELECT e'a\\\\';",
+        "SELECT E'b''c; d';",
+        "SELECT 1",
+    ]
+    # A trailing E on an identifier is not an escape-string prefix
+    assert split_sql_statements("SELECT name'\\';\nSELECT 2") == ["SELECT name'\\';", "SELECT 2"]
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.content = orjson.dumps(data)
+
+    def json(self):
+        return orjson.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSheetsClient:
+    """Serves a sheet like the Sheets API: trailing empty rows of each range are trimmed"""
+
+    def __init__(self, title, grid):
+        self.title = title
+        self.grid = grid
+        self.ranges = []
+
+    async def get(self, url, headers=None, params=None):
+        if '/values/' not in url:
+            return FakeResponse({"sheets": [{"properties": {
+                "title": self.title, "gridProperties": {"rowCount": len(self.grid)}
+            }}]})
+        rows_range = unquote(url.rsplit('/', 1)[1]).split('!')[1]
+        self.ranges.append(rows_range)
+        start, end = map(int, rows_range.split(':'))
+        rows = self.grid[start - 1:end]
+        while rows and not rows[-1]:
+            rows = rows[:-1]
+        return FakeResponse({"values": rows} if rows else {})
+
+
+def collect_pages(client, page_size):
+    """Run stream_sheet_values against a fake client"""
+    original = sheets.get_sheets_client, sheets.get_auth_headers
+    sheets._row_counts_cache.clear()
+    sheets.get_sheets_client = lambda: client
+    sheets.get_auth_headers = lambda: {}
+    try:
+        async def run():
+            return [page async for page in sheets.stream_sheet_values('sheet-id', client.title, page_size)]
+        return asyncio.run(run())
+    finally:
+        sheets.get_sheets_client, sheets.get_auth_headers = original
+
+
+def test_stream_pages_past_blank_rows():
+    """A short page (trailing blanks trimmed) is not the end of the sheet"""
+    grid = [["Item Code", "Qty"]] + [[f"A{i}", "1"] for i in range(5)] + [[], [], [], []] + [["B1", "2"]]
+    client = FakeSheetsClient("Stock", grid)
+    pages = collect_pages(client, page_size=4)
+
+    rows = [row for page in pages for row in page[1:] if row]
+    assert all(page[0] == ["Item Code", "Qty"] for page in pages)
+    assert rows == [[f"A{i}", "1"] for i in range(5)] + [["B1", "2"]]
+    # Pages stop at the grid's row count
+    assert client.ranges == ["1:4", "5:8", "9:11"]
+
+
+def test_stream_empty_sheet():
+    """An empty sheet yields no pages"""
+    client = FakeSheetsClient("Empty", [[], []])
+    assert collect_pages(client, page_size=5000) == []
+
+
+def main():
+    tests = [
+        test_split_plain_statements,
+        test_split_quoted_and_dollar_bodies,
+        test_split_escape_strings,
+        test_stream_pages_past_blank_rows,
+        test_stream_empty_sheet,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
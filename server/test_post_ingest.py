@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Tests for materialized view refresh scheduling and raw row insert fallbacks"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import ingest_new
+from column_mapping import MappedRows
+
+
+class FakeSupabase:
+    """Records refresh_all_materialized_views calls; each call takes `delay` seconds"""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def rpc(self, name):
+        supabase = self
+
+        class Call:
+            def execute(self):
+                with supabase._lock:
+                    supabase.calls.append((name, time.monotonic()))
+                time.sleep(supabase.delay)
+                if supabase.error:
+                    raise supabase.error
+                return type('Result', (), {'data': None})()
+
+        return Call()
+
+
+def run_with_supabase(fake, coro_factory):
+    """Run a coroutine with ingest_new.supabase replaced by a fake"""
+    original = ingest_new.supabase
+    ingest_new.supabase = fake
+    try:
+        return asyncio.run(coro_factory())
+    finally:
+        ingest_new.supabase = original
+
+
+def test_first_refresh_is_immediate():
+    """The first refresh starts right away instead of after a debounce interval"""
+    fake = FakeSupabase()
+    started = time.monotonic()
+    run_with_supabase(fake, ingest_new.refresh_materialized_views)
+    assert [name for name, _ in fake.calls] == ['refresh_all_materialized_views']
+    assert fake.calls[0][1] - started < 1.0
+
+
+def test_refreshes_during_a_refresh_are_coalesced():
+    """Requests made while a refresh runs share one follow-up refresh"""
+    fake = FakeSupabase(delay=0.05)
+
+    async def scenario():
+        first = asyncio.create_task(ingest_new.refresh_materialized_views())
+        await asyncio.sleep(0.01)
+        # Both arrive while the first refresh is running
+        await asyncio.gather(
+            ingest_new.refresh_materialized_views(),
+            ingest_new.refresh_materialized_views(),
+            first,
+        )
+
+    run_with_supabase(fake, scenario)
+    assert len(fake.calls) == 2
+
+
+def test_refresh_errors_are_raised():
+    """A failed refresh is reported to the caller"""
+    fake = FakeSupabase(error=RuntimeError("refresh failed"))
+    try:
+        run_with_supabase(fake, ingest_new.refresh_materialized_views)
+    except RuntimeError as e:
+        assert str(e) == "refresh failed"
+    else:
+        raise AssertionError("refresh error was swallowed")
+
+
+def test_insert_falls_back_to_rest_without_copy():
+    """Without a Postgres pool, raw rows are posted to PostgREST in batches"""
+    posted = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+    class FakeRestClient:
+        async def post(self, url, content=None, headers=None):
+            posted.append((url, content))
+            return FakeResponse()
+
+    async def no_pool():
+        return None
+
+    rows = MappedRows(columns=['item_code', 'location'], rows=[(f'ITEM-{i}', 'A01') for i in range(2500)])
+    originals = ingest_new.get_pg_pool, ingest_new.get_rest_client
+    ingest_new.get_pg_pool = no_pool
+    ingest_new.get_rest_client = lambda: FakeRestClient()
+    try:
+        inserted = run_with_supabase(object(), lambda: ingest_new.insert_wms_rows(rows))
+    finally:
+        ingest_new.get_pg_pool, ingest_new.get_rest_client = originals
+
+    assert inserted == 2500
+    assert [url for url, _ in posted] == ['/wms_raw_rows']
+    assert b'"item_code":"ITEM-0"' in posted[0][1]
+
+
+def main():
+    tests = [
+        test_first_refresh_is_immediate,
+        test_refreshes_during_a_refresh_are_coalesced,
+        test_refresh_errors_are_raised,
+        test_insert_falls_back_to_rest_without_copy,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
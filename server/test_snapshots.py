@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Tests for inventory snapshot files: write/read round trips and bindings blobs"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import inventory_snapshot
+from inventory_snapshot import InventorySnapshotManager, SnapshotWriter, decode_snapshot, decompress_snapshot
+
+WMS_ROWS = [
+    {'id': 1, 'source_id': 's1', 'split_key': 'A', 'item_code': 'ITEM-1', 'available_qty': 5.0},
+    {'id': 2, 'source_id': 's1', 'split_key': 'B', 'item_code': 'ITEM-2', 'available_qty': 0.0},
+]
+SAP_ROWS = [{'id': 3, 'source_id': 's2', 'split_key': None, 'material': 'MAT-1', 'unrestricted_qty': 7.0}]
+BINDINGS = {'s1': {'type': 'wms', 'split_value': None}, 's2': {'type': 'sap', 'split_value': None}}
+
+
+def make_manager(tmp_dir):
+    """Snapshot manager writing under a temporary directory"""
+    return InventorySnapshotManager(data_dir=tmp_dir)
+
+
+def test_write_read_round_trip():
+    """A written snapshot reads back with the same rows, metadata and bindings"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = make_manager(tmp_dir)
+        manager._write_snapshot('WH1', {
+            'warehouse_code': 'WH1',
+            'last_updated': '2024-01-01T00:00:00',
+            'wms_data': WMS_ROWS,
+            'sap_data': SAP_ROWS,
+            'source_bindings': BINDINGS,
+        })
+
+        snapshot = manager.get_inventory_snapshot('WH1')
+        assert snapshot['wms_data'] == WMS_ROWS
+        assert snapshot['sap_data'] == SAP_ROWS
+        assert snapshot['source_bindings'] == BINDINGS
+        assert snapshot['last_updated'] == '2024-01-01T00:00:00'
+
+        # Only the requested type's rows file is parsed
+        wms_only = manager.get_inventory_snapshot('WH1', 'wms')
+        assert wms_only['wms_data'] == WMS_ROWS
+        assert 'sap_data' not in wms_only
+
+        assert manager.get_inventory_snapshot('MISSING') is None
+
+
+def test_writer_abort_leaves_previous_file():
+    """An aborted SnapshotWriter keeps the previous file and removes its temp file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = make_manager(tmp_dir)
+        path = manager._get_snapshot_path('WH1', 'wms')
+
+        writer = SnapshotWriter(path)
+        writer.write(b'[')
+        writer.write_rows(WMS_ROWS[:1])
+        writer.write_rows(WMS_ROWS[1:])
+        writer.write(b']')
+        writer.commit()
+
+        writer = SnapshotWriter(path)
+        writer.write(b'[{"partial"')
+        writer.abort()
+
+        suffix = inventory_snapshot.SNAPSHOT_SUFFIX
+        assert decode_snapshot(decompress_snapshot(path.read_bytes(), suffix)) == WMS_ROWS
+        assert [p.name for p in path.parent.iterdir() if p.name.endswith('.tmp')] == []
+
+
+def test_bindings_are_shared_and_pruned():
+    """Identical bindings share one blob; blobs no snapshot references are deleted"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = make_manager(tmp_dir)
+        for code in ('WH1', 'WH2'):
+            manager._write_snapshot(code, {'warehouse_code': code, 'source_bindings': BINDINGS})
+        assert len(list(manager.bindings_dir.iterdir())) == 1
+
+        changed = {'s1': {'type': 'wms', 'split_value': 'A'}}
+        manager._write_snapshot('WH1', {'warehouse_code': 'WH1', 'source_bindings': changed})
+        assert len(list(manager.bindings_dir.iterdir())) == 2
+
+        manager._write_snapshot('WH2', {'warehouse_code': 'WH2', 'source_bindings': changed})
+        assert len(list(manager.bindings_dir.iterdir())) == 1
+        assert manager.get_inventory_snapshot('WH2')['source_bindings'] == changed
+
+
+def test_update_reuses_unchanged_bindings():
+    """update_inventory_snapshot streams rows once and skips bindings whose version is unchanged"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = make_manager(tmp_dir)
+        rows_by_source = {'s1': WMS_ROWS, 's2': SAP_ROWS}
+        fetched = []
+
+        async def get_binding(warehouse_code):
+            return {'warehouse_code': warehouse_code, 'source_bindings': BINDINGS}
+
+        async def get_binding_version(bind_key, binding_info):
+            return ['2024-01-01T00:00:00', len(rows_by_source[bind_key])]
+
+        async def fetch_binding(bind_key, binding_info, on_page):
+            fetched.append(bind_key)
+            await on_page(rows_by_source[bind_key])
+            return len(rows_by_source[bind_key])
+
+        original_get_binding = inventory_snapshot.get_warehouse_binding
+        inventory_snapshot.get_warehouse_binding = get_binding
+        manager._get_binding_version = get_binding_version
+        manager._fetch_binding = fetch_binding
+        try:
+            asyncio.run(manager.update_inventory_snapshot('WH1'))
+            snapshot = manager.get_inventory_snapshot('WH1')
+            assert snapshot['wms_data'] == WMS_ROWS
+            assert snapshot['sap_data'] == SAP_ROWS
+            assert snapshot['total_wms'] == 2 and snapshot['total_sap'] == 1
+            assert sorted(fetched) == ['s1', 's2']
+
+            # Same versions: nothing is fetched again and the snapshot is kept
+            asyncio.run(manager.update_inventory_snapshot('WH1'))
+            assert sorted(fetched) == ['s1', 's2']
+            assert manager.get_inventory_snapshot('WH1')['wms_data'] == WMS_ROWS
+        finally:
+            inventory_snapshot.get_warehouse_binding = original_get_binding
+
+
+def main():
+    tests = [
+        test_write_read_round_trip,
+        test_writer_abort_leaves_previous_file,
+        test_bindings_are_shared_and_pruned,
+        test_update_reuses_unchanged_bindings,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
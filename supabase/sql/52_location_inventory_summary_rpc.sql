@@ -0,0 +1,65 @@
+-- Function to summarize WMS inventory at one location server-side
+-- Purpose: Let summary-only location lookups skip downloading every row
+-- Usage: SELECT location_inventory_summary('cell_no', 'A03-01-01', 'available_qty',
+--          '[{"source_id": "<uuid>", "split_values": null}]'::jsonb);
+
+DROP FUNCTION IF EXISTS public.location_inventory_summary(text, text, text, jsonb) CASCADE;
+
+CREATE OR REPLACE FUNCTION public.location_inventory_summary(
+  p_location_column text,
+  p_location text,
+  p_qty_column text,
+  p_sources jsonb
+)
+RETURNS jsonb AS $$
+DECLARE
+  v_result jsonb;
+BEGIN
+  -- Validate column names to prevent SQL injection (they are also quoted with %I)
+  IF NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = 'wms_raw_rows' AND column_name = p_location_column
+  ) THEN
+    RAISE EXCEPTION 'Invalid wms_raw_rows column: %', p_location_column;
+  END IF;
+
+  IF NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = 'wms_raw_rows' AND column_name = p_qty_column
+  ) THEN
+    RAISE EXCEPTION 'Invalid wms_raw_rows column: %', p_qty_column;
+  END IF;
+
+  -- p_sources: [{"source_id": uuid, "split_values": [text] | null}], null = every split of the source
+  EXECUTE format(
+    'SELECT jsonb_build_object(
+       ''total_items'', COUNT(*),
+       ''total_quantity'', COALESCE(SUM(r.%2$I), 0),
+       ''unique_item_codes'', COUNT(DISTINCT r.item_code),
+       ''last_updated'', MAX(r.fetched_at),
+       ''zone'', (ARRAY_AGG(r.zone ORDER BY r.fetched_at DESC))[1]
+     )
+     FROM public.wms_raw_rows r
+     WHERE r.%1$I = $1
+       AND EXISTS (
+         SELECT 1
+         FROM jsonb_to_recordset($2) AS s(source_id uuid, split_values text[])
+         WHERE r.source_id = s.source_id
+           AND (s.split_values IS NULL OR r.split_key = ANY (s.split_values))
+       )',
+    p_location_column, p_qty_column
+  )
+  INTO v_result
+  USING p_location, p_sources;
+
+  RETURN v_result;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+GRANT EXECUTE ON FUNCTION public.location_inventory_summary(text, text, text, jsonb) TO anon, authenticated;
+
+COMMENT ON FUNCTION public.location_inventory_summary(text, text, text, jsonb) IS
+'Summarize wms_raw_rows at one location for the bound sources/splits.
+
+   Returns JSON with total_items, total_quantity, unique_item_codes, last_updated and zone.
+   Used by POST /api/location/inventory with summary_only=true.';
@@ -0,0 +1,68 @@
+-- Function to list a source's split values and which warehouse uses each
+-- Purpose: Compute DISTINCT split_key and binding usage in the database instead of
+--          shipping up to 10k raw rows and every warehouse binding to the server
+-- Usage: SELECT get_source_split_values('<source uuid>', 'wms', 'EA2-F');
+
+DROP FUNCTION IF EXISTS public.get_source_split_values(uuid, text, text) CASCADE;
+
+CREATE OR REPLACE FUNCTION public.get_source_split_values(
+  p_source_id uuid,
+  p_source_type text,
+  p_exclude_warehouse text DEFAULT NULL
+)
+RETURNS jsonb AS $$
+DECLARE
+  v_table text;
+  v_result jsonb;
+BEGIN
+  -- Only the two raw-row tables are allowed
+  v_table := CASE WHEN p_source_type = 'wms' THEN 'wms_raw_rows' ELSE 'sap_raw_rows' END;
+
+  EXECUTE format(
+    'WITH split_values AS (
+       SELECT DISTINCT btrim(split_key) AS value
+       FROM public.%I
+       WHERE source_id = $1
+         AND split_key IS NOT NULL
+         AND btrim(split_key) <> ''''
+     ),
+     split_usage AS (
+       -- Binding keys are "source_id" or "source_id::split_value"
+       SELECT
+         CASE WHEN position(''::'' IN b.key) > 0
+              THEN split_part(b.key, ''::'', 2)
+              ELSE b.value->>''split_value''
+         END AS value,
+         MIN(w.code) AS warehouse_code
+       FROM public.warehouse_bindings wb
+       JOIN public.warehouses w ON w.id = wb.warehouse_id
+       CROSS JOIN LATERAL jsonb_each(
+         CASE WHEN jsonb_typeof(wb.source_bindings) = ''object'' THEN wb.source_bindings ELSE ''{}''::jsonb END
+       ) AS b
+       WHERE split_part(b.key, ''::'', 1) = $1::text
+         AND ($2 IS NULL OR w.code <> $2)
+       GROUP BY 1
+     )
+     SELECT COALESCE(jsonb_agg(jsonb_build_object(
+              ''value'', v.value,
+              ''warehouse_code'', u.warehouse_code,
+              ''is_available'', u.warehouse_code IS NULL
+            ) ORDER BY v.value COLLATE "C"), ''[]''::jsonb)
+     FROM split_values v
+     LEFT JOIN split_usage u ON u.value = v.value',
+    v_table
+  )
+  INTO v_result
+  USING p_source_id, p_exclude_warehouse;
+
+  RETURN v_result;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION public.get_source_split_values(uuid, text, text) TO authenticated;
+
+COMMENT ON FUNCTION public.get_source_split_values(uuid, text, text) IS
+'List distinct split_key values of a sheet source with the warehouse bound to each.
+
+   Returns a JSON array of {value, warehouse_code, is_available}, sorted by value.
+   p_exclude_warehouse skips that warehouse''s own bindings (used while editing it).';